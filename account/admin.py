@@ -1,16 +1,48 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Account, KYC
 from userauths.models import User
 from import_export.admin import ImportExportModelAdmin
+from core.balance import rebuild_balance
+from core.versioning import update_account, ConcurrentUpdateError
 # Register your models here.
 
 
 
 
 class AccountAdminModel(ImportExportModelAdmin):
-    list_editable = ['account_status', 'account_balance', 'kyc_submitted', 'kyc_confirmed'] 
+    list_editable = ['account_status', 'kyc_submitted', 'kyc_confirmed'] 
     list_display = ['user', 'account_number' ,'account_status', 'account_balance', 'kyc_submitted', 'kyc_confirmed'] 
     list_filter = ['account_status']
+    # Balances are a projection of the ledger; move money with deposits/transfers
+    readonly_fields = ['account_balance', 'version']
+    actions = ['rebuild_balances']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+
+        # Write only the fields edited in the form, so a stale admin page
+        # cannot overwrite changes made since it was loaded.
+        edited = {name: getattr(obj, name) for name in form.changed_data}
+        obj.refresh_from_db()
+
+        def apply_edits(account):
+            for name, value in edited.items():
+                setattr(account, name, value)
+
+        try:
+            update_account(obj, apply_edits)
+        except ConcurrentUpdateError:
+            self.message_user(
+                request, "The account was changed by someone else while saving; your edits were not saved. Please try again.",
+                level=messages.ERROR,
+            )
+
+    @admin.action(description="Rebuild balance from ledger")
+    def rebuild_balances(self, request, queryset):
+        for account in queryset:
+            rebuild_balance(account)
+        self.message_user(request, f"Rebuilt {queryset.count()} account balance(s) from the ledger.")
 
 class KYCAdmin(ImportExportModelAdmin):
     search_fields = ["full_name"]
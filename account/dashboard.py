@@ -0,0 +1,105 @@
+"""
+Data for the account dashboard.
+
+``load_dashboard`` returns everything the dashboard template reads. The
+part that only changes when money or cards move (the summary) is cached
+per account holder by core.summary and invalidated by the write paths;
+computing it on a miss costs a fixed number of queries however long the
+user's history is:
+
+- the all-time sent/received totals, one aggregate over the account's
+  MonthlyAccountStats rows
+- the five latest sent and five latest received transfers, each with the
+  other party's KYC joined in
+- the user's cards, reduced to what the card slider shows so that card
+  numbers are never written to the cache
+
+The account, its KYC and its freeze status are loaded by the caller (the
+account and freeze status are already read by AccountFreezeMiddleware).
+The balance is read on every request, since credits to a sharded business
+account land on its BalanceShard rows rather than the account row.
+The payment request lists are returned as unevaluated querysets, so they
+cost nothing unless a template shows them. The queries are built by the
+small functions below, which explain_hot_queries also uses.
+"""
+from core.balance import get_balance
+from core.models import CreditCard, PaymentRequest, Transfer
+from core.stats import account_totals
+from core.summary import cached_summary
+
+RECENT_LIMIT = 5
+
+
+def _card(card):
+    return {
+        "card_id": card.card_id,
+        "card_type": card.card_type,
+        "name": card.name,
+        "masked_number": card.masked_number,
+        "expiry_display": card.expiry_display,
+    }
+
+
+def sent_transfers(user):
+    """The latest transfers ``user`` sent, with the receivers' KYC."""
+    return Transfer.objects.filter(user=user).select_related("receiver__kyc").order_by("-id")[:RECENT_LIMIT]
+
+
+def received_transfers(user):
+    """The latest transfers ``user`` received, with the senders' KYC."""
+    return Transfer.objects.filter(receiver=user).select_related("user__kyc").order_by("-id")[:RECENT_LIMIT]
+
+
+def cards(user):
+    """``user``'s cards, newest first, with only the columns the slider shows."""
+    return (
+        CreditCard.objects.filter(user=user)
+        .only("card_id", "card_type", "name", "number", "month", "year")
+        .order_by("-id")
+    )
+
+
+def sent_payment_requests(user):
+    """The latest payment requests ``user`` sent."""
+    return PaymentRequest.objects.filter(sender=user).select_related("receiver__kyc").order_by("-id")[:RECENT_LIMIT]
+
+
+def received_payment_requests(user):
+    """The latest payment requests sent to ``user``."""
+    return PaymentRequest.objects.filter(receiver=user).select_related("sender__kyc").order_by("-id")[:RECENT_LIMIT]
+
+
+def compute_summary(user, account):
+    """
+    The cacheable part of ``user``'s dashboard.
+
+    Returns:
+        dict: Context entries; every value is evaluated and picklable
+    """
+    totals = account_totals(account)
+    return {
+        "sender_transaction": list(sent_transfers(user)),
+        "reciever_transaction": list(received_transfers(user)),
+        "credit_card": [_card(card) for card in cards(user)],
+        "total_sent": totals["sent_total"],
+        "total_received": totals["received_total"],
+    }
+
+
+def load_dashboard(user, account):
+    """
+    The dashboard's template context for ``user``.
+
+    Args:
+        user: The signed-in user
+        account: ``user``'s Account
+
+    Returns:
+        dict: Context entries for account/dashboard.html
+    """
+    return {
+        **cached_summary(user.pk, lambda: compute_summary(user, account)),
+        "balance": get_balance(account),
+        "request_sender_transaction": sent_payment_requests(user),
+        "request_reciever_transaction": received_payment_requests(user),
+    }
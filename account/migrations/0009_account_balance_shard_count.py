@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_account_business_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='balance_shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -60,6 +60,11 @@ class Account(models.Model):
     pin_lockout_until = models.DateTimeField(blank=True, null=True)
     
     business_account = models.BooleanField(default=False)
+    # Hot business accounts can spread incoming credits over N shard rows
+    # (core.BalanceShard) instead of updating this row; 0 disables sharding.
+    balance_shard_count = models.PositiveSmallIntegerField(default=0)
+    # Bumped on every write through core.versioning.update_account
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['-date']
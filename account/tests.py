@@ -1,3 +1,175 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import messages
+from django.contrib.admin.sites import site
+from django.core.cache import caches
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import CreditCard, Notification, PaymentRequest, Transfer
+from core.transitions import transition
+from core.versioning import ConcurrentUpdateError
+from userauths.models import User
+from .models import KYC, Account
+
+
+def make_customer(username, balance=Decimal("0.00")):
+    user = User.objects.create(username=username, email=f"{username}@example.com")
+    KYC.objects.create(
+        user=user,
+        account=user.account,
+        full_name=username.title(),
+        marital_status="single",
+        gender="other",
+        identity_type="national_id_card",
+        date_of_birth=timezone.now(),
+        signature="signature.png",
+        country="Nigeria",
+        state="Lagos",
+        city="Lagos",
+        mobile="0000000000",
+    )
+    Account.objects.filter(pk=user.account.pk).update(
+        account_balance=balance, kyc_confirmed=True, kyc_submitted=True, account_status="active",
+    )
+    return user
+
+
+# A cache every process shares, as with REDIS_URL set; tests run in one process
+SHARED_CACHE_SETTINGS = {
+    "SUMMARY_CACHE": "default",
+    "DASHBOARD_FRAGMENT_TTL": 60 * 60,
+    "NOTIFICATION_FRAGMENT_TTL": 60,
+}
+
+
+@override_settings(**SHARED_CACHE_SETTINGS)
+class DashboardQueryTests(TestCase):
+    # Session, user, account and freeze check (middleware); KYC
+    CACHED_DASHBOARD_QUERIES = 5
+    # ... plus the notifications (unless their fragments are cached) and the
+    # summary: totals, sent and received transfers, cards
+    DASHBOARD_QUERIES = CACHED_DASHBOARD_QUERIES + 5
+
+    def setUp(self):
+        caches[settings.SUMMARY_CACHE].clear()
+        self.user = make_customer("alice", Decimal("1000.00"))
+        self.other = make_customer("bob", Decimal("1000.00"))
+        self.client.force_login(self.user)
+
+    def add_history(self, count):
+        # Run the on-commit summary invalidations, without sending the emails
+        with mock.patch("core.utils.send_html_email"), self.captureOnCommitCallbacks(execute=True):
+            self._add_history(count)
+
+    def _add_history(self, count):
+        for _ in range(count):
+            for sender, receiver in ((self.user, self.other), (self.other, self.user)):
+                transfer = Transfer.objects.create(
+                    user=sender,
+                    account=sender.account,
+                    receiver=receiver,
+                    receiver_account=receiver.account,
+                    amount=Decimal("5.00"),
+                    status="processing",
+                )
+                transition(transfer, "completed")
+            PaymentRequest.objects.create(
+                sender=self.other,
+                sender_account=self.other.account,
+                receiver=self.user,
+                receiver_account=self.user.account,
+                amount=Decimal("1.00"),
+                status="request_sent",
+            )
+        CreditCard.objects.create(
+            user=self.user, name="Alice", number="4111111111111111", month=1, year=30, cvv="123", card_type="visa",
+        )
+
+    def test_query_count_is_fixed(self):
+        self.add_history(3)
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            response = self.client.get(reverse("account:dashboard"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.add_history(12)
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            response = self.client.get(reverse("account:dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_sent"], Decimal("60.00"))
+        self.assertEqual(response.context["total_received"], Decimal("60.00"))
+        self.assertEqual(len(response.context["sender_transaction"]), 5)
+        self.assertContains(response, "Bob")
+
+    def test_unchanged_account_is_served_from_the_cache(self):
+        self.add_history(3)
+        self.client.get(reverse("account:dashboard"))
+        with self.assertNumQueries(self.CACHED_DASHBOARD_QUERIES):
+            response = self.client.get(reverse("account:dashboard"))
+        self.assertEqual(response.context["total_sent"], Decimal("15.00"))
+        self.assertContains(response, "Bob")
+
+    def test_new_transfer_invalidates_the_summary(self):
+        self.add_history(1)
+        self.client.get(reverse("account:dashboard"))
+        self.add_history(1)
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            response = self.client.get(reverse("account:dashboard"))
+        self.assertEqual(response.context["total_sent"], Decimal("10.00"))
+        self.assertEqual(len(response.context["credit_card"]), 2)
+
+    def test_cached_fragments_follow_notification_changes(self):
+        self.add_history(1)
+        self.client.get(reverse("account:dashboard"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, notification_type="Added Credit Card")
+        response = self.client.get(reverse("account:dashboard"))
+        self.assertContains(response, "You added a new credit card")
+
+
+@override_settings(SUMMARY_CACHE="summaries", DASHBOARD_FRAGMENT_TTL=0, NOTIFICATION_FRAGMENT_TTL=0)
+class UnsharedCacheDashboardTests(TestCase):
+    # The settings without REDIS_URL: nothing can be served stale by a process
+    # that missed an invalidation
+    def setUp(self):
+        self.user = make_customer("alice", Decimal("1000.00"))
+        self.other = make_customer("bob")
+        self.client.force_login(self.user)
+
+    def send(self, amount):
+        transfer = Transfer.objects.create(
+            user=self.user, account=self.user.account, receiver=self.other, receiver_account=self.other.account,
+            amount=Decimal(amount), status="processing",
+        )
+        # The on-commit invalidation never runs, as if another process made the transfer
+        with mock.patch("core.utils.send_html_email"):
+            transition(transfer, "completed")
+
+    def test_dashboard_shows_changes_made_by_other_processes(self):
+        self.send("5.00")
+        self.assertEqual(self.client.get(reverse("account:dashboard")).context["total_sent"], Decimal("5.00"))
+        self.send("7.00")
+        response = self.client.get(reverse("account:dashboard"))
+        self.assertEqual(response.context["total_sent"], Decimal("12.00"))
+        self.assertContains(response, "988.00")
+
+
+class AccountAdminTests(TestCase):
+    def setUp(self):
+        self.user = make_customer("alice")
+        self.account = Account.objects.get(user=self.user)
+        self.admin = site._registry[Account]
+        self.request = RequestFactory().post("/")
+
+    def test_lost_concurrent_update_is_reported(self):
+        form = mock.Mock(changed_data=["account_status"])
+        self.account.account_status = "in-active"
+        with mock.patch("account.admin.update_account", side_effect=ConcurrentUpdateError(self.account, 5)), \
+                mock.patch.object(self.admin, "message_user") as message_user:
+            self.admin.save_model(self.request, self.account, form, change=True)
+        self.assertEqual(message_user.call_args.kwargs["level"], messages.ERROR)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).account_status, "active")
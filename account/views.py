@@ -4,13 +4,14 @@ from django.contrib.auth.decorators import login_required
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
-from django.db.models import Sum
 from .forms import KYCForm
 from .models import KYC, Account
 from django.contrib import messages
 from core.forms import CreditCardForm
-from core.models import CreditCard, Transfer, PaymentRequest
+from core.models import CreditCard
+from .dashboard import load_dashboard
 from core.utils import is_account_frozen, get_freeze_reason_display, send_html_email
+from core.versioning import update_account, ConcurrentUpdateError
 # Create your views here.
 
 
@@ -41,6 +42,11 @@ def account(request):
 
 
 
+def _mark_kyc_submitted(account):
+    account.account_status = "pending"
+    account.kyc_submitted = True
+
+
 @login_required
 def kyc_registration(request):
     user = request.user
@@ -68,9 +74,11 @@ def kyc_registration(request):
             new_form.account = account
             new_form.save()
             # Update Account Status
-            account.account_status = "pending"
-            account.kyc_submitted = True
-            account.save()
+            try:
+                update_account(account, _mark_kyc_submitted)
+            except ConcurrentUpdateError:
+                messages.error(request, "Could not update your account, please try again.")
+                return redirect("account:kyc-reg")
             
             # Send Email to User
             subject = 'KYC Submitted Successfully'
@@ -117,29 +125,16 @@ def Dashboard(request):
 
     if request.user.is_authenticated:
         try:
-            kyc = KYC.objects.get(user=user)
-        except:
+            kyc = user.kyc
+        except KYC.DoesNotExist:
             messages.warning(request, "You Need To Submit Your KYC")
             return redirect("account:kyc-reg")
-        
-        # Recent transfers (sent)
-        recent_transfer = Transfer.objects.filter(user=request.user, status="completed").order_by("-id")[:1]
-        
-        # Recent received transfers
-        recent_recieved_transfer = Transfer.objects.filter(receiver=request.user).order_by("-id")[:1]
-
 
-        sender_transaction = Transfer.objects.filter(user=request.user).order_by("-id")[:5]
-        reciever_transaction = Transfer.objects.filter(receiver=request.user).order_by("-id")[:5]
-
-        request_sender_transaction = PaymentRequest.objects.filter(sender=request.user)
-        request_reciever_transaction = PaymentRequest.objects.filter(receiver=request.user)
-        
-        account = Account.objects.get(user=request.user)
+        # Already loaded (and cached on the user) by AccountFreezeMiddleware
+        account = user.account
         # Check if KYC is confirmed
         if not account.kyc_confirmed or account.account_status == "pending":
             return redirect("account:kyc-pending")
-        credit_card = CreditCard.objects.filter(user=request.user).order_by("-id")
 
         if request.method == "POST":
             form = CreditCardForm(request.POST)
@@ -153,31 +148,16 @@ def Dashboard(request):
                 return redirect("account:dashboard")
         else:
             form = CreditCardForm()
-        account = Account.objects.get(user=user)
-        credit_card = CreditCard.objects.filter(user=user).order_by("-id")
-        total_sent = Transfer.objects.filter(user=request.user, status="completed").aggregate(Sum('amount'))['amount__sum'] or 0
-        total_received = Transfer.objects.filter(receiver=request.user, status="completed").aggregate(Sum('amount'))['amount__sum'] or 0
 
         context = {
             'account':account,
             'kyc':kyc,
             'form':form,
-            "credit_card":credit_card,
-
-            "sender_transaction":sender_transaction,
-            "reciever_transaction":reciever_transaction,
-
-            'request_sender_transaction':request_sender_transaction,
-            'request_reciever_transaction':request_reciever_transaction,
-            'recent_transfer':recent_transfer,
-            'recent_recieved_transfer':recent_recieved_transfer,
-
-            'total_sent': total_sent,
-            'total_received': total_received,
+            **load_dashboard(user, account),
         }
         
         # Check if account is frozen and add to context
-        is_frozen, freeze_record = is_account_frozen(account)
+        is_frozen, freeze_record = getattr(request, 'account_freeze', None) or is_account_frozen(account)
         context['is_frozen'] = is_frozen
         if is_frozen:
             context['freeze_reason'] = get_freeze_reason_display(freeze_record)
@@ -214,8 +194,14 @@ def pin_settings(request):
         elif len(new_pin) != 4 or not new_pin.isdigit():
              messages.error(request, "PIN must be 4 digits.")
         else:
-            account.pin_number = new_pin
-            account.save()
+            def change_pin(account):
+                account.pin_number = new_pin
+
+            try:
+                update_account(account, change_pin)
+            except ConcurrentUpdateError:
+                messages.error(request, "Could not update your PIN, please try again.")
+                return redirect('account:pin-settings')
             messages.success(request, "PIN updated successfully.")
             return redirect('account:pin-settings')
     
@@ -1,21 +1,89 @@
-from django.contrib import admin
-from .models import Transfer, Deposit, Withdrawal, PaymentRequest, CreditCard, Notification, Beneficiary, AccountFreeze, ScheduledPayment
+from django.contrib import admin, messages
+from django.db.models import OuterRef, Subquery
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import Transfer, Deposit, Withdrawal, PaymentRequest, CreditCard, Notification, Beneficiary, AccountFreeze, ScheduledPayment, LedgerEntry, BalanceShard, SettlementBatch, BalanceSnapshot, ReconciliationMismatch, TransactionIndex, AccountStatement, MonthlyAccountStats
+from .feed import FEED_MODELS
+from .settlement import settle_external_transfers
+from .approvals import approve_deposits, describe_approval
+from .balance import InsufficientFunds
+from .transitions import transition, InvalidTransition
 # Register your models here.
 
-class TransferAdmin(admin.ModelAdmin):
-    list_editable = ['amount', 'status']
-    list_display = ['user', 'amount', 'status', 'transfer_type', 'receiver', 'date']
+def transaction_admin_link(kind, object_id, label):
+    """Link to the admin change page of the transaction an index row points at."""
+    if not kind:
+        return label or "-"
+    url = reverse(f"admin:core_{FEED_MODELS[kind]._meta.model_name}_change", args=[object_id])
+    return format_html('<a href="{}">{}</a>', url, label)
 
-class DepositAdmin(admin.ModelAdmin):
-    list_editable = ['amount', 'status']
+class TransitionAdminMixin:
+    """
+    Apply status edits through core.transitions instead of a plain save().
+
+    The amount can only be edited while the transaction is still in
+    ``initial_status``: once it moves on, its ledger rows may have been
+    written, and they are never changed afterwards.
+    """
+    initial_status = "pending"
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly = list(super().get_readonly_fields(request, obj))
+        if obj is not None and obj.status != self.initial_status:
+            readonly.append("amount")
+        return readonly
+
+    def save_model(self, request, obj, form, change):
+        target = obj.status
+        initial = form.initial.get("status") if change else obj._meta.get_field("status").default
+        if target == initial:
+            return super().save_model(request, obj, form, change)
+
+        # Save the other edits, then move the status
+        obj.status = initial
+        if not change:
+            super().save_model(request, obj, form, change)
+        else:
+            fields = [name for name in form.changed_data if name != "status"]
+            if fields:
+                obj.save(update_fields=fields)
+
+        try:
+            if not transition(obj, target):
+                self.message_user(request, f"{obj} was changed by someone else; its status was not updated.", messages.WARNING)
+        except (InvalidTransition, InsufficientFunds) as e:
+            self.message_user(request, f"{obj}: {e}", messages.ERROR)
+
+class TransferAdmin(TransitionAdminMixin, admin.ModelAdmin):
+    initial_status = "processing"
+    list_editable = ['status']
+    list_display = ['user', 'amount', 'status', 'transfer_type', 'receiver', 'receiver_bank', 'settlement_batch', 'date']
+    list_filter = ['status', 'transfer_type']
+    actions = ['settle_external_transfers']
+
+    @admin.action(description="Settle selected pending external transfers")
+    def settle_external_transfers(self, request, queryset):
+        batches = settle_external_transfers(queryset=queryset, settled_by=request.user)
+        settled = sum(batch.transfer_count for batch in batches)
+        self.message_user(request, f"Settled {settled} external transfer(s) in {len(batches)} batch(es).")
+
+class DepositAdmin(TransitionAdminMixin, admin.ModelAdmin):
+    list_editable = ['status']
     list_display = ['user', 'amount', 'status', 'date']
+    list_filter = ['status', 'deposit_method']
+    actions = ['approve_deposits']
+
+    @admin.action(description="Approve selected deposits")
+    def approve_deposits(self, request, queryset):
+        self.message_user(request, describe_approval(approve_deposits(queryset)))
 
-class WithdrawalAdmin(admin.ModelAdmin):
-    list_editable = ['amount', 'status']
+class WithdrawalAdmin(TransitionAdminMixin, admin.ModelAdmin):
+    list_editable = ['status']
     list_display = ['user', 'amount', 'status', 'date']
 
-class PaymentRequestAdmin(admin.ModelAdmin):
-    list_editable = ['amount', 'status']
+class PaymentRequestAdmin(TransitionAdminMixin, admin.ModelAdmin):
+    initial_status = "processing"
+    list_editable = ['status']
     list_display = ['user', 'amount', 'status', 'sender', 'receiver', 'date']
 
 class CreditCardAdmin(admin.ModelAdmin):
@@ -23,7 +91,20 @@ class CreditCardAdmin(admin.ModelAdmin):
     list_display = ['user', 'name', 'card_type', 'card_status', 'date']    
 
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['user', 'notification_type', 'amount' ,'date']
+    list_display = ['user', 'notification_type', 'amount', 'transaction', 'date']
+    search_fields = ['transaction_id']
+
+    def get_queryset(self, request):
+        # Resolve each notification's transaction through the index, in the same query
+        index = TransactionIndex.objects.filter(transaction_id=OuterRef("transaction_id"))
+        return super().get_queryset(request).annotate(
+            transaction_kind=Subquery(index.values("kind")[:1]),
+            transaction_object_id=Subquery(index.values("object_id")[:1]),
+        )
+
+    @admin.display(description="Transaction")
+    def transaction(self, obj):
+        return transaction_admin_link(obj.transaction_kind, obj.transaction_object_id, obj.transaction_id)
 
 class BeneficiaryAdmin(admin.ModelAdmin):
     list_display = ['user', 'name', 'account_number', 'bank_name', 'is_active']
@@ -36,6 +117,60 @@ class ScheduledPaymentAdmin(admin.ModelAdmin):
     list_display = ['payment_id', 'user', 'amount', 'frequency', 'status', 'next_execution']
     list_filter = ['status', 'frequency']
 
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['transaction_id', 'account', 'book', 'entry_type', 'amount', 'transaction_type', 'date']
+    list_filter = ['book', 'entry_type', 'transaction_type']
+    search_fields = ['transaction_id', 'account__account_number']
+
+    # The ledger is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class SettlementBatchAdmin(admin.ModelAdmin):
+    list_display = ['batch_id', 'transfer_count', 'total_amount', 'settled_by', 'date']
+    readonly_fields = ['batch_id', 'settled_by', 'transfer_count', 'total_amount', 'bank_totals', 'date']
+
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['account', 'balance', 'taken_at']
+    readonly_fields = ['account', 'balance', 'taken_at']
+
+class BalanceShardAdmin(admin.ModelAdmin):
+    list_display = ['account', 'index', 'balance']
+    readonly_fields = ['account', 'index', 'balance']
+
+class ReconciliationMismatchAdmin(admin.ModelAdmin):
+    list_display = ['run_id', 'account', 'recorded_balance', 'expected_balance', 'difference', 'date']
+    search_fields = ['run_id', 'account__account_number']
+    readonly_fields = ['run_id', 'account', 'recorded_balance', 'expected_balance', 'difference', 'date']
+
+class AccountStatementAdmin(admin.ModelAdmin):
+    list_display = ['account', 'month', 'opening_balance', 'closing_balance', 'transaction_count', 'generated_at']
+    list_filter = ['month']
+    search_fields = ['account__account_number']
+    readonly_fields = ['account', 'month', 'opening_balance', 'closing_balance', 'transaction_count', 'html_file', 'pdf_file', 'generated_at']
+
+class MonthlyAccountStatsAdmin(admin.ModelAdmin):
+    list_display = ['account', 'month', 'sent_total', 'received_total', 'deposited_total', 'withdrawn_total', 'requests_paid_total', 'requests_received_total']
+    list_filter = ['month']
+    search_fields = ['account__account_number']
+    readonly_fields = [field.name for field in MonthlyAccountStats._meta.fields]
+
+class TransactionIndexAdmin(admin.ModelAdmin):
+    list_display = ['transaction_id', 'kind', 'user', 'counterparty', 'amount', 'status', 'date', 'transaction']
+    list_filter = ['kind', 'status']
+    search_fields = ['transaction_id']
+    readonly_fields = ['transaction_id', 'kind', 'object_id', 'user', 'counterparty', 'amount', 'status', 'date']
+
+    @admin.display(description="Open")
+    def transaction(self, obj):
+        return transaction_admin_link(obj.kind, obj.object_id, obj.transaction_id)
+
 admin.site.register(Transfer, TransferAdmin)
 admin.site.register(Deposit, DepositAdmin)
 admin.site.register(Withdrawal, WithdrawalAdmin)
@@ -45,4 +180,11 @@ admin.site.register(Notification, NotificationAdmin)
 admin.site.register(Beneficiary, BeneficiaryAdmin)
 admin.site.register(AccountFreeze, AccountFreezeAdmin)
 admin.site.register(ScheduledPayment, ScheduledPaymentAdmin)
-
+admin.site.register(LedgerEntry, LedgerEntryAdmin)
+admin.site.register(BalanceShard, BalanceShardAdmin)
+admin.site.register(SettlementBatch, SettlementBatchAdmin)
+admin.site.register(BalanceSnapshot, BalanceSnapshotAdmin)
+admin.site.register(ReconciliationMismatch, ReconciliationMismatchAdmin)
+admin.site.register(TransactionIndex, TransactionIndexAdmin)
+admin.site.register(AccountStatement, AccountStatementAdmin)
+admin.site.register(MonthlyAccountStats, MonthlyAccountStatsAdmin)
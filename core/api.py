@@ -0,0 +1,139 @@
+"""
+JSON transaction history for the mobile app.
+
+``GET /api/transactions/`` returns one cursor-paginated page of the feed
+(core.feed) and takes the transaction list's filters, plus:
+
+    fields  Comma-separated subset of API_FIELDS to return (default: all)
+    limit   Page size, at most MAX_PAGE_SIZE
+    cursor  ``next_cursor`` or ``previous_cursor`` of an earlier page
+
+Fields read from the TransactionIndex row are served without loading the
+transactions themselves; only "counterparty" and "description" need them.
+
+Responses carry a weak ETag built from the newest change to the user's
+TransactionIndex rows and how many there are, so a refresh that sends
+``If-None-Match`` gets ``304 Not Modified`` after one aggregate over the
+index and no serialization.
+"""
+import hashlib
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+
+from .export import EXPORT_FIELDS, EXPORT_RELATED, history_row
+from .feed import InvalidCursor, feed_page
+from .models import TransactionIndex
+from .transaction import feed_filters
+
+API_FIELDS = EXPORT_FIELDS
+
+# Fields that need the transaction itself rather than its index row
+HYDRATED_FIELDS = {"counterparty", "description"}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def transactions_etag(request):
+    """
+    Weak ETag of ``request``'s response.
+
+    Index rows are rewritten whenever a transaction is saved or changes
+    status, and deleting a transaction lowers the count, so any change to
+    the user's history changes the tag. The query string is included
+    because every page and field selection is a different representation.
+    """
+    if not request.user.is_authenticated:
+        return None
+    user = request.user
+    state = TransactionIndex.objects.filter(Q(user=user) | Q(counterparty=user)).aggregate(
+        changed=Max("updated_at"), count=Count("pk"),
+    )
+    changed = state["changed"].isoformat() if state["changed"] else ""
+    key = f"{user.pk}|{changed}|{state['count']}|{request.GET.urlencode()}"
+    return f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def _index_fields(user, row):
+    """The API fields that can be read from a feed row."""
+    kind = row["kind"]
+    if kind == "transfer":
+        outgoing = row["user"] == user.pk
+    elif kind == "request":
+        # The receiver of a request (the index's counterparty) is the one who pays it
+        outgoing = row["counterparty"] == user.pk
+    else:
+        outgoing = kind == "withdraw"
+    return {
+        "date": row["date"],
+        "transaction_id": row["transaction_id"],
+        "type": kind,
+        "direction": "debit" if outgoing else "credit",
+        "amount": row["amount"],
+        "status": row["status"],
+    }
+
+
+def _serialize(values, fields):
+    item = {field: values[field] for field in fields}
+    if "date" in item:
+        item["date"] = item["date"].isoformat()
+    if "amount" in item:
+        item["amount"] = str(item["amount"])
+    return item
+
+
+@login_required
+@require_safe
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=transactions_etag)
+def transaction_api(request):
+    """One page of the user's transactions as JSON."""
+    user = request.user
+
+    requested = request.GET.get("fields")
+    fields = [field for field in requested.split(",") if field] if requested else list(API_FIELDS)
+    unknown = [field for field in fields if field not in API_FIELDS]
+    if unknown or not fields:
+        return JsonResponse(
+            {"error": f"Unknown field(s): {', '.join(unknown) or '(none given)'}. Choose from {', '.join(API_FIELDS)}."},
+            status=400,
+        )
+
+    try:
+        page_size = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "limit must be a number."}, status=400)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    kinds, filters, invalid_date = feed_filters(request)
+    if invalid_date:
+        return JsonResponse({"error": "Dates must be in the format YYYY-MM-DD."}, status=400)
+
+    try:
+        page = feed_page(
+            user,
+            cursor=request.GET.get("cursor"),
+            page_size=page_size,
+            total=None,
+            kinds=kinds,
+            related=EXPORT_RELATED,
+            **filters,
+        )
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    if HYDRATED_FIELDS.intersection(fields):
+        items = [history_row(user, obj.transaction_type, obj) for obj in page.object_list]
+    else:
+        items = [_index_fields(user, row) for row in page.rows]
+
+    return JsonResponse({
+        "transactions": [_serialize(item, fields) for item in items],
+        "next_cursor": page.next_cursor,
+        "previous_cursor": page.previous_cursor,
+    })
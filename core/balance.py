@@ -0,0 +1,253 @@
+"""
+Balance mutation service.
+
+Every code path that moves money goes through these helpers. Balances are
+changed with conditional F() expression UPDATEs that touch only the
+``account_balance`` column, under row locks taken in a fixed (primary key)
+order so two transfers between the same pair of accounts can never deadlock.
+Each movement also appends its debit/credit pair to the ledger in the same
+database transaction; ``account_balance`` is a cached projection of it.
+
+Business accounts with ``balance_shard_count`` set receive credits on
+BalanceShard rows instead, so incoming transfers do not serialize on the
+Account row; debits fold the shards back in only when they need the funds.
+"""
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+from account.models import Account
+from . import ledger
+from .models import BalanceShard, LedgerEntry
+
+
+class InsufficientFunds(Exception):
+    """Raised when a debit would take an account balance below zero."""
+
+    def __init__(self, account, amount):
+        self.account = account
+        self.amount = amount
+        super().__init__(f"Insufficient funds in account {account.account_number} for {amount}")
+
+
+def _as_amount(amount):
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise ValueError("Amount must be greater than zero")
+    return amount
+
+
+def is_sharded(account):
+    """Whether credits to ``account`` go to its balance shards."""
+    return account.business_account and account.balance_shard_count > 0
+
+
+def lock_accounts(*accounts):
+    """
+    Take row locks on the given accounts in primary key order.
+
+    Must be called inside ``transaction.atomic()``. ``None`` entries (e.g. the
+    receiver of an external transfer) are ignored.
+    """
+    pks = {account.pk for account in accounts if account is not None}
+    if pks:
+        list(
+            Account.objects.select_for_update()
+            .filter(pk__in=pks)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+
+def debit(account, amount, allow_overdraft=False):
+    """
+    Subtract ``amount`` from ``account`` if, and only if, the balance covers it.
+
+    ``allow_overdraft`` skips the balance condition; it is only used when
+    reversing a transfer the receiver has already spent.
+
+    Raises:
+        InsufficientFunds: if the balance is lower than ``amount``.
+    """
+    amount = _as_amount(amount)
+    accounts = Account.objects.filter(pk=account.pk)
+    if not allow_overdraft:
+        accounts = accounts.filter(account_balance__gte=amount)
+    updated = accounts.update(account_balance=F("account_balance") - amount)
+    if not updated and fold_shards(account):
+        # The funds were sitting in balance shards; try again now they're folded in
+        updated = accounts.update(account_balance=F("account_balance") - amount)
+    if not updated:
+        raise InsufficientFunds(account, amount)
+
+
+def credit(account, amount, shard_key=None):
+    """
+    Add ``amount`` to ``account``.
+
+    For sharded accounts the credit lands on the shard picked by hashing
+    ``shard_key`` (normally the transaction id).
+    """
+    amount = _as_amount(amount)
+    if not is_sharded(account):
+        Account.objects.filter(pk=account.pk).update(account_balance=F("account_balance") + amount)
+        return
+
+    index = zlib.crc32(str(shard_key).encode()) % account.balance_shard_count
+    shards = BalanceShard.objects.filter(account=account, index=index)
+    if not shards.update(balance=F("balance") + amount):
+        BalanceShard.objects.get_or_create(account=account, index=index)
+        shards.update(balance=F("balance") + amount)
+
+
+def fold_shards(account):
+    """
+    Move the balance of every shard of ``account`` back onto the account row.
+
+    Must be called inside ``transaction.atomic()`` while holding the lock on
+    the account (see ``lock_accounts``).
+
+    Returns:
+        Decimal: The amount folded in (0 when there was nothing to fold)
+    """
+    shards = list(
+        BalanceShard.objects.select_for_update()
+        .filter(account=account)
+        .exclude(balance=0)
+        .order_by("index")
+    )
+    total = sum((shard.balance for shard in shards), Decimal("0.00"))
+    if total:
+        BalanceShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(balance=0)
+        Account.objects.filter(pk=account.pk).update(account_balance=F("account_balance") + total)
+    return total
+
+
+def consolidate_balance(account):
+    """Fold ``account``'s shards into its balance in a transaction of its own."""
+    with transaction.atomic():
+        lock_accounts(account)
+        return fold_shards(account)
+
+
+def get_balance(account):
+    """
+    Return the spendable balance of ``account``: the account row plus, for
+    sharded business accounts, whatever is still sitting in its shards.
+    """
+    if not account.business_account:
+        return account.account_balance
+    shards = BalanceShard.objects.filter(account=account).aggregate(total=Sum("balance"))["total"]
+    return account.account_balance + (shards or Decimal("0.00"))
+
+
+def transfer_funds(source, destination, amount, reference, book="external",
+                   transaction_type=None, allow_overdraft=False):
+    """
+    Move ``amount`` from ``source`` to ``destination`` in one short transaction.
+
+    Either side may be ``None`` for money entering or leaving the bank
+    (deposits, withdrawals, external transfers); that side is booked against
+    the ``book`` clearing account in the ledger.
+
+    Args:
+        source: Account to debit, or None
+        destination: Account to credit, or None
+        amount: Amount to move
+        reference: The Transfer/Deposit/Withdrawal/PaymentRequest being applied
+        book: Ledger book for the non-customer side
+        transaction_type: Ledger transaction type override (e.g. "refund")
+        allow_overdraft: Skip the sufficient-funds condition on the debit
+
+    Raises:
+        InsufficientFunds: if ``source`` cannot cover ``amount``. Nothing is
+            written in that case.
+        ValueError: if ``source`` and ``destination`` are the same account.
+    """
+    amount = _as_amount(amount)
+    if source is not None and destination is not None and source.pk == destination.pk:
+        raise ValueError("Cannot transfer to the same account")
+    with transaction.atomic():
+        # Sharded destinations are credited without locking their account row
+        lock_accounts(source, None if destination is None or is_sharded(destination) else destination)
+        if source is not None:
+            debit(source, amount, allow_overdraft=allow_overdraft)
+        if destination is not None:
+            credit(destination, amount, shard_key=reference.transaction_id)
+        ledger.record(source, destination, amount, reference, book, transaction_type)
+
+
+def transfer_to_many(source, payments, book="external", chunk_size=500):
+    """
+    Debit ``source`` once and credit many accounts in one short transaction.
+
+    Non-sharded destinations are credited with one grouped
+    ``CASE WHEN pk=... THEN amount`` UPDATE per ``chunk_size`` accounts
+    instead of one UPDATE each, and all ledger rows go in with bulk INSERTs.
+
+    Args:
+        source: Account to debit, or None if the money comes from ``book``
+            (e.g. approving a batch of deposits)
+        payments: List of (destination Account, amount, reference) tuples
+        book: Ledger book for the source side when ``source`` is None
+        chunk_size: Accounts credited per UPDATE
+
+    Raises:
+        InsufficientFunds: if ``source`` cannot cover the total. Nothing is
+            written in that case.
+        ValueError: if ``source`` is also one of the destinations.
+    """
+    payments = [(destination, _as_amount(amount), reference) for destination, amount, reference in payments]
+    if source is not None and any(destination.pk == source.pk for destination, _, _ in payments):
+        raise ValueError("Cannot transfer to the same account")
+    total = sum((amount for _, amount, _ in payments), Decimal("0.00"))
+
+    with transaction.atomic():
+        lock_accounts(source, *(destination for destination, _, _ in payments if not is_sharded(destination)))
+        if source is not None:
+            debit(source, total)
+
+        # Several payments may go to the same account
+        grouped = defaultdict(Decimal)
+        for destination, amount, reference in payments:
+            if is_sharded(destination):
+                credit(destination, amount, shard_key=reference.transaction_id)
+            else:
+                grouped[destination.pk] += amount
+
+        pks = list(grouped)
+        for start in range(0, len(pks), chunk_size):
+            chunk = pks[start:start + chunk_size]
+            increment = Case(
+                *(When(pk=pk, then=Value(grouped[pk])) for pk in chunk),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+            Account.objects.filter(pk__in=chunk).update(account_balance=F("account_balance") + increment)
+
+        LedgerEntry.objects.bulk_create(
+            [
+                entry
+                for destination, amount, reference in payments
+                for entry in ledger.build_entries(source, destination, amount, reference, book)
+            ],
+            batch_size=1000,
+        )
+
+
+def rebuild_balance(account):
+    """
+    Reset the cached ``account_balance`` to the account's ledger total.
+
+    Returns:
+        Decimal: The rebuilt balance
+    """
+    with transaction.atomic():
+        lock_accounts(account)
+        fold_shards(account)
+        balance = ledger.ledger_balance(account)
+        Account.objects.filter(pk=account.pk).update(account_balance=balance)
+    account.account_balance = balance
+    return balance
@@ -1,4 +1,8 @@
-from core.models import Notification
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from core.models import Notification, TransactionIndex
+from core.summary import notification_version, summary_version
 
 
 
@@ -6,11 +10,28 @@ from core.models import Notification
 
 def default(request):
     try:
-        notifications = Notification.objects.filter(user=request.user).order_by("-id")[:10]
+        # Deep-link only to transactions that exist and belong to the user
+        user_transaction = TransactionIndex.objects.filter(
+            Q(user=request.user) | Q(counterparty=request.user),
+            transaction_id=OuterRef("transaction_id"),
+        )
+        notifications = (
+            Notification.objects.filter(user=request.user)
+            .annotate(has_transaction=Exists(user_transaction))
+            .order_by("-id")[:10]
+        )
     except:
         notifications = None
 
-    return {
+    context = {
         "notifications":notifications,
        
-    }
\ No newline at end of file
+        # Keys and lifetimes of the dashboard templates' cached fragments
+        "fragment_timeout": settings.DASHBOARD_FRAGMENT_TTL,
+        "notification_fragment_timeout": settings.NOTIFICATION_FRAGMENT_TTL,
+    }
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        context["account_version"] = summary_version(user.pk)
+        context["notification_version"] = notification_version(user.pk)
+    return context
@@ -5,6 +5,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 import json
 
+from .balance import get_balance
 from .models import Account, CreditCard, Notification
 
 
@@ -29,6 +30,7 @@ def credit_card_detail(request, card_id):
 
     context = {
         "account": account,
+        "balance": get_balance(account),
         "credit_card": credit_card,
     }
     return render(request, 'credit_card/card_detail.html', context)
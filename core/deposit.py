@@ -13,11 +13,11 @@ from .models import (
     DEPOSIT_METHOD
 )
 # from .crypto_service import CryptoExchangeService  # Commented out - module doesn't exist
-from .utils import is_account_frozen, get_freeze_reason_display, send_html_email
+from .utils import is_account_frozen, get_freeze_reason_display
+from .idempotency import idempotent, new_idempotency_key
+from .transitions import transition
 from django.core.exceptions import ValidationError
 
-from userauths.models import User
-
 # Initialize NOWPayments client - COMMENTED OUT
 # nowpayments_client = NOWPayments(settings.NOWPAYMENTS_API_KEY)
 # if settings.NOWPAYMENTS_SANDBOX:
@@ -62,14 +62,13 @@ def confirm_deposit(request, transaction_id):
         messages.warning(request, "This deposit has already been processed.")
         return redirect("core:transaction-detail", transaction_id=transaction_id)
     
-    if request.method == "POST":
-        return redirect("core:process-deposit", transaction_id=transaction_id)
-    
     return render(request, "core/deposit/confirm_deposit.html", {
-        "transaction": transaction
+        "transaction": transaction,
+        "idempotency_key": new_idempotency_key(),
     })
 
 @login_required
+@idempotent
 @transaction.atomic
 def process_deposit(request, transaction_id):
     """Process the deposit transaction."""
@@ -77,62 +76,30 @@ def process_deposit(request, transaction_id):
                            transaction_id=transaction_id,
                            user=request.user)
     
+    if request.method != "POST":
+        return redirect("core:confirm-deposit", transaction_id=transaction_id)
+    
     if txn.status != "pending":
         messages.warning(request, "This deposit has already been processed.")
         return redirect("core:transaction-detail", transaction_id=transaction_id)
     
     try:
-        account = Account.objects.get(user=request.user)
-        
-        # Update transaction status to processing (pending admin approval)
-        txn.status = "processing"
-        txn.save()
-        
-        # NOTE: Balance update is now handled by signal when Admin approves (sets to completed)
-        
-        # Create notification for request
-        Notification.objects.create(
-            user=request.user,
-            notification_type="Deposit Request", # Or similar, generic 'None' or new type. 
-        )
-        
-        # Email Admins
-        try:
-            subject = f'New Deposit Request: ${txn.amount}'
-            message = f'User {txn.user.username} (Account: {account.account_number}) has requested a deposit of ${txn.amount}.\nTransaction ID: {txn.transaction_id}\n\nPlease review and approve.'
-            context = {
-                'subject_header': 'New Deposit Request',
-                'message': message
-            }
-            admins = User.objects.filter(is_superuser=True)
-            recipient_list = [admin.email for admin in admins]
-            send_html_email(subject, recipient_list, context)
-        except:
-            pass
-        
-        # Email User
-        try:
-            user_subject = f'Deposit Request Received: ${txn.amount}'
-            user_message = f'Hello {txn.user.username},\n\nWe have received your deposit request of ${txn.amount}.\nTransaction ID: {txn.transaction_id}\n\nYour request is currently being processed and will be screened shortly. Once approved, the funds will be credited to your account immediately.\n\nThank you for banking with us.'
-            user_context = {
-                'subject_header': 'Deposit Processing',
-                'message': user_message
-            }
-            send_html_email(user_subject, [txn.user.email], user_context)
-        except:
-            pass
-        
+        # A savepoint, so that a database error leaves the view's transaction
+        # usable for marking the deposit failed
+        with transaction.atomic():
+            # Submit for admin approval; the balance is credited when an admin
+            # completes the deposit. The conditional update in transition()
+            # makes sure a deposit is submitted only once.
+            if not transition(txn, "processing"):
+                messages.warning(request, "This deposit has already been processed.")
+                return redirect("core:transaction-detail", transaction_id=transaction_id)
+
         messages.success(request, f"Deposit request of {txn.amount} submitted successfully. Pending approval.")
         return redirect("core:deposit-success", transaction_id=transaction_id)
-        
-    except Account.DoesNotExist:
-        txn.status = "failed"
-        txn.save()
-        messages.error(request, "Account not found.")
-        return redirect("account:dashboard")
+
     except Exception as e:
-        txn.status = "failed"
-        txn.save()
+        txn.refresh_from_db(fields=["status"])
+        transition(txn, "failed")
         messages.error(request, f"Error processing deposit: {str(e)}")
         return redirect("core:deposit-failure", transaction_id=transaction_id)
 
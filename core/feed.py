@@ -0,0 +1,301 @@
+"""
+Unified transaction feed.
+
+A user's history is spread over four tables. The feed instead reads the
+narrow TransactionIndex table (one row per transaction, indexed by owner
+and date), which the database filters, orders and slices. Only the rows of
+the page being shown are then loaded as model instances by ``hydrate``,
+with one query per transaction type.
+
+Pages are addressed by an opaque keyset cursor on (date, transaction_id)
+rather than an offset, so a deep page costs the same as the first one.
+"""
+import base64
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils import timezone
+
+from .models import Deposit, PaymentRequest, TransactionIndex, Transfer, Withdrawal
+from .search import matching_transaction_ids, words
+
+# kind -> model; kinds match each model's ``transaction_type``
+FEED_MODELS = {
+    "transfer": Transfer,
+    "deposit": Deposit,
+    "withdraw": Withdrawal,
+    "request": PaymentRequest,
+}
+
+# Relations the transaction list template reads for each kind
+FEED_RELATED = {
+    "transfer": ("user", "receiver"),
+    "deposit": ("credit_card",),
+    "withdraw": ("user",),
+    "request": ("sender", "receiver"),
+}
+
+# Relations the transaction detail template reads for each kind
+DETAIL_RELATED = {
+    "transfer": ("user__kyc", "receiver__kyc"),
+    "deposit": ("credit_card",),
+    "withdraw": ("user__kyc",),
+    "request": ("sender__kyc", "receiver__kyc"),
+}
+
+# Transaction id prefix -> kind, from each model's ShortUUIDField
+# ("TRF" -> "transfer", "DEP" -> "deposit", ...)
+TRANSACTION_PREFIXES = {
+    model._meta.get_field("transaction_id").prefix: kind
+    for kind, model in FEED_MODELS.items()
+}
+
+FEED_ORDERING = ("-date", "-transaction_id")
+
+# The approximate total counts at most this many rows
+APPROXIMATE_TOTAL_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def _owned_by(kind, user):
+    if kind == "transfer":
+        return Q(user=user) | Q(receiver=user)
+    if kind == "request":
+        return Q(sender=user) | Q(receiver=user)
+    return Q(user=user)
+
+
+def day_start(day):
+    """The first instant of ``day`` in the current time zone, as an aware datetime."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def feed_rows(user, kinds=None, search=None, status=None, date_from=None, date_to=None):
+    """
+    ``user``'s TransactionIndex rows, filtered.
+
+    Every filter is a plain, indexable predicate on the index's own
+    columns, so the database only has to read the matching rows. Days are
+    taken in the current time zone and turned into a half-open
+    ``[start, end)`` datetime range rather than a ``__date`` lookup, which
+    would have to convert every row's timestamp.
+
+    Args:
+        user: Owner of the transactions
+        kinds: Transaction types to include (default: all of them)
+        search: Optional text looked up in the full-text search index;
+            ignored if it has no words in it (e.g. only punctuation)
+        status: Optional exact status
+        date_from: Optional first day (date) to include
+        date_to: Optional last day (date) to include
+    """
+    queryset = TransactionIndex.objects.filter(Q(user=user) | Q(counterparty=user))
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    if search and words(search):
+        queryset = queryset.filter(transaction_id__in=matching_transaction_ids(user, search))
+    if status:
+        queryset = queryset.filter(status=status)
+    if date_from:
+        queryset = queryset.filter(date__gte=day_start(date_from))
+    if date_to:
+        queryset = queryset.filter(date__lt=day_start(date_to + timedelta(days=1)))
+    return queryset
+
+
+def transaction_feed(user, kinds=None, after=None, before=None, **filters):
+    """
+    Build the newest-first feed of ``user``'s transactions.
+
+    Nothing is evaluated here: slicing the result runs a single
+    ``SELECT ... ORDER BY date DESC LIMIT`` query on TransactionIndex.
+
+    Args:
+        user: Owner of the transactions
+        kinds: Transaction types to include (default: all of them)
+        after: Optional (date, transaction_id) key; only older rows are included
+        before: Optional (date, transaction_id) key; only newer rows are
+            included, and the feed is ordered oldest-first
+        **filters: Passed to ``feed_rows``
+
+    Returns:
+        QuerySet: rows of {"kind", "object_id", "date", "transaction_id",
+            "amount", "status", "user", "counterparty"}
+    """
+    feed = feed_rows(user, kinds, **filters).values(
+        "kind", "object_id", "date", "transaction_id", "amount", "status", "user", "counterparty",
+    )
+    if after is not None:
+        return feed.filter(
+            Q(date__lt=after[0]) | Q(date=after[0], transaction_id__lt=after[1])
+        ).order_by(*FEED_ORDERING)
+    if before is not None:
+        return feed.filter(
+            Q(date__gt=before[0]) | Q(date=before[0], transaction_id__gt=before[1])
+        ).order_by("date", "transaction_id")
+    return feed.order_by(*FEED_ORDERING)
+
+
+def encode_cursor(row, direction):
+    """Opaque cursor pointing after ("next") or before ("prev") a feed row."""
+    raw = f"{direction}|{row['date'].isoformat()}|{row['transaction_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by ``encode_cursor``.
+
+    Returns:
+        tuple: (direction, (date, transaction_id))
+
+    Raises:
+        InvalidCursor: The cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        direction, date, transaction_id = raw.split("|", 2)
+        key = (datetime.fromisoformat(date), transaction_id)
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if direction not in ("next", "prev") or key[0].tzinfo is None:
+        raise InvalidCursor(cursor)
+    return direction, key
+
+
+class FeedPage:
+    """
+    One page of the transaction feed, with cursors for its neighbours.
+
+    ``rows`` are the page's TransactionIndex values; ``object_list`` (the
+    model instances) is only loaded when first used.
+    """
+
+    def __init__(self, rows, has_next, has_previous, total=None, total_is_approximate=False, related=FEED_RELATED):
+        self.rows = rows
+        self.related = related
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = encode_cursor(rows[-1], "next") if has_next and rows else None
+        self.previous_cursor = encode_cursor(rows[0], "prev") if has_previous and rows else None
+        self.total = total
+        self.total_is_approximate = total_is_approximate
+
+    @cached_property
+    def object_list(self):
+        return hydrate(self.rows, related=self.related)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def feed_page(user, cursor=None, page_size=20, total="exact", kinds=None, related=FEED_RELATED, **filters):
+    """
+    Fetch one page of ``user``'s feed using keyset pagination.
+
+    Each page is one query of ``page_size + 1`` rows (the extra row tells
+    whether another page exists), however deep the cursor points.
+
+    Args:
+        user: Owner of the transactions
+        cursor: Cursor from a previous page's ``next_cursor`` or
+            ``previous_cursor``; None for the newest page
+        page_size: Rows per page
+        total: "exact" counts every matching row; "approximate" counts at
+            most APPROXIMATE_TOTAL_LIMIT rows; None skips counting
+        kinds: Transaction types to include (default: all of them)
+        related: kind -> relations loaded with the page's instances
+        **filters: Passed to ``feed_rows``
+
+    Returns:
+        FeedPage
+
+    Raises:
+        InvalidCursor: The cursor is malformed
+    """
+    direction, key = decode_cursor(cursor) if cursor else ("next", None)
+    if direction == "prev":
+        rows = list(transaction_feed(user, kinds, before=key, **filters)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        rows = list(transaction_feed(user, kinds, after=key, **filters)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = key is not None
+
+    count = None
+    if total == "exact":
+        count = transaction_feed(user, kinds, **filters).count()
+    elif total == "approximate":
+        count = transaction_feed(user, kinds, **filters)[:APPROXIMATE_TOTAL_LIMIT].count()
+
+    return FeedPage(
+        rows, has_next, has_previous,
+        total=count,
+        total_is_approximate=total == "approximate" and count == APPROXIMATE_TOTAL_LIMIT,
+        related=related,
+    )
+
+
+def resolve_transaction(user, transaction_id):
+    """
+    Find one of ``user``'s transactions by id, with a single query.
+
+    The id's prefix says which table to look in, and the lookup is limited
+    to transactions ``user`` owns.
+
+    Returns:
+        Transfer, Deposit, Withdrawal, PaymentRequest or None
+    """
+    kind = TRANSACTION_PREFIXES.get(transaction_id[:3])
+    if kind is None:
+        return None
+    model = FEED_MODELS[kind]
+    try:
+        return (
+            model.objects
+            .select_related(*DETAIL_RELATED[kind])
+            .get(_owned_by(kind, user), transaction_id=transaction_id)
+        )
+    except model.DoesNotExist:
+        return None
+
+
+def hydrate(rows, related=FEED_RELATED):
+    """
+    Load the model instances for feed rows, keeping the feed's order.
+
+    Costs one query per transaction type present in ``rows``.
+
+    Args:
+        rows: Feed rows ({"kind", "object_id", ...})
+        related: kind -> relations to ``select_related``
+    """
+    rows = list(rows)
+    ids_by_kind = {}
+    for row in rows:
+        ids_by_kind.setdefault(row["kind"], []).append(row["object_id"])
+
+    instances = {}
+    for kind, ids in ids_by_kind.items():
+        queryset = FEED_MODELS[kind].objects.filter(pk__in=ids).select_related(*related[kind])
+        for obj in queryset:
+            instances[(kind, obj.pk)] = obj
+
+    return [
+        instances[(row["kind"], row["object_id"])]
+        for row in rows
+        if (row["kind"], row["object_id"]) in instances
+    ]
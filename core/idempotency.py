@@ -0,0 +1,109 @@
+"""
+Idempotency keys for money-moving POSTs.
+
+Confirmation pages embed a fresh key in their form (or API clients send an
+``Idempotency-Key`` header). The first request carrying a key runs the view
+and stores its response; a replay of the same key within
+``settings.IDEMPOTENCY_KEY_TTL`` gets the stored response back without the
+view (and the database writes behind it) running again.
+"""
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_KEY_FIELD = "idempotency_key"
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+
+def new_idempotency_key():
+    """Generate a key to embed in a confirmation form."""
+    return uuid.uuid4().hex
+
+
+def allow_retry(request):
+    """
+    Let a retry with the same key run the view again.
+
+    Call from an ``idempotent`` view when it turns the submission away
+    without moving money (a wrong PIN, insufficient funds), so the corrected
+    retry is not answered with the stored failure.
+    """
+    request.idempotency_retry_allowed = True
+
+
+def _claim(request, key):
+    """
+    Try to claim ``key`` for this request.
+
+    Returns:
+        tuple: (claimed: bool, record: IdempotencyKey)
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+    # Expired keys are cleaned up lazily, per user
+    IdempotencyKey.objects.filter(user=request.user, expires_at__lte=now).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=request.user,
+                key=key,
+                path=request.path,
+                expires_at=expires_at,
+            )
+        return True, record
+    except IntegrityError:
+        return False, IdempotencyKey.objects.get(user=request.user, key=key)
+
+
+def idempotent(view_func):
+    """
+    Decorator making a POST view safe to retry with the same idempotency key.
+
+    Requests without a key run normally. A replayed key returns the stored
+    redirect, ``409`` while the first request is still running,
+    and ``422`` if the key was first used on a different URL. Redirects the
+    view marked with ``allow_retry`` are not stored.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = (
+            request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            or request.POST.get(IDEMPOTENCY_KEY_FIELD)
+        )
+        if request.method != "POST" or not key or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+
+        claimed, record = _claim(request, key[:64])
+        if not claimed:
+            if record.path != request.path:
+                return HttpResponse("Idempotency key was used for a different request.", status=422)
+            if record.response_status is None:
+                return HttpResponse("This request is already being processed.", status=409)
+            return HttpResponseRedirect(record.response_location)
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if 300 <= response.status_code < 400 and not getattr(request, "idempotency_retry_allowed", False):
+            record.response_status = response.status_code
+            record.response_location = response["Location"]
+            record.save(update_fields=["response_status", "response_location"])
+        else:
+            # Only redirects of completed operations are replayed; anything
+            # else may be retried
+            record.delete()
+        return response
+
+    return wrapper
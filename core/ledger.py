@@ -0,0 +1,84 @@
+"""
+Double-entry ledger helpers.
+
+LedgerEntry rows are only ever inserted, never updated. Each money movement
+is written as one debit and one credit row; the side that is not a customer
+account is booked against one of the bank's clearing books.
+"""
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import LedgerEntry
+
+
+def build_entries(source, destination, amount, reference, book="external", transaction_type=None):
+    """
+    Build (unsaved) debit and credit rows for a single movement.
+
+    Args:
+        source: Account debited, or None if the money comes from ``book``
+        destination: Account credited, or None if the money goes to ``book``
+        amount: Decimal amount moved
+        reference: Transfer, Deposit, Withdrawal or PaymentRequest instance
+        book: Clearing book used for the non-customer side
+        transaction_type: Overrides ``reference.transaction_type`` (e.g. "refund")
+
+    Returns:
+        list: [debit LedgerEntry, credit LedgerEntry]
+    """
+    transaction_type = transaction_type or reference.transaction_type
+    date = timezone.now()
+
+    def leg(account, entry_type):
+        return LedgerEntry(
+            account=account,
+            book="customer" if account is not None else book,
+            entry_type=entry_type,
+            amount=amount,
+            transaction_id=reference.transaction_id,
+            transaction_type=transaction_type,
+            date=date,
+        )
+
+    return [leg(source, "debit"), leg(destination, "credit")]
+
+
+def record(source, destination, amount, reference, book="external", transaction_type=None):
+    """Insert the debit/credit pair for a movement with a single bulk INSERT."""
+    return LedgerEntry.objects.bulk_create(
+        build_entries(source, destination, amount, reference, book, transaction_type)
+    )
+
+
+def net_amount(credits, debits):
+    """Credits minus debits, treating missing (NULL) sums as zero."""
+    return (credits or Decimal("0.00")) - (debits or Decimal("0.00"))
+
+
+def net_totals():
+    """Aggregate expressions for summing ledger rows: use with ``net_amount``."""
+    return {
+        "credits": Sum("amount", filter=Q(entry_type="credit")),
+        "debits": Sum("amount", filter=Q(entry_type="debit")),
+    }
+
+
+def ledger_balance(account, until=None, since=None):
+    """
+    Sum an account's ledger rows (credits minus debits).
+
+    Args:
+        account: The Account instance
+        until: Optional datetime; only rows dated at or before it are counted
+        since: Optional datetime; only rows dated after it are counted
+    """
+    entries = LedgerEntry.objects.filter(account=account)
+    if until is not None:
+        entries = entries.filter(date__lte=until)
+    if since is not None:
+        entries = entries.filter(date__gt=since)
+
+    totals = entries.aggregate(**net_totals())
+    return net_amount(totals["credits"], totals["debits"])
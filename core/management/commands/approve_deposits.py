@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.approvals import approve_deposits, describe_approval
+from core.models import Deposit
+
+
+class Command(BaseCommand):
+    help = "Approve (complete and credit) submitted deposits in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "transaction_ids", nargs="*",
+            help="Deposit transaction ids to approve (default: every deposit awaiting approval).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Number of deposits approved per database transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        queryset = None
+        if options["transaction_ids"]:
+            queryset = Deposit.objects.filter(transaction_id__in=options["transaction_ids"])
+            missing = set(options["transaction_ids"]) - set(queryset.values_list("transaction_id", flat=True))
+            if missing:
+                raise CommandError(f"Unknown deposit(s): {', '.join(sorted(missing))}")
+
+        result = approve_deposits(queryset, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(describe_approval(result)))
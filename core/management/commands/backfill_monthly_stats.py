@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import backfill_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild MonthlyAccountStats from the completed transfers, deposits, withdrawals "
+        "and settled payment requests. Run while no transactions are being processed."
+    )
+
+    def handle(self, *args, **options):
+        written = backfill_stats()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} monthly stats row(s)."))
@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Time dashboard requests for one user with the templates' cached fragments "
+        "turned off and on. The summary cache is warm in both runs, so the "
+        "difference is mostly template rendering."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User whose dashboard is rendered.")
+        parser.add_argument(
+            "--requests", type=int, default=50,
+            help="Timed requests per run, after one warm-up request.",
+        )
+
+    def _host(self):
+        for host in settings.ALLOWED_HOSTS:
+            if host != "*" and not host.startswith("."):
+                return host
+        return "testserver"
+
+    def _run(self, client, url, requests):
+        timings = []
+        queries = 0
+        for number in range(requests + 1):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url, secure=True)
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f"The dashboard answered {response.status_code}; is the user's KYC confirmed?")
+            # The first request warms the caches
+            if number:
+                timings.append(elapsed * 1000)
+                queries = len(captured)
+        return timings, queries
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']!r}.")
+        if options["requests"] < 1:
+            raise CommandError("--requests must be at least 1.")
+
+        client = Client(HTTP_HOST=self._host())
+        client.force_login(user)
+        url = reverse("account:dashboard")
+        try:
+            with override_settings(DASHBOARD_FRAGMENT_TTL=0, NOTIFICATION_FRAGMENT_TTL=0):
+                uncached = self._run(client, url, options["requests"])
+            cached = self._run(client, url, options["requests"])
+        finally:
+            client.logout()
+
+        for label, (timings, queries) in (("fragments off", uncached), ("fragments on", cached)):
+            self.stdout.write(
+                f"{label:<14} median {statistics.median(timings):7.2f} ms   "
+                f"mean {statistics.mean(timings):7.2f} ms   {queries} queries"
+            )
+        saved = 1 - statistics.median(cached[0]) / statistics.median(uncached[0])
+        self.stdout.write(self.style.SUCCESS(f"Fragment caching saves {saved:.0%} of the median request time."))
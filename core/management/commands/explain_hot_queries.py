@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from account import dashboard
+from core.feed import transaction_feed
+from core.models import Deposit, MonthlyAccountStats, Notification
+from core.settlement import pending_external_transfers
+from core.stats import total_sums
+
+
+def hot_queries(user):
+    """(label, queryset) for the per-user queries behind the busiest pages."""
+    return [
+        # The dashboard summary (account.dashboard.compute_summary)
+        ("dashboard: sent/received totals",
+         MonthlyAccountStats.objects.filter(account=user.account).values("account").annotate(**total_sums())),
+        ("dashboard: sent transfers",
+         dashboard.sent_transfers(user)),
+        ("dashboard: received transfers",
+         dashboard.received_transfers(user)),
+        ("dashboard: cards",
+         dashboard.cards(user)),
+        # ... and the lists read on every dashboard request (load_dashboard)
+        ("dashboard: payment requests sent",
+         dashboard.sent_payment_requests(user)),
+        ("dashboard: payment requests received",
+         dashboard.received_payment_requests(user)),
+        ("transaction list: all types",
+         transaction_feed(user)[:21]),
+        ("transaction list: completed transfers",
+         transaction_feed(user, kinds=["transfer"], status="completed")[:21]),
+        ("notifications: unread",
+         Notification.objects.filter(user=user, is_read=False).order_by("-date")),
+        # The notification menu on every page (core.context_processor)
+        ("notifications: latest",
+         Notification.objects.filter(user=user).order_by("-id")[:10]),
+        ("admin: deposits awaiting approval",
+         Deposit.objects.filter(status="processing").order_by("pk")[:500]),
+        ("settlement: pending external transfers",
+         pending_external_transfers().order_by("id")[:500]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Print the database's EXPLAIN plan for each hot per-user query, to check that indexes are used."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="Username whose queries are explained (default: the first user).",
+        )
+        parser.add_argument(
+            "--analyze", action="store_true",
+            help="Run EXPLAIN ANALYZE (PostgreSQL only); the queries are executed.",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}.")
+        else:
+            user = User.objects.order_by("pk").first()
+            if user is None:
+                raise CommandError("There are no users to explain queries for.")
+
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze is only supported on PostgreSQL.")
+            explain_options = {"analyze": True, "buffers": True}
+
+        self.stdout.write(f"Query plans on {connection.vendor} for user {user.username!r}\n")
+        for label, queryset in hot_queries(user):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from account.models import Account
+from core.balance import consolidate_balance
+
+
+class Command(BaseCommand):
+    help = "Fold the balance shards of hot business accounts back into their account balance."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=500,
+            help="Number of accounts read per query.",
+        )
+
+    def handle(self, *args, **options):
+        accounts = (
+            Account.objects.filter(balance_shards__balance__gt=0)
+            .distinct()
+            .only("pk", "account_number")
+        )
+
+        folded_accounts = 0
+        for account in accounts.iterator(chunk_size=options["chunk_size"]):
+            # One short transaction per account keeps the lock window small
+            if consolidate_balance(account):
+                folded_accounts += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Folded balance shards of {folded_accounts} account(s)."))
@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from core.reconciliation import account_ranges
+from core.statements import parse_month, previous_month, statement_range
+
+
+def _init_worker():
+    # Each worker process opens its own database connections.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Render every account's monthly statement (HTML and PDF) to the default storage. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--month",
+            help="Statement month as YYYY-MM (default: last month).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Number of worker processes (1 runs in this process).",
+        )
+        parser.add_argument(
+            "--range-size", type=int, default=500,
+            help="Number of accounts rendered per work unit.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers < 1 or options["range_size"] < 1:
+            raise CommandError("--workers and --range-size must be positive.")
+
+        if options["month"]:
+            try:
+                month = parse_month(options["month"])
+            except ValueError:
+                raise CommandError("--month must be a month in YYYY-MM format.")
+        else:
+            month = previous_month(timezone.localdate())
+        month_value = f"{month:%Y-%m}"
+
+        ranges = account_ranges(options["range_size"])
+        jobs = [(month_value, first, last) for first, last in ranges]
+
+        if workers == 1 or len(jobs) <= 1:
+            results = [statement_range(*job) for job in jobs]
+        else:
+            # Connections must not be shared with forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = list(pool.map(statement_range, *zip(*jobs)))
+
+        generated = sum(result[0] for result in results)
+        skipped = sum(result[1] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"{month:%B %Y}: generated {generated} statement(s), {skipped} already done."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the transaction full-text search index from every Transfer, Deposit, Withdrawal and PaymentRequest."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Number of transactions indexed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} transaction(s) for search."))
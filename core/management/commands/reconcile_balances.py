@@ -0,0 +1,55 @@
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.reconciliation import account_ranges, reconcile_range
+
+
+def _init_worker():
+    # Each worker process opens its own database connections.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Check every account balance against its ledger and record mismatches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Number of worker processes (1 runs in this process).",
+        )
+        parser.add_argument(
+            "--range-size", type=int, default=10000,
+            help="Number of accounts reconciled per work unit.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000,
+            help="Number of account rows fetched per database round trip.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers < 1 or options["range_size"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers, --range-size and --chunk-size must be positive.")
+
+        run_id = uuid.uuid4().hex
+        ranges = account_ranges(options["range_size"])
+        jobs = [(run_id, first, last, options["chunk_size"]) for first, last in ranges]
+
+        if workers == 1 or len(jobs) <= 1:
+            results = [reconcile_range(*job) for job in jobs]
+        else:
+            # Connections must not be shared with forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = list(pool.map(reconcile_range, *zip(*jobs)))
+
+        checked = sum(result[0] for result in results)
+        mismatched = sum(result[1] for result in results)
+        style = self.style.SUCCESS if not mismatched else self.style.WARNING
+        self.stdout.write(style(
+            f"Run {run_id}: checked {checked} account(s), {mismatched} mismatch(es) recorded."
+        ))
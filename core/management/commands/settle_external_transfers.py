@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.settlement import pending_external_transfers, settle_external_transfers
+
+
+class Command(BaseCommand):
+    help = "Settle pending external transfers in batches, netting totals per receiving bank."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Maximum number of transfers per settlement batch.",
+        )
+        parser.add_argument(
+            "--bank",
+            help="Only settle transfers to this receiving bank.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = None
+        if options["bank"]:
+            queryset = pending_external_transfers().filter(receiver_bank=options["bank"])
+
+        batches = settle_external_transfers(options["batch_size"], queryset)
+
+        for batch in batches:
+            self.stdout.write(f"{batch.batch_id}: {batch.transfer_count} transfer(s), ${batch.total_amount}")
+            for bank, totals in batch.bank_totals.items():
+                self.stdout.write(f"    {bank}: {totals['count']} transfer(s), ${totals['total']}")
+
+        settled = sum(batch.transfer_count for batch in batches)
+        self.stdout.write(self.style.SUCCESS(f"Settled {settled} external transfer(s) in {len(batches)} batch(es)."))
@@ -0,0 +1,33 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.snapshots import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot every account's balance (run nightly; defaults to the start of today)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--as-of",
+            help="Snapshot balances as of midnight at the start of this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000,
+            help="Number of accounts snapshotted per batch.",
+        )
+
+    def handle(self, *args, **options):
+        if options["as_of"]:
+            try:
+                day = datetime.strptime(options["as_of"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+        else:
+            day = timezone.localdate()
+        as_of = timezone.make_aware(datetime.combine(day, time.min))
+
+        processed = take_snapshots(as_of, options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {processed} account balance(s) as of {as_of:%Y-%m-%d %H:%M %Z}."))
@@ -21,7 +21,9 @@ class AccountFreezeMiddleware:
         if request.user.is_authenticated:
             # Check if user has an account
             if hasattr(request.user, 'account'):
-                is_frozen, _ = is_account_frozen(request.user.account)
+                is_frozen, freeze_record = is_account_frozen(request.user.account)
+                # Reused by views that show the freeze (the dashboard)
+                request.account_freeze = (is_frozen, freeze_record)
                 
                 if is_frozen:
                     current_path = request.path
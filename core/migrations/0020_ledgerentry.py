@@ -0,0 +1,95 @@
+# Generated by Django 4.2 on 2026-10-18 10:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def _earliest_transactions(apps):
+    """{account_id: date of the account's earliest transaction}"""
+    earliest = {}
+    sources = [
+        ("Transfer", "account"),
+        ("Transfer", "receiver_account"),
+        ("Deposit", "account"),
+        ("Withdrawal", "account"),
+        ("PaymentRequest", "sender_account"),
+        ("PaymentRequest", "receiver_account"),
+    ]
+    for model_name, account_field in sources:
+        model = apps.get_model("core", model_name)
+        rows = (
+            model.objects.filter(**{f"{account_field}__isnull": False})
+            .order_by()
+            .values_list(account_field)
+            .annotate(first=models.Min("date"))
+        )
+        for account_id, first in rows:
+            if account_id not in earliest or first < earliest[account_id]:
+                earliest[account_id] = first
+    return earliest
+
+
+def open_ledger(apps, schema_editor):
+    """
+    Seed the ledger with each account's existing balance.
+
+    The opening entries are dated when the account was opened, or at its
+    earliest transaction if that is older, so that balances as of any
+    earlier date still include them.
+    """
+    Account = apps.get_model("account", "Account")
+    LedgerEntry = apps.get_model("core", "LedgerEntry")
+    earliest = _earliest_transactions(apps)
+
+    entries = []
+    for account in Account.objects.exclude(account_balance=0).iterator():
+        transaction_id = f"OPEN{account.account_number}"
+        credit = account.account_balance > 0
+        opened = min(filter(None, [account.date, earliest.get(account.pk)]), default=django.utils.timezone.now())
+        entries.append(LedgerEntry(
+            account=None, book="opening", entry_type="debit" if credit else "credit",
+            amount=abs(account.account_balance), transaction_id=transaction_id, date=opened,
+        ))
+        entries.append(LedgerEntry(
+            account=account, book="customer", entry_type="credit" if credit else "debit",
+            amount=abs(account.account_balance), transaction_id=transaction_id, date=opened,
+        ))
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0008_account_business_account'),
+        ('core', '0019_alter_deposit_date_alter_paymentrequest_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.CharField(choices=[('customer', 'Customer Account'), ('deposits', 'Deposit Clearing'), ('withdrawals', 'Withdrawal Clearing'), ('external', 'External Settlement'), ('opening', 'Opening Balance')], default='customer', max_length=20)),
+                ('entry_type', models.CharField(choices=[('debit', 'Debit'), ('credit', 'Credit')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_id', models.CharField(max_length=20)),
+                ('transaction_type', models.CharField(choices=[('deposit', 'Deposit'), ('transfer', 'Transfer'), ('received', 'Received'), ('withdraw', 'Withdrawal'), ('refund', 'Refund'), ('request', 'Payment Request'), ('none', 'None')], default='none', max_length=20)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='account.account')),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger Entries',
+                'ordering': ['-date', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'date'], name='core_ledger_account_1c2460_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['transaction_id'], name='core_ledger_transac_94b06a_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 10:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_account_balance_shard_count'),
+        ('core', '0024_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationMismatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.CharField(db_index=True, max_length=32)),
+                ('recorded_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('expected_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('difference', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reconciliation_mismatches', to='account.account')),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,166 @@
+# Generated by Django 4.2 on 2026-10-18 10:36
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_transactionsearch_fts USING fts5("
+    "document, content='core_transactionsearch', content_rowid='id')",
+    "CREATE TRIGGER core_transactionsearch_ai AFTER INSERT ON core_transactionsearch BEGIN "
+    "INSERT INTO core_transactionsearch_fts(rowid, document) VALUES (new.id, new.document); END",
+    "CREATE TRIGGER core_transactionsearch_ad AFTER DELETE ON core_transactionsearch BEGIN "
+    "INSERT INTO core_transactionsearch_fts(core_transactionsearch_fts, rowid, document) "
+    "VALUES ('delete', old.id, old.document); END",
+    "CREATE TRIGGER core_transactionsearch_au AFTER UPDATE ON core_transactionsearch BEGIN "
+    "INSERT INTO core_transactionsearch_fts(core_transactionsearch_fts, rowid, document) "
+    "VALUES ('delete', old.id, old.document); "
+    "INSERT INTO core_transactionsearch_fts(rowid, document) VALUES (new.id, new.document); END",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_transactionsearch_au",
+    "DROP TRIGGER IF EXISTS core_transactionsearch_ad",
+    "DROP TRIGGER IF EXISTS core_transactionsearch_ai",
+    "DROP TABLE IF EXISTS core_transactionsearch_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX transaction_search_document_idx ON core_transactionsearch "
+    "USING GIN (to_tsvector('simple', document))",
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS transaction_search_document_idx",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+create_full_text_index = _run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD})
+drop_full_text_index = _run({"sqlite": SQLITE_REVERSE, "postgresql": POSTGRESQL_REVERSE})
+
+
+# kind -> (model, fields holding the users who see the transaction)
+SEARCHED = {
+    "transfer": ("Transfer", ("user_id", "receiver_id")),
+    "deposit": ("Deposit", ("user_id",)),
+    "withdraw": ("Withdrawal", ("user_id",)),
+    "request": ("PaymentRequest", ("sender_id", "receiver_id")),
+}
+
+WORD = re.compile(r"\w+")
+
+
+def _document(obj, description, counterparty):
+    """The same words core.search.build_document writes for a saved transaction."""
+    return " ".join(WORD.findall(f"{obj.transaction_id} {description or ''} {counterparty} {obj.amount}".lower()))
+
+
+def _description(kind, obj):
+    # Deposit and Withdrawal descriptions are properties the historical models lack
+    if kind == "deposit":
+        if obj.credit_card_id is None:
+            return "Deposit"
+        digits = "".join(filter(str.isdigit, str(obj.credit_card.number)))
+        return f"Card Deposit (****{digits[-4:]})"
+    if kind == "withdraw":
+        return "Withdrawal"
+    return obj.description
+
+
+def _parties(kind, obj, names):
+    """[(owner id, counterparty name), ...] for the users who see ``obj``."""
+    if kind == "transfer":
+        receiver_name = names[obj.receiver_id] if obj.receiver_id else obj.receiver_name
+        parties = [(obj.user_id, receiver_name or "")]
+        if obj.receiver_id and obj.receiver_id != obj.user_id:
+            parties.append((obj.receiver_id, names.get(obj.user_id, "")))
+        return parties
+    if kind == "request":
+        parties = [(obj.sender_id, names.get(obj.receiver_id, ""))]
+        if obj.receiver_id and obj.receiver_id != obj.sender_id:
+            parties.append((obj.receiver_id, names.get(obj.sender_id, "")))
+        return parties
+    return [(obj.user_id, "")]
+
+
+def index_existing_transactions(apps, schema_editor):
+    """Write the search rows of every existing transaction."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    KYC = apps.get_model("account", "KYC")
+    TransactionSearch = apps.get_model("core", "TransactionSearch")
+
+    for kind, (model_name, user_fields) in SEARCHED.items():
+        queryset = apps.get_model("core", model_name).objects.order_by("pk")
+        if kind == "deposit":
+            queryset = queryset.select_related("credit_card")
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:1000])
+            if not chunk:
+                break
+            # The KYC full name, or the username if KYC has not been submitted
+            user_ids = {getattr(obj, field) for obj in chunk for field in user_fields} - {None}
+            names = dict(User.objects.filter(pk__in=user_ids).values_list("pk", "username"))
+            names.update(KYC.objects.filter(user_id__in=user_ids).values_list("user_id", "full_name"))
+
+            TransactionSearch.objects.bulk_create([
+                TransactionSearch(
+                    user_id=owner_id,
+                    kind=kind,
+                    object_id=obj.pk,
+                    transaction_id=obj.transaction_id,
+                    date=obj.date,
+                    document=_document(obj, _description(kind, obj), counterparty),
+                )
+                for obj in chunk
+                for owner_id, counterparty in _parties(kind, obj, names)
+                if owner_id is not None
+            ], batch_size=500)
+            last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0026_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('deposit', 'Deposit'), ('transfer', 'Transfer'), ('received', 'Received'), ('withdraw', 'Withdrawal'), ('refund', 'Refund'), ('request', 'Payment Request'), ('none', 'None')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('transaction_id', models.CharField(max_length=20)),
+                ('date', models.DateTimeField()),
+                ('document', models.TextField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_search', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Transaction Search',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transactionsearch',
+            index=models.Index(fields=['user', 'kind'], name='transaction_search_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transactionsearch',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'user'), name='transaction_search_unique'),
+        ),
+        # The full-text index lives outside the ORM and depends on the database
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+        migrations.RunPython(index_existing_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2 on 2026-10-18 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# kind -> (model, user field, counterparty field)
+INDEXED = {
+    "transfer": ("Transfer", "user_id", "receiver_id"),
+    "deposit": ("Deposit", "user_id", None),
+    "withdraw": ("Withdrawal", "user_id", None),
+    "request": ("PaymentRequest", "sender_id", "receiver_id"),
+}
+
+
+def index_existing_transactions(apps, schema_editor):
+    """Write the index row of every existing transaction."""
+    TransactionIndex = apps.get_model("core", "TransactionIndex")
+    for kind, (model_name, user_field, counterparty_field) in INDEXED.items():
+        model = apps.get_model("core", model_name)
+        rows = []
+        for obj in model.objects.order_by("pk").iterator(chunk_size=2000):
+            rows.append(TransactionIndex(
+                transaction_id=obj.transaction_id,
+                kind=kind,
+                object_id=obj.pk,
+                user_id=getattr(obj, user_field),
+                counterparty_id=getattr(obj, counterparty_field) if counterparty_field else None,
+                amount=obj.amount,
+                status=obj.status,
+                date=obj.date,
+            ))
+            if len(rows) >= 2000:
+                TransactionIndex.objects.bulk_create(rows)
+                rows = []
+        TransactionIndex.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0027_transactionsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=20, unique=True)),
+                ('kind', models.CharField(choices=[('deposit', 'Deposit'), ('transfer', 'Transfer'), ('received', 'Received'), ('withdraw', 'Withdrawal'), ('refund', 'Refund'), ('request', 'Payment Request'), ('none', 'None')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('failed', 'failed'), ('completed', 'completed'), ('pending', 'pending'), ('processing', 'processing'), ('request_sent', 'request_sent'), ('request_settled', 'request settled'), ('request_processing', 'request processing')], max_length=100)),
+                ('date', models.DateTimeField()),
+                ('counterparty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Transaction Index',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transactionindex',
+            index=models.Index(fields=['user', '-date', '-transaction_id'], name='txindex_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionindex',
+            index=models.Index(fields=['counterparty', '-date', '-transaction_id'], name='txindex_counterparty_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionindex',
+            index=models.Index(fields=['user', 'status', '-date'], name='txindex_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionindex',
+            index=models.Index(fields=['counterparty', 'status', '-date'], name='txindex_cp_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transactionindex',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='transaction_index_object_unique'),
+        ),
+        migrations.RunPython(index_existing_transactions, migrations.RunPython.noop),
+    ]
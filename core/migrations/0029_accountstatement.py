@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 10:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_account_version'),
+        ('core', '0028_transactionindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('html_file', models.FileField(max_length=255, upload_to='')),
+                ('pdf_file', models.FileField(max_length=255, upload_to='')),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='account.account')),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='accountstatement',
+            constraint=models.UniqueConstraint(fields=('account', 'month'), name='account_statement_unique_month'),
+        ),
+    ]
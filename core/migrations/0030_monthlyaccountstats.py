@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-18 10:44
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# (statistic, model, status counted, account field)
+SOURCES = [
+    ("sent", "Transfer", "completed", "account_id"),
+    ("received", "Transfer", "completed", "receiver_account_id"),
+    ("deposited", "Deposit", "completed", "account_id"),
+    ("withdrawn", "Withdrawal", "completed", "account_id"),
+    ("requests_paid", "PaymentRequest", "request_settled", "receiver_account_id"),
+    ("requests_received", "PaymentRequest", "request_settled", "sender_account_id"),
+]
+
+
+def backfill_existing_transactions(apps, schema_editor):
+    """Write the monthly totals of every completed transaction so far, one grouped query per statistic."""
+    MonthlyAccountStats = apps.get_model("core", "MonthlyAccountStats")
+    tzinfo = django.utils.timezone.get_current_timezone()
+
+    rows = {}
+    for field, model_name, status, account_field in SOURCES:
+        grouped = (
+            apps.get_model("core", model_name).objects
+            .filter(status=status, **{f"{account_field}__isnull": False})
+            .annotate(stats_month=TruncMonth("date", tzinfo=tzinfo))
+            .order_by()
+            .values_list(account_field, "stats_month")
+            .annotate(total=Sum("amount"), count=Count("pk"))
+        )
+        for account_id, month, total, count in grouped:
+            if isinstance(month, datetime.datetime):
+                month = month.date()
+            row = rows.setdefault((account_id, month), MonthlyAccountStats(account_id=account_id, month=month))
+            setattr(row, f"{field}_total", total)
+            setattr(row, f"{field}_count", count)
+    MonthlyAccountStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_account_version'),
+        ('core', '0029_accountstatement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyAccountStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('sent_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sent_count', models.IntegerField(default=0)),
+                ('received_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('received_count', models.IntegerField(default=0)),
+                ('deposited_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposited_count', models.IntegerField(default=0)),
+                ('withdrawn_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('withdrawn_count', models.IntegerField(default=0)),
+                ('requests_paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('requests_paid_count', models.IntegerField(default=0)),
+                ('requests_received_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('requests_received_count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='account.account')),
+            ],
+            options={
+                'verbose_name_plural': 'Monthly Account Stats',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyaccountstats',
+            constraint=models.UniqueConstraint(fields=('account', 'month'), name='monthly_stats_unique_month'),
+        ),
+        migrations.RunPython(backfill_existing_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_monthlyaccountstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionindex',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='transactionindex',
+            index=models.Index(fields=['user', 'updated_at'], name='txindex_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionindex',
+            index=models.Index(fields=['counterparty', 'updated_at'], name='txindex_cp_updated_idx'),
+        ),
+    ]
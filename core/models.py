@@ -48,6 +48,19 @@ CARD_TYPE = (
     ("discover", "Discover"),
 )
 
+LEDGER_ENTRY_TYPE = (
+    ("debit", "Debit"),
+    ("credit", "Credit"),
+)
+
+LEDGER_BOOK = (
+    ("customer", "Customer Account"),
+    ("deposits", "Deposit Clearing"),
+    ("withdrawals", "Withdrawal Clearing"),
+    ("external", "External Settlement"),
+    ("opening", "Opening Balance"),
+)
+
 NOTIFICATION_TYPE = (
     ("None", "None"),
     ("Transfer", "Transfer"),
@@ -71,7 +84,15 @@ class Deposit(models.Model):
     deposit_method = models.CharField(choices=DEPOSIT_METHOD, max_length=50, default="bank_transfer")
     credit_card = models.ForeignKey('CreditCard', on_delete=models.SET_NULL, null=True, blank=True, related_name="deposits")
     date = models.DateTimeField(default=timezone.now)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-date"], name="deposit_user_date_idx"),
+            models.Index(fields=["user", "status", "-date"], name="deposit_user_status_idx"),
+            # The admin approval queue, drained in pk order per status
+            models.Index(fields=["status", "id"], name="deposit_status_idx"),
+        ]
+
     @property
     def sender(self):
         return None
@@ -97,6 +118,12 @@ class Withdrawal(models.Model):
     status = models.CharField(choices=TRANSACTION_STATUS, max_length=100, default="pending")
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-date"], name="withdrawal_user_date_idx"),
+            models.Index(fields=["user", "status", "-date"], name="withdrawal_user_status_idx"),
+        ]
+
     @property
     def sender(self):
         return self.user
@@ -136,6 +163,20 @@ class Transfer(models.Model):
         ("external", "External"),
     )
     transfer_type = models.CharField(choices=TRANSFER_TYPES, max_length=20, default="internal")
+    settlement_batch = models.ForeignKey("SettlementBatch", on_delete=models.SET_NULL, null=True, blank=True, related_name="transfers")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-date"], name="transfer_user_date_idx"),
+            models.Index(fields=["receiver", "-date"], name="transfer_receiver_date_idx"),
+            models.Index(fields=["user", "status", "-date"], name="transfer_user_status_idx"),
+            models.Index(fields=["receiver", "status", "-date"], name="transfer_receiver_status_idx"),
+            # The settlement queue: external transfers not yet settled
+            models.Index(
+                fields=["id"], name="transfer_unsettled_idx",
+                condition=models.Q(transfer_type="external", status="pending", settlement_batch__isnull=True),
+            ),
+        ]
 
     @property
     def sender(self):
@@ -149,6 +190,24 @@ class Transfer(models.Model):
         return f"Transfer - {self.transaction_id}"
 
 
+class SettlementBatch(models.Model):
+    """A batch of external transfers settled together, with per-bank totals."""
+    batch_id = ShortUUIDField(unique=True, length=10, max_length=20, prefix="STL", alphabet="1234567890")
+    settled_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="settlement_batches")
+    transfer_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    # {"<receiver_bank>": {"count": 12, "total": "1500.00"}, ...}
+    bank_totals = models.JSONField(default=dict)
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-date"]
+        verbose_name_plural = "Settlement Batches"
+
+    def __str__(self):
+        return f"Settlement - {self.batch_id}"
+
+
 class PaymentRequest(models.Model):
     transaction_id = ShortUUIDField(unique=True, length=15, max_length=20, prefix="REQ")
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="request_user")
@@ -162,6 +221,12 @@ class PaymentRequest(models.Model):
     status = models.CharField(choices=TRANSACTION_STATUS, max_length=100, default="pending")
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["sender", "-date"], name="request_sender_date_idx"),
+            models.Index(fields=["receiver", "-date"], name="request_receiver_date_idx"),
+        ]
+
     @property
     def transaction_type(self):
         return "request"
@@ -170,6 +235,250 @@ class PaymentRequest(models.Model):
         return f"Payment Request - {self.transaction_id}"
 
 
+class LedgerEntry(models.Model):
+    """
+    Append-only double-entry record of money movements.
+
+    Every movement writes one debit and one credit row sharing the same
+    transaction_id. Rows on the "customer" book belong to an Account; the
+    other books are the bank's side of deposits, withdrawals and external
+    transfers. Account.account_balance is a cached projection of these rows.
+    """
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, null=True, blank=True, related_name="ledger_entries")
+    book = models.CharField(choices=LEDGER_BOOK, max_length=20, default="customer")
+    entry_type = models.CharField(choices=LEDGER_ENTRY_TYPE, max_length=10)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_id = models.CharField(max_length=20)
+    transaction_type = models.CharField(choices=TRANSACTION_TYPE, max_length=20, default="none")
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-date", "-id"]
+        verbose_name_plural = "Ledger Entries"
+        indexes = [
+            models.Index(fields=["account", "date"]),
+            models.Index(fields=["transaction_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} - {self.transaction_id}"
+
+
+class BalanceSnapshot(models.Model):
+    """An account's balance as of ``taken_at``, written by the nightly snapshot job."""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="balance_snapshots")
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-taken_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["account", "taken_at"], name="unique_balance_snapshot"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.balance}"
+
+
+class ReconciliationMismatch(models.Model):
+    """An account whose balance disagrees with its ledger, found by reconcile_balances."""
+    run_id = models.CharField(max_length=32, db_index=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="reconciliation_mismatches")
+    recorded_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    expected_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    difference = models.DecimalField(max_digits=12, decimal_places=2)
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-date"]
+
+    def __str__(self):
+        return f"{self.run_id} - {self.account.account_number}: {self.difference}"
+
+
+class TransactionIndex(models.Model):
+    """
+    One narrow row per Transfer, Deposit, Withdrawal and PaymentRequest.
+
+    Maps a transaction_id to its type and row, and carries the columns the
+    transaction feed filters and orders by, so the feed reads one indexed
+    table instead of a UNION of four. Maintained by core.transaction_index
+    on every insert and status transition.
+    """
+    transaction_id = models.CharField(max_length=20, unique=True)
+    kind = models.CharField(choices=TRANSACTION_TYPE, max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    # The user who started the transaction (PaymentRequest: who asked for the money)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    # The other user involved, for internal transfers and payment requests
+    counterparty = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(choices=TRANSACTION_STATUS, max_length=100)
+    date = models.DateTimeField()
+    # When this row was last written: the transaction was saved or changed status
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Transaction Index"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="transaction_index_object_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-date", "-transaction_id"], name="txindex_user_date_idx"),
+            models.Index(fields=["counterparty", "-date", "-transaction_id"], name="txindex_counterparty_date_idx"),
+            models.Index(fields=["user", "status", "-date"], name="txindex_user_status_idx"),
+            models.Index(fields=["counterparty", "status", "-date"], name="txindex_cp_status_idx"),
+            models.Index(fields=["user", "updated_at"], name="txindex_user_updated_idx"),
+            models.Index(fields=["counterparty", "updated_at"], name="txindex_cp_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} - {self.transaction_id}"
+
+
+class TransactionSearch(models.Model):
+    """
+    Search text for one transaction, as seen by one of its owners.
+
+    ``document`` holds lower-cased words (transaction id, description,
+    counterparty name, amount) maintained by core.search whenever a
+    transaction is saved. It is full-text indexed outside the ORM: an FTS5
+    table on SQLite, a GIN index on PostgreSQL (see migration 0027).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="transaction_search")
+    kind = models.CharField(choices=TRANSACTION_TYPE, max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    transaction_id = models.CharField(max_length=20)
+    date = models.DateTimeField()
+    document = models.TextField()
+
+    class Meta:
+        verbose_name_plural = "Transaction Search"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id", "user"], name="transaction_search_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "kind"], name="transaction_search_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.transaction_id}"
+
+
+class MonthlyAccountStats(models.Model):
+    """
+    An account's money movements in one calendar month.
+
+    Kept current by core.stats in the same database transaction as each
+    completed transfer, deposit, withdrawal and settled payment request, so
+    per-period totals are a read of one row per month instead of a scan of
+    the transaction tables.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="monthly_stats")
+    # First day of the month
+    month = models.DateField()
+
+    sent_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sent_count = models.IntegerField(default=0)
+    received_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    received_count = models.IntegerField(default=0)
+    deposited_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    deposited_count = models.IntegerField(default=0)
+    withdrawn_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    withdrawn_count = models.IntegerField(default=0)
+    # Payment requests this account paid, and requests it was paid for
+    requests_paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    requests_paid_count = models.IntegerField(default=0)
+    requests_received_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    requests_received_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["-month"]
+        verbose_name_plural = "Monthly Account Stats"
+        constraints = [
+            models.UniqueConstraint(fields=["account", "month"], name="monthly_stats_unique_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} - {self.month:%Y-%m}"
+
+
+class AccountStatement(models.Model):
+    """
+    An account's monthly statement, rendered by the generate_statements command.
+
+    The row is written only after both files are in storage, so its
+    existence marks the account as done when a run is resumed.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="statements")
+    # First day of the statement month
+    month = models.DateField()
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    closing_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_count = models.PositiveIntegerField(default=0)
+    html_file = models.FileField(max_length=255)
+    pdf_file = models.FileField(max_length=255)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-month"]
+        constraints = [
+            models.UniqueConstraint(fields=["account", "month"], name="account_statement_unique_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} - {self.month:%Y-%m}"
+
+
+class BalanceShard(models.Model):
+    """
+    Sub-balance of a hot business account.
+
+    Incoming credits to an account with ``balance_shard_count`` set are spread
+    across these rows by hash, so they do not all serialize on the Account
+    row. The true balance is account_balance plus the sum of its shards;
+    shards are folded back into the account periodically and whenever a
+    debit needs the funds.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="balance_shards")
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "index"], name="unique_balance_shard_index"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} shard {self.index}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Records a client-supplied key for a money-moving POST so a retried or
+    double-submitted request replays the first response instead of running
+    the view again.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=64)
+    path = models.CharField(max_length=255)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_location = models.CharField(max_length=500, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key_per_user"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
+
+
 class CreditCard(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     card_id = ShortUUIDField(unique=True, length=5, max_length=20, prefix="CARD", alphabet="1234567890")
@@ -226,6 +535,10 @@ class Notification(models.Model):
     class Meta:
         ordering = ["-date"]
         verbose_name_plural = "Notification"
+        indexes = [
+            models.Index(fields=["user", "is_read", "-date"], name="notification_user_read_idx"),
+            models.Index(fields=["user", "-date"], name="notification_user_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.notification_type}"
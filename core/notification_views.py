@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from core.models import Notification
+from core.summary import invalidate_notifications
 
 
 @login_required
@@ -38,6 +39,7 @@ def mark_notification_read(request, nid):
 def mark_all_notifications_read(request):
     """Mark all notifications as read for the logged-in user."""
     Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    invalidate_notifications([request.user.pk])
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
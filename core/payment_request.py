@@ -2,7 +2,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from account.models import Account
 from django.db.models import Q
-from .models import PaymentRequest, Notification
+from .models import PaymentRequest
+from .balance import InsufficientFunds
+from .idempotency import allow_retry, idempotent, new_idempotency_key
+from .transitions import transition
 from django.contrib.auth.decorators import login_required
 from decimal import Decimal
 
@@ -92,6 +95,10 @@ def RequestFinialProcess(request,account_number, transaction_id):
     account = Account.objects.get(account_number=account_number)
     transaction = PaymentRequest.objects.get(transaction_id=transaction_id)
 
+    if transaction.status != "processing":
+        messages.warning(request, "This request has already been sent.")
+        return redirect("core:request-completed", account.account_number, transaction.transaction_id)
+
     sender_account = request.user.account
     
     completed = False
@@ -99,22 +106,10 @@ def RequestFinialProcess(request,account_number, transaction_id):
         pin_num = request.POST.get('pin-number')
 
         if pin_num == sender_account.pin_number:
+            if not transition(transaction, "request_sent", where={"user": request.user}):
+                messages.warning(request, "This request has already been sent.")
+                return redirect("account:dashboard")
 
-            transaction.status = "request_sent"
-            transaction.save()
-
-            Notification.objects.create(
-                user=account.user,
-                notification_type="Recieved Payment Request",
-                amount=transaction.amount,
-                
-            )
-            
-            Notification.objects.create(
-                user=request.user,
-                amount=transaction.amount,
-                notification_type="Sent Payment Request"
-            )
             messages.success(request, "Request Successfull.")
             return redirect("core:request-completed" ,account.account_number ,transaction.transaction_id)
         else:
@@ -154,55 +149,46 @@ def settlement_confirmation(request, account_number, transaction_id):
         messages.warning(request, 'Request does not exists')
         return redirect("account:account")
     context = {'account':account,
-               'transaction':transaction
+               'transaction':transaction,
+               'idempotency_key': new_idempotency_key(),
                } 
     return render(request, 'payment_request/settlement-confirmation.html', context)
 
 
 @login_required
+@idempotent
 def settlement_processing(request, account_number, transaction_id):
     account = Account.objects.get(account_number=account_number)
     transaction = PaymentRequest.objects.get(transaction_id=transaction_id)    
 
-    sender = request.user
+    if transaction.status == "request_settled":
+        messages.warning(request, "This request has already been settled.")
+        return redirect("core:settlement-completed", account.account_number, transaction.transaction_id)
+
+    if transaction.status != "request_sent":
+        messages.warning(request, "This request can no longer be settled.")
+        return redirect("account:dashboard")
+
     sender_account = request.user.account
 
     if request.method== "POST":
         pin_number = request.POST.get('pin-number')
         if pin_number == sender_account.pin_number:
-            if sender_account.account_balance >= transaction.amount:
-                sender_account.account_balance -= transaction.amount
-                sender_account.save()
-
-                account.account_balance += transaction.amount
-                account.save()
-
-                transaction.status = "request_settled"
-                transaction.save()
-
-                # Send Debit Email to Payer
-                try:
-                    debit_subject = f'Debit Alert: -${transaction.amount}'
-                    debit_message = f'You settled a payment request of ${transaction.amount} to {account.user.kyc.full_name}.\nTransaction ID: {transaction.transaction_id}'
-                    send_html_email(debit_subject, [sender.email], {'subject_header': 'Debit Alert', 'message': debit_message})
-                except:
-                    pass
-
-                # Send Credit Email to Receiver (the one who made the request)
-                try:
-                    credit_subject = f'Credit Alert: +${transaction.amount}'
-                    credit_message = f'Your payment request of ${transaction.amount} has been settled by {sender.kyc.full_name}.\nTransaction ID: {transaction.transaction_id}'
-                    send_html_email(credit_subject, [account.user.email], {'subject_header': 'Credit Alert', 'message': credit_message})
-                except:
-                    pass
-
-                messages.success(request, f"settled to {account.user.kyc.full_name} was successfull.")
-                return redirect("core:settlement-completed",account.account_number, transaction.transaction_id)
-
-            else:
-                messages.warning(request, "Insufficient funds, fund your account and try again.")    
+            try:
+                # Settle exactly once, and only by the user the request was sent to
+                if not transition(transaction, "request_settled", where={"receiver": request.user}):
+                    messages.warning(request, "This request can no longer be settled.")
+                    return redirect("account:dashboard")
+            except InsufficientFunds:
+                messages.warning(request, "Insufficient funds, fund your account and try again.")
+                allow_retry(request)
+                return redirect("core:settlement-confirmation", account.account_number, transaction.transaction_id)
+
+            messages.success(request, f"settled to {account.user.kyc.full_name} was successfull.")
+            return redirect("core:settlement-completed",account.account_number, transaction.transaction_id)
         else:
             messages.warning(request, "Incorrect Pin")
+            allow_retry(request)
             return redirect("core:settlement-confirmation", account.account_number, transaction.transaction_id)
             
     else:
@@ -0,0 +1,250 @@
+"""
+Bulk (payroll) transfers for business accounts.
+
+A business customer uploads a CSV or JSON file of account numbers and
+amounts and confirms it with their PIN once. All recipients are resolved
+with a single ``account_number__in`` query, funds are checked once, and the
+Transfers are bulk-created and completed through core.transitions in one
+database transaction, with the same side effects as a single transfer.
+
+CSV files need a header row with ``account_number`` and ``amount`` columns
+and may add ``description``. JSON files hold a list of objects with the same
+keys.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import transaction as db_transaction
+from django.shortcuts import render, redirect
+from django.utils import timezone
+
+from account.models import Account
+from .balance import get_balance, InsufficientFunds
+from .idempotency import allow_retry, idempotent, new_idempotency_key
+from .models import AccountFreeze, Transfer
+from . import search
+from .transaction_index import index_transactions
+from .transfer import _record_failed_pin_attempt, _reset_pin_attempts
+from .transitions import transition_many
+from .utils import is_account_frozen, get_freeze_reason_display, get_full_name
+from .versioning import update_account, ConcurrentUpdateError
+
+MAX_PAYROLL_LINES = 1000
+MAX_PAYROLL_FILE_SIZE = 1024 * 1024  # 1 MB
+
+
+class PayrollError(Exception):
+    """Raised when a payroll file cannot be accepted; ``errors`` lists the reasons."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+def parse_payroll(upload):
+    """
+    Read payroll lines from an uploaded CSV or JSON file.
+
+    Returns:
+        list: [{"line", "account_number", "amount", "description"}, ...]
+
+    Raises:
+        PayrollError: The file or any of its lines is invalid
+    """
+    if upload.size > MAX_PAYROLL_FILE_SIZE:
+        raise PayrollError(["The file is larger than 1 MB."])
+    try:
+        content = upload.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise PayrollError(["The file must be UTF-8 text."])
+
+    if upload.name.lower().endswith(".json"):
+        try:
+            rows = json.loads(content)
+        except ValueError:
+            raise PayrollError(["The file is not valid JSON."])
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise PayrollError(["The JSON file must contain a list of objects."])
+        first_line = 1
+    else:
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames or not {"account_number", "amount"} <= set(reader.fieldnames):
+            raise PayrollError(["The CSV file needs a header row with account_number and amount columns."])
+        rows = list(reader)
+        first_line = 2  # after the header
+
+    if not rows:
+        raise PayrollError(["The file has no payments in it."])
+    if len(rows) > MAX_PAYROLL_LINES:
+        raise PayrollError([f"A payroll can have at most {MAX_PAYROLL_LINES} payments."])
+
+    lines = []
+    errors = []
+    for line, row in enumerate(rows, start=first_line):
+        account_number = str(row.get("account_number") or "").strip()
+        try:
+            amount = Decimal(str(row.get("amount") or "").strip())
+        except InvalidOperation:
+            amount = None
+
+        if not account_number:
+            errors.append(f"Line {line}: missing account number.")
+        elif amount is None or not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal("0.01")):
+            errors.append(f"Line {line}: invalid amount {row.get('amount')!r}.")
+        else:
+            lines.append({
+                "line": line,
+                "account_number": account_number,
+                "amount": amount,
+                "description": str(row.get("description") or "").strip()[:1000],
+            })
+
+    if errors:
+        raise PayrollError(errors)
+    return lines
+
+
+def resolve_recipients(sender_account, lines):
+    """
+    Look up every recipient of a payroll with one query.
+
+    Returns:
+        dict: {account_number: Account}
+
+    Raises:
+        PayrollError: Unknown, frozen or own account numbers
+    """
+    numbers = {line["account_number"] for line in lines}
+    recipients = {
+        recipient.account_number: recipient
+        for recipient in Account.objects.filter(account_number__in=numbers).select_related("user__kyc")
+    }
+    frozen = set(
+        AccountFreeze.objects.filter(account__in=recipients.values(), is_active=True)
+        .values_list("account_id", flat=True)
+    )
+
+    errors = []
+    for line in lines:
+        recipient = recipients.get(line["account_number"])
+        if recipient is None:
+            errors.append(f"Line {line['line']}: no Paylio account {line['account_number']}.")
+        elif recipient.pk == sender_account.pk:
+            errors.append(f"Line {line['line']}: you cannot pay your own account.")
+        elif recipient.pk in frozen:
+            errors.append(f"Line {line['line']}: account {line['account_number']} is frozen.")
+    if errors:
+        raise PayrollError(errors)
+    return recipients
+
+
+def pay_payroll(sender, sender_account, lines, recipients):
+    """
+    Create and complete one internal Transfer per payroll line.
+
+    The Transfers are bulk-created as "processing" and completed together
+    with ``transition_many``, which debits the sender once and credits the
+    recipients with grouped UPDATEs.
+
+    Returns:
+        list: The Transfers created
+
+    Raises:
+        InsufficientFunds: The account cannot cover the total; nothing is written
+    """
+    with db_transaction.atomic():
+        transfers = Transfer.objects.bulk_create([
+            Transfer(
+                user=sender,
+                account=sender_account,
+                receiver=recipients[line["account_number"]].user,
+                receiver_account=recipients[line["account_number"]],
+                receiver_account_number=line["account_number"],
+                receiver_bank="Paylio",
+                receiver_name=get_full_name(recipients[line["account_number"]].user),
+                amount=line["amount"],
+                description=line["description"] or None,
+                transfer_type="internal",
+                status="processing",
+            )
+            for line in lines
+        ], batch_size=500)
+
+        # bulk_create skips post_save, which writes the index rows
+        index_transactions(transfers)
+        search.index_transactions(transfers)
+
+        return transition_many(
+            Transfer.objects.filter(pk__in=[transfer.pk for transfer in transfers])
+            .select_related("user__kyc", "account", "receiver__kyc", "receiver_account"),
+            "processing", "completed",
+        )
+
+
+@login_required
+@idempotent
+def bulk_transfer(request):
+    sender = request.user
+    sender_account = sender.account
+
+    if not sender_account.business_account:
+        messages.warning(request, "Bulk transfers are only available on business accounts.")
+        return redirect("account:dashboard")
+
+    context = {
+        "account": sender_account,
+        "balance": get_balance(sender_account),
+        "max_lines": MAX_PAYROLL_LINES,
+        "errors": [],
+    }
+
+    if request.method == "POST":
+        sender_frozen, sender_freeze = is_account_frozen(sender_account)
+        if sender_frozen:
+            messages.error(request, f"Your account is frozen: {get_freeze_reason_display(sender_freeze)}. Please contact support.")
+            return redirect("account:account")
+
+        if sender_account.pin_lockout_until and timezone.now() < sender_account.pin_lockout_until:
+            messages.warning(request, "Account locked due to too many failed PIN attempts. Try again in 30 minutes.")
+            allow_retry(request)
+            return redirect("account:dashboard")
+
+        try:
+            if request.POST.get("pin-number") != sender_account.pin_number:
+                update_account(sender_account, _record_failed_pin_attempt)
+                if sender_account.failed_pin_attempts >= 5:
+                    messages.error(request, "Too many failed attempts. Account locked for 30 minutes.")
+                else:
+                    messages.warning(request, f"Incorrect Pin Number. {5 - sender_account.failed_pin_attempts} attempts remaining.")
+                allow_retry(request)
+                return redirect("core:bulk-transfer")
+            update_account(sender_account, _reset_pin_attempts)
+        except ConcurrentUpdateError:
+            messages.warning(request, "An Error occured, Try again later.")
+            allow_retry(request)
+            return redirect("core:bulk-transfer")
+
+        upload = request.FILES.get("payroll_file")
+        try:
+            if upload is None:
+                raise PayrollError(["Choose a CSV or JSON file to upload."])
+            lines = parse_payroll(upload)
+            recipients = resolve_recipients(sender_account, lines)
+            total = sum(line["amount"] for line in lines)
+            if get_balance(sender_account) < total:
+                raise PayrollError([f"Insufficient fund: this payroll needs ${total}."])
+            transfers = pay_payroll(sender, sender_account, lines, recipients)
+        except PayrollError as e:
+            context["errors"] = e.errors
+        except InsufficientFunds:
+            context["errors"] = [f"Insufficient fund: this payroll needs ${total}."]
+        else:
+            messages.success(request, f"Paid ${total} to {len(transfers)} recipient(s).")
+            return redirect("core:transaction-list")
+
+    context["idempotency_key"] = new_idempotency_key()
+    return render(request, "transfare/bulk-transfer.html", context)
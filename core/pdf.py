@@ -0,0 +1,68 @@
+"""
+Minimal PDF writer for plain-text documents.
+
+Statements only need monospaced lines of text, which a few PDF objects can
+express directly; this avoids depending on an HTML-to-PDF renderer (and its
+system libraries) in the statement workers.
+"""
+LINES_PER_PAGE = 60
+FONT_SIZE = 9
+LEADING = 12
+PAGE_WIDTH = 612  # US Letter, in points
+PAGE_HEIGHT = 792
+MARGIN = 48
+
+
+def _escape(text):
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_pdf(lines, title=""):
+    """
+    Lay out ``lines`` in Courier, LINES_PER_PAGE to a page.
+
+    Args:
+        lines: Lines of text; characters outside Latin-1 are replaced
+        title: Document title stored in the PDF metadata
+
+    Returns:
+        bytes: The PDF file
+    """
+    lines = list(lines) or [""]
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+
+    # Objects 1-4 are the catalog, page tree, font and info; each page then
+    # takes a page object and a content stream.
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+               f"<< /Title ({_escape(title)}) /Producer (Paylio) >>".encode("latin-1")]
+    page_refs = []
+    for number, page in enumerate(pages):
+        body = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+        body += [f"({_escape(line)}) '" for line in page]
+        body.append(f"({_escape(f'Page {number + 1} of {len(pages)}')}) '")
+        body.append("ET")
+        stream = "\n".join(body).encode("latin-1")
+
+        page_id = len(objects) + 1
+        page_refs.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode("latin-1")
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(pages)} >>".encode("latin-1")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
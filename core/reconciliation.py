@@ -0,0 +1,103 @@
+"""
+Balance reconciliation.
+
+Compares every account's recorded balance (``account_balance`` plus any
+balance shards) with the net of its ledger rows, credits minus debits.
+Every money movement appends its ledger pair in the same database
+transaction as the balance change, and the opening entries seeded when the
+ledger was introduced carry each account's earlier history, so the two
+only disagree when a balance was changed outside core.balance.
+
+Accounts are split into primary key ranges that are reconciled
+independently (and in parallel, see the reconcile_balances command). Each
+range costs one grouped aggregate over the ledger, one over the balance
+shards and one streamed read of its accounts, never a query per account.
+"""
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from account.models import Account
+from .ledger import net_amount, net_totals
+from .models import BalanceShard, LedgerEntry, ReconciliationMismatch
+
+
+def account_ranges(range_size):
+    """
+    Split all accounts into consecutive primary key ranges.
+
+    Returns:
+        list: [(first_pk, last_pk), ...], each covering up to ``range_size`` accounts
+    """
+    ranges = []
+    first = last = None
+    count = 0
+    pks = Account.objects.order_by("pk").values_list("pk", flat=True)
+    for pk in pks.iterator(chunk_size=range_size):
+        if first is None:
+            first = pk
+        last = pk
+        count += 1
+        if count == range_size:
+            ranges.append((first, last))
+            first, count = None, 0
+    if first is not None:
+        ranges.append((first, last))
+    return ranges
+
+
+def expected_balances(first_pk, last_pk):
+    """
+    Net the ledger rows of every account in the pk range.
+
+    Returns:
+        dict: {account_id: expected balance} for accounts with any ledger rows
+    """
+    rows = (
+        LedgerEntry.objects.filter(account_id__gte=first_pk, account_id__lte=last_pk)
+        .order_by()
+        .values("account_id")
+        .annotate(**net_totals())
+    )
+    return {row["account_id"]: net_amount(row["credits"], row["debits"]) for row in rows}
+
+
+def reconcile_range(run_id, first_pk, last_pk, chunk_size=2000):
+    """
+    Reconcile the accounts in one pk range and store any mismatches.
+
+    Runs in a worker process; only plain values go in and out.
+
+    Returns:
+        tuple: (accounts checked, mismatches found)
+    """
+    expected = expected_balances(first_pk, last_pk)
+    shards = {
+        row["account_id"]: row["total"]
+        for row in BalanceShard.objects.filter(account_id__gte=first_pk, account_id__lte=last_pk)
+        .values("account_id")
+        .annotate(total=Sum("balance"))
+    }
+
+    checked = 0
+    mismatches = []
+    accounts = (
+        Account.objects.filter(pk__gte=first_pk, pk__lte=last_pk)
+        .order_by("pk")
+        .values_list("pk", "account_balance")
+    )
+    for account_id, balance in accounts.iterator(chunk_size=chunk_size):
+        checked += 1
+        recorded = balance + shards.get(account_id, Decimal("0.00"))
+        should_be = expected.get(account_id, Decimal("0.00"))
+        if recorded != should_be:
+            mismatches.append(ReconciliationMismatch(
+                run_id=run_id,
+                account_id=account_id,
+                recorded_balance=recorded,
+                expected_balance=should_be,
+                difference=recorded - should_be,
+            ))
+
+    ReconciliationMismatch.objects.bulk_create(mismatches, batch_size=1000)
+    return checked, len(mismatches)
@@ -0,0 +1,203 @@
+"""
+Full-text search over a user's transactions.
+
+Every Transfer, Deposit, Withdrawal and PaymentRequest has one
+TransactionSearch row per owner. The row's ``document`` holds the words a
+customer searches for: the transaction id, the description, the
+counterparty's name and the amount (so "250" finds $250.00). The rows are
+rewritten whenever a transaction is saved (see core.signals) and by
+code paths that bulk-create transactions.
+
+Documents are full-text indexed by the database: an external-content FTS5
+table kept in sync by triggers on SQLite, and a GIN index on
+``to_tsvector('simple', document)`` on PostgreSQL. Other backends fall back
+to ``icontains`` on the document. Every query word is matched as a prefix,
+so a partially typed transaction id still matches.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Deposit, PaymentRequest, TransactionSearch, Transfer, Withdrawal
+from .utils import get_full_name
+
+FTS_TABLE = "core_transactionsearch_fts"
+
+SEARCH_MODELS = {
+    Transfer: "transfer",
+    Deposit: "deposit",
+    Withdrawal: "withdraw",
+    PaymentRequest: "request",
+}
+
+# Relations read while building documents, per kind
+SEARCH_RELATED = {
+    "transfer": ("user__kyc", "receiver__kyc"),
+    "deposit": ("credit_card",),
+    "withdraw": (),
+    "request": ("sender__kyc", "receiver__kyc"),
+}
+
+WORD = re.compile(r"\w+")
+
+
+def words(text):
+    """Lower-cased words of ``text``; punctuation separates words."""
+    return WORD.findall(str(text).lower())
+
+
+def _parties(kind, obj):
+    """[(owner, counterparty name), ...] for the users who see ``obj``."""
+    if kind == "transfer":
+        receiver_name = get_full_name(obj.receiver) if obj.receiver else obj.receiver_name
+        parties = [(obj.user, receiver_name or "")]
+        if obj.receiver and obj.receiver_id != obj.user_id:
+            parties.append((obj.receiver, get_full_name(obj.user) if obj.user else ""))
+        return parties
+    if kind == "request":
+        parties = []
+        if obj.sender:
+            parties.append((obj.sender, get_full_name(obj.receiver) if obj.receiver else ""))
+        if obj.receiver and obj.receiver_id != obj.sender_id:
+            parties.append((obj.receiver, get_full_name(obj.sender) if obj.sender else ""))
+        return parties
+    return [(obj.user, "")]
+
+
+def build_document(obj, counterparty=""):
+    """The searchable words of one transaction, as a space-separated string."""
+    return " ".join(words(f"{obj.transaction_id} {obj.description or ''} {counterparty} {obj.amount}"))
+
+
+def index_transactions(objs):
+    """
+    Write (or rewrite) the search rows of ``objs``, which must all be one model.
+
+    Costs one DELETE and one bulk INSERT however many objects are passed.
+    """
+    objs = [obj for obj in objs if obj.pk]
+    if not objs:
+        return
+    kind = SEARCH_MODELS[type(objs[0])]
+
+    rows = [
+        TransactionSearch(
+            user=owner,
+            kind=kind,
+            object_id=obj.pk,
+            transaction_id=obj.transaction_id,
+            date=obj.date,
+            document=build_document(obj, counterparty),
+        )
+        for obj in objs
+        for owner, counterparty in _parties(kind, obj)
+        if owner is not None
+    ]
+    TransactionSearch.objects.filter(kind=kind, object_id__in=[obj.pk for obj in objs]).delete()
+    TransactionSearch.objects.bulk_create(rows, batch_size=500)
+
+
+def unindex_transaction(obj):
+    """Remove the search rows of a deleted transaction."""
+    TransactionSearch.objects.filter(kind=SEARCH_MODELS[type(obj)], object_id=obj.pk).delete()
+
+
+def rebuild_index(chunk_size=1000):
+    """
+    Re-create the search rows of every transaction.
+
+    Returns:
+        int: Number of transactions indexed
+    """
+    total = 0
+    for model, kind in SEARCH_MODELS.items():
+        TransactionSearch.objects.filter(kind=kind).delete()
+        queryset = model.objects.select_related(*SEARCH_RELATED[kind]).order_by("pk")
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            index_transactions(chunk)
+            total += len(chunk)
+            last_pk = chunk[-1].pk
+    return total
+
+
+def _match(query_words):
+    """A condition on TransactionSearch rows matching every word as a prefix."""
+    if connection.vendor == "sqlite":
+        fts_query = " ".join(f'"{word}"*' for word in query_words)
+        return Q(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query]))
+    if connection.vendor == "postgresql":
+        ts_query = " & ".join(f"{word}:*" for word in query_words)
+        return Q(RawSQL(
+            "to_tsvector('simple', document) @@ to_tsquery('simple', %s)", [ts_query],
+            output_field=BooleanField(),
+        ))
+    condition = Q()
+    for word in query_words:
+        condition &= Q(document__icontains=word)
+    return condition
+
+
+def matching_transaction_ids(user, query):
+    """
+    transaction_ids of ``user``'s transactions that match ``query``.
+
+    Returned as an unevaluated ``values("transaction_id")`` queryset, to be
+    used as a subquery (``transaction_id__in=...``). A query without any
+    words matches nothing.
+    """
+    query_words = words(query)
+    if not query_words:
+        return TransactionSearch.objects.none().values("transaction_id")
+    return (
+        TransactionSearch.objects
+        .filter(_match(query_words), user=user)
+        .values("transaction_id")
+    )
+
+
+def search_transactions(user, query, limit=20):
+    """
+    ``user``'s transactions matching ``query``, best matches first.
+
+    Ranked by BM25 on SQLite and ``ts_rank`` on PostgreSQL; other backends
+    return the newest matches.
+
+    Returns:
+        list: TransactionSearch rows with a ``rank`` attribute (higher is better)
+    """
+    query_words = words(query)
+    if not query_words:
+        return []
+
+    if connection.vendor == "sqlite":
+        fts_query = " ".join(f'"{word}"*' for word in query_words)
+        # bm25() is lower for better matches
+        return list(TransactionSearch.objects.raw(
+            f"SELECT s.*, -bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} "
+            f"JOIN core_transactionsearch s ON s.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND s.user_id = %s "
+            "ORDER BY rank DESC, s.date DESC LIMIT %s",
+            [fts_query, user.pk, limit],
+        ))
+    if connection.vendor == "postgresql":
+        ts_query = " & ".join(f"{word}:*" for word in query_words)
+        return list(TransactionSearch.objects.raw(
+            "SELECT s.*, ts_rank(to_tsvector('simple', s.document), q) AS rank "
+            "FROM core_transactionsearch s, to_tsquery('simple', %s) q "
+            "WHERE s.user_id = %s AND to_tsvector('simple', s.document) @@ q "
+            "ORDER BY rank DESC, s.date DESC LIMIT %s",
+            [ts_query, user.pk, limit],
+        ))
+
+    rows = list(
+        TransactionSearch.objects.filter(_match(query_words), user=user).order_by("-date")[:limit]
+    )
+    for row in rows:
+        row.rank = 0
+    return rows
@@ -0,0 +1,98 @@
+"""
+Batch settlement of external transfers.
+
+External transfers wait in status "pending" after the sender has been
+debited. The settlement engine claims them in batches, nets the totals per
+receiving bank, records a SettlementBatch and completes the whole batch with
+one bulk UPDATE.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Transfer, SettlementBatch
+from .transitions import transition_many
+
+
+def pending_external_transfers():
+    """External transfers waiting to be settled."""
+    return Transfer.objects.filter(
+        transfer_type="external",
+        status="pending",
+        settlement_batch__isnull=True,
+    )
+
+
+def settle_batch(batch_size=500, queryset=None, settled_by=None):
+    """
+    Claim up to ``batch_size`` pending external transfers and settle them.
+
+    Rows locked by a concurrent settlement run are skipped rather than waited
+    on, so several workers can settle in parallel.
+
+    Args:
+        batch_size: Maximum number of transfers in the batch
+        queryset: Optional Transfer queryset to restrict the candidates
+        settled_by: User running the settlement (admin action), if any
+
+    Returns:
+        SettlementBatch or None: The batch, or None when nothing was pending
+    """
+    candidates = pending_external_transfers()
+    if queryset is not None:
+        candidates = candidates.filter(pk__in=queryset.values("pk"))
+
+    with transaction.atomic():
+        ids = list(
+            candidates.select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return None
+
+        claimed = Transfer.objects.filter(pk__in=ids)
+        per_bank = (
+            claimed.values("receiver_bank")
+            .annotate(count=Count("id"), total=Sum("amount"))
+            .order_by("receiver_bank")
+        )
+
+        # NULL and blank banks are both reported as "Unknown"
+        per_bank_totals = {}
+        total_amount = Decimal("0.00")
+        for row in per_bank:
+            totals = per_bank_totals.setdefault(row["receiver_bank"] or "Unknown", {"count": 0, "total": Decimal("0.00")})
+            totals["count"] += row["count"]
+            totals["total"] += row["total"]
+            total_amount += row["total"]
+        bank_totals = {
+            bank: {"count": totals["count"], "total": str(totals["total"].quantize(Decimal("0.01")))}
+            for bank, totals in per_bank_totals.items()
+        }
+
+        batch = SettlementBatch.objects.create(
+            settled_by=settled_by,
+            transfer_count=len(ids),
+            total_amount=total_amount,
+            bank_totals=bank_totals,
+        )
+        transition_many(claimed, "pending", "completed", settlement_batch=batch)
+
+    return batch
+
+
+def settle_external_transfers(batch_size=500, queryset=None, settled_by=None):
+    """
+    Settle every pending external transfer, ``batch_size`` at a time.
+
+    Returns:
+        list: The SettlementBatch records created
+    """
+    batches = []
+    while True:
+        batch = settle_batch(batch_size, queryset, settled_by)
+        if batch is None:
+            return batches
+        batches.append(batch)
@@ -0,0 +1,110 @@
+"""
+Point-in-time balances.
+
+A nightly job stores each account's balance in BalanceSnapshot. To answer
+"what was the balance at X", ``balance_at`` starts from the latest snapshot
+taken at or before X and replays only the ledger rows after it, instead of
+the account's whole history. ``balances_at`` answers the same for many
+accounts at once (snapshot jobs, statements).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Max
+
+from account.models import Account
+from .ledger import ledger_balance, net_amount, net_totals
+from .models import BalanceSnapshot, LedgerEntry
+
+
+def balance_at(account, when):
+    """
+    Return the balance of ``account`` as of the datetime ``when``.
+
+    Costs one indexed snapshot lookup plus one aggregate over the ledger rows
+    dated between that snapshot and ``when``.
+    """
+    snapshot = (
+        BalanceSnapshot.objects.filter(account=account, taken_at__lte=when)
+        .order_by("-taken_at")
+        .first()
+    )
+    if snapshot is None:
+        return ledger_balance(account, until=when)
+    return snapshot.balance + ledger_balance(account, until=when, since=snapshot.taken_at)
+
+
+def balances_at(account_ids, when):
+    """
+    ``balance_at`` for many accounts at once.
+
+    Each account starts from its latest snapshot taken at or before
+    ``when``. Accounts snapshotted at the same time (normally all of them,
+    the previous night) share one grouped ledger aggregate, so the cost does
+    not grow with the number of accounts.
+
+    Returns:
+        dict: {account_id: balance as of ``when``} for every id given
+    """
+    latest = (
+        BalanceSnapshot.objects.filter(account_id__in=account_ids, taken_at__lte=when)
+        .values("account_id")
+        .annotate(taken_at=Max("taken_at"))
+    )
+    starts = {row["account_id"]: row["taken_at"] for row in latest}
+    previous = {
+        (snapshot.account_id, snapshot.taken_at): snapshot.balance
+        for snapshot in BalanceSnapshot.objects.filter(
+            account_id__in=account_ids,
+            taken_at__in=set(starts.values()),
+        )
+    } if starts else {}
+
+    by_start = defaultdict(list)
+    for account_id in account_ids:
+        by_start[starts.get(account_id)].append(account_id)
+
+    balances = {}
+    for start, ids in by_start.items():
+        entries = LedgerEntry.objects.filter(account_id__in=ids, date__lte=when)
+        if start is not None:
+            entries = entries.filter(date__gt=start)
+        movements = {
+            row["account_id"]: net_amount(row["credits"], row["debits"])
+            for row in entries.values("account_id").annotate(**net_totals())
+        }
+        for account_id in ids:
+            opening = previous.get((account_id, start), Decimal("0.00"))
+            balances[account_id] = opening + movements.get(account_id, Decimal("0.00"))
+    return balances
+
+
+def _snapshot_chunk(account_ids, as_of):
+    """Build (unsaved) snapshots as of ``as_of`` for one chunk of accounts."""
+    return [
+        BalanceSnapshot(account_id=account_id, balance=balance, taken_at=as_of)
+        for account_id, balance in balances_at(account_ids, as_of).items()
+    ]
+
+
+def take_snapshots(as_of, chunk_size=1000):
+    """
+    Snapshot every account's balance as of ``as_of``, ``chunk_size`` accounts
+    at a time. Re-running for the same ``as_of`` skips existing snapshots.
+
+    Returns:
+        int: Number of accounts processed
+    """
+    processed = 0
+    chunk = []
+    account_ids = Account.objects.order_by("pk").values_list("pk", flat=True)
+    for account_id in account_ids.iterator(chunk_size=chunk_size):
+        chunk.append(account_id)
+        if len(chunk) == chunk_size:
+            BalanceSnapshot.objects.bulk_create(_snapshot_chunk(chunk, as_of), ignore_conflicts=True)
+            processed += len(chunk)
+            chunk = []
+    if chunk:
+        BalanceSnapshot.objects.bulk_create(_snapshot_chunk(chunk, as_of), ignore_conflicts=True)
+        processed += len(chunk)
+    return processed
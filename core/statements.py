@@ -0,0 +1,209 @@
+"""
+Monthly account statements.
+
+The generate_statements command splits accounts into primary key ranges
+(``account_ranges``) and renders each range in a worker process with
+``statement_range``. A range costs a fixed number of queries however many
+accounts it holds: the opening and closing balances from
+core.snapshots.balances_at (the latest snapshot plus the ledger rows after
+it), one read of the range's MonthlyAccountStats rows for the month's money
+in and out, and one date-and-account range query per transaction model.
+
+Each statement is written to the default storage as HTML and PDF, then
+recorded as an AccountStatement. Accounts that already have a statement
+for the month are skipped, so a crashed run can simply be started again.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.template.loader import render_to_string
+
+from account.models import Account
+from .export import history_row
+from .feed import day_start
+from .models import AccountStatement, Deposit, MonthlyAccountStats, PaymentRequest, Transfer, Withdrawal
+from .pdf import text_pdf
+from .snapshots import balances_at
+from .utils import get_full_name
+
+
+def parse_month(value):
+    """
+    The first day of a "YYYY-MM" month.
+
+    Raises:
+        ValueError: ``value`` is not a valid month
+    """
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def previous_month(today):
+    """The first day of the month before ``today``'s."""
+    first = today.replace(day=1)
+    return (first.replace(year=first.year - 1, month=12) if first.month == 1
+            else first.replace(month=first.month - 1))
+
+
+def month_bounds(month):
+    """Aware [start, end) datetimes of ``month`` in the current time zone."""
+    next_month = (date(month.year + 1, 1, 1) if month.month == 12
+                  else date(month.year, month.month + 1, 1))
+    return day_start(month), day_start(next_month)
+
+
+def _balances(account_ids, start, end):
+    """{account_id: (opening, closing)}: the balances just before ``start`` and ``end``."""
+    just_before = timedelta(microseconds=1)
+    opening = balances_at(account_ids, start - just_before)
+    closing = balances_at(account_ids, end - just_before)
+    return {account_id: (opening[account_id], closing[account_id]) for account_id in account_ids}
+
+
+def _money_in_out(first_pk, last_pk, month):
+    """{account_id: (money in, money out)} of completed movements, from the monthly totals."""
+    return {
+        stats.account_id: (
+            stats.received_total + stats.deposited_total + stats.requests_received_total,
+            stats.sent_total + stats.withdrawn_total + stats.requests_paid_total,
+        )
+        for stats in MonthlyAccountStats.objects.filter(
+            account_id__gte=first_pk, account_id__lte=last_pk, month=month,
+        )
+    }
+
+
+def _transactions(first_pk, last_pk, start, end):
+    """{account_id: [(kind, transaction), ...]} for the month, one query per model."""
+    def in_range(field):
+        return Q(**{f"{field}__gte": first_pk, f"{field}__lte": last_pk})
+
+    month = {"date__gte": start, "date__lt": end}
+    sources = [
+        ("transfer", Transfer.objects.filter(in_range("account_id") | in_range("receiver_account_id"), **month)
+         .select_related("user__kyc", "receiver__kyc"), ("account_id", "receiver_account_id")),
+        ("deposit", Deposit.objects.filter(in_range("account_id"), **month).select_related("credit_card"),
+         ("account_id",)),
+        ("withdraw", Withdrawal.objects.filter(in_range("account_id"), **month), ("account_id",)),
+        ("request", PaymentRequest.objects.filter(in_range("sender_account_id") | in_range("receiver_account_id"), **month)
+         .select_related("sender__kyc", "receiver__kyc"), ("sender_account_id", "receiver_account_id")),
+    ]
+
+    by_account = {}
+    for kind, queryset, account_fields in sources:
+        for obj in queryset.iterator(chunk_size=2000):
+            # A transfer between two accounts of the range belongs to both
+            for account_id in {getattr(obj, field) for field in account_fields}:
+                if account_id is not None and first_pk <= account_id <= last_pk:
+                    by_account.setdefault(account_id, []).append((kind, obj))
+    return by_account
+
+
+def _text_lines(context):
+    """The statement as monospaced lines, for the PDF."""
+    account = context["account"]
+    lines = [
+        "PAYLIO ACCOUNT STATEMENT",
+        "",
+        f"Account holder: {context['holder']}",
+        f"Account number: {account.account_number}",
+        f"Period:         {context['month']:%B %Y}",
+        "",
+        f"Opening balance: ${context['opening_balance']:,.2f}",
+        f"Closing balance: ${context['closing_balance']:,.2f}",
+        f"Money in:        ${context['money_in']:,.2f}",
+        f"Money out:       ${context['money_out']:,.2f}",
+        "",
+        f"{'Date':<17}{'Transaction':<20}{'Details':<28}{'Amount':>14}  Status",
+        "-" * 86,
+    ]
+    for row in context["rows"]:
+        details = row["description"] or row["type"].title()
+        if row["counterparty"]:
+            details = f"{details} - {row['counterparty']}"
+        amount = -row["amount"] if row["direction"] == "debit" else row["amount"]
+        lines.append(
+            f"{row['date']:%Y-%m-%d %H:%M}  {row['transaction_id']:<20}"
+            f"{details[:27]:<28}{amount:>14,.2f}  {row['status']}"
+        )
+    if not context["rows"]:
+        lines.append("No transactions this month.")
+    return lines
+
+
+def _save(name, content):
+    # A crashed run may have stored the file without recording the statement
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def statement_range(month_value, first_pk, last_pk):
+    """
+    Render and store the statements of the accounts in one pk range.
+
+    Runs in a worker process; only plain values go in and out.
+
+    Args:
+        month_value: The statement month, "YYYY-MM"
+        first_pk, last_pk: Inclusive Account primary key range
+
+    Returns:
+        tuple: (statements generated, accounts skipped because already done)
+    """
+    month = parse_month(month_value)
+    start, end = month_bounds(month)
+
+    accounts = list(
+        Account.objects.filter(pk__gte=first_pk, pk__lte=last_pk, date__lt=end)
+        .select_related("user__kyc")
+        .order_by("pk")
+    )
+    done = set(
+        AccountStatement.objects.filter(account__in=accounts, month=month)
+        .values_list("account_id", flat=True)
+    )
+    pending = [account for account in accounts if account.pk not in done]
+    if not pending:
+        return 0, len(done)
+
+    balances = _balances([account.pk for account in pending], start, end)
+    money_in_out = _money_in_out(first_pk, last_pk, month)
+    transactions = _transactions(first_pk, last_pk, start, end)
+
+    generated = 0
+    for account in pending:
+        user = account.user
+        items = sorted(transactions.get(account.pk, []), key=lambda item: (item[1].date, item[1].transaction_id))
+        opening, closing = balances[account.pk]
+        money_in, money_out = money_in_out.get(account.pk, (Decimal("0.00"), Decimal("0.00")))
+        context = {
+            "account": account,
+            "holder": get_full_name(user),
+            "month": month,
+            "opening_balance": opening,
+            "closing_balance": closing,
+            "money_in": money_in,
+            "money_out": money_out,
+            "rows": [history_row(user, kind, obj) for kind, obj in items],
+        }
+
+        base = f"statements/{month:%Y-%m}/{account.account_number}"
+        html_name = _save(f"{base}.html", render_to_string("statements/statement.html", context).encode("utf-8"))
+        pdf_name = _save(f"{base}.pdf", text_pdf(
+            _text_lines(context), title=f"Paylio statement {month:%B %Y} - {account.account_number}",
+        ))
+
+        AccountStatement.objects.create(
+            account=account,
+            month=month,
+            opening_balance=opening,
+            closing_balance=closing,
+            transaction_count=len(items),
+            html_file=html_name,
+            pdf_file=pdf_name,
+        )
+        generated += 1
+    return generated, len(done)
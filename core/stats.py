@@ -0,0 +1,160 @@
+"""
+Per-account monthly totals (MonthlyAccountStats).
+
+A movement counts once it has completed: a transfer when it reaches
+'completed' (for external transfers, when settlement completes it), a
+deposit when it is credited, a withdrawal when it is debited and a payment
+request when it is settled. core.transitions records each of them in a
+``StatsDelta`` and applies it in the same database transaction as the
+status change; a completed transfer that is later failed and refunded is
+subtracted again.
+
+Deltas are added with ``UPDATE ... SET x = x + delta``, so concurrent
+writers to the same month never overwrite each other's totals.
+``backfill_stats`` rebuilds the table from the transaction tables.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Deposit, MonthlyAccountStats, PaymentRequest, Transfer, Withdrawal
+
+STAT_FIELDS = ("sent", "received", "deposited", "withdrawn", "requests_paid", "requests_received")
+
+
+def month_of(when):
+    """The first day of ``when``'s month in the current time zone."""
+    return timezone.localtime(when).date().replace(day=1)
+
+
+class StatsDelta:
+    """Changes to MonthlyAccountStats collected before they are written."""
+
+    def __init__(self):
+        # {(account_id, month): {field: [total, count]}}
+        self.deltas = {}
+
+    def add(self, account_id, when, field, amount, sign=1):
+        """
+        Count one movement of ``amount`` on ``account_id``.
+
+        Args:
+            account_id: Account the movement belongs to
+            when: Datetime of the transaction; picks the month
+            field: One of STAT_FIELDS
+            amount: Amount of the movement
+            sign: -1 to take back a movement counted earlier
+        """
+        totals = self.deltas.setdefault((account_id, month_of(when)), {})
+        delta = totals.setdefault(field, [Decimal("0.00"), 0])
+        delta[0] += sign * amount
+        delta[1] += sign
+
+    def apply(self):
+        """
+        Write the collected changes: one INSERT for months that have no row
+        yet, one SELECT and one bulk UPDATE. Call inside the transaction.
+        """
+        if not self.deltas:
+            return
+        MonthlyAccountStats.objects.bulk_create(
+            [MonthlyAccountStats(account_id=account_id, month=month) for account_id, month in self.deltas],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+        fields = sorted({field for totals in self.deltas.values() for field in totals})
+        rows = MonthlyAccountStats.objects.filter(
+            account_id__in={account_id for account_id, _ in self.deltas},
+            month__in={month for _, month in self.deltas},
+        ).only("pk", "account_id", "month").order_by("pk")
+
+        changed = []
+        for row in rows:
+            totals = self.deltas.get((row.account_id, row.month))
+            if totals is None:
+                continue
+            # Every listed column is written for every row, so columns this
+            # row has no delta for are added zero rather than overwritten
+            for field in fields:
+                total, count = totals.get(field, (0, 0))
+                setattr(row, f"{field}_total", F(f"{field}_total") + total)
+                setattr(row, f"{field}_count", F(f"{field}_count") + count)
+            changed.append(row)
+
+        update_fields = [f"{field}_{part}" for field in fields for part in ("total", "count")]
+        MonthlyAccountStats.objects.bulk_update(changed, update_fields, batch_size=500)
+        self.deltas = {}
+
+
+def total_sums():
+    """Aggregate expressions summing every STAT_FIELDS column over monthly rows."""
+    return {
+        f"{field}_{part}": Sum(f"{field}_{part}")
+        for field in STAT_FIELDS for part in ("total", "count")
+    }
+
+
+def account_totals(account):
+    """
+    All-time totals of ``account``, summed over its monthly rows.
+
+    Returns:
+        dict: ``{"sent_total": ..., "sent_count": ..., ...}`` for STAT_FIELDS
+    """
+    totals = MonthlyAccountStats.objects.filter(account=account).aggregate(**total_sums())
+    return {
+        name: value if value is not None else (0 if name.endswith("_count") else Decimal("0.00"))
+        for name, value in totals.items()
+    }
+
+
+def _grouped(queryset, account_field):
+    """(account_id, month, total, count) of ``queryset`` grouped by account and month."""
+    return (
+        queryset.exclude(**{f"{account_field}__isnull": True})
+        .annotate(stats_month=TruncMonth("date", tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values_list(account_field, "stats_month")
+        .annotate(total=Sum("amount"), count=Count("pk"))
+    )
+
+
+def backfill_stats():
+    """
+    Replace every MonthlyAccountStats row with totals computed from the
+    transaction tables, with one grouped query per statistic.
+
+    Run while no transactions are being processed: movements completed
+    during the backfill may be missed or counted twice.
+
+    Returns:
+        int: Number of rows written
+    """
+    completed = Q(status="completed")
+    sources = [
+        ("sent", Transfer.objects.filter(completed), "account_id"),
+        ("received", Transfer.objects.filter(completed), "receiver_account_id"),
+        ("deposited", Deposit.objects.filter(completed), "account_id"),
+        ("withdrawn", Withdrawal.objects.filter(completed), "account_id"),
+        ("requests_paid", PaymentRequest.objects.filter(status="request_settled"), "receiver_account_id"),
+        ("requests_received", PaymentRequest.objects.filter(status="request_settled"), "sender_account_id"),
+    ]
+
+    rows = {}
+    for field, queryset, account_field in sources:
+        for account_id, month, total, count in _grouped(queryset, account_field):
+            if isinstance(month, datetime):
+                month = month.date()
+            row = rows.setdefault((account_id, month), MonthlyAccountStats(account_id=account_id, month=month))
+            setattr(row, f"{field}_total", total)
+            setattr(row, f"{field}_count", count)
+
+    with transaction.atomic():
+        MonthlyAccountStats.objects.all().delete()
+        MonthlyAccountStats.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
@@ -0,0 +1,129 @@
+"""
+Versioned cache of per-account summaries (the dashboard's totals, recent
+transfers and cards).
+
+Each account holder has a version token in the cache. A summary is stored
+under a key that includes the token, so changing the token invalidates
+every summary computed before it without deleting anything:
+
+    summary-version:<user_id>          -> token
+    dashboard-summary:<user_id>:<token> -> summary
+
+Write paths call ``invalidate_summaries`` with the users they touched (see
+core.signals and core.transitions). A new token is set once the database
+transaction commits, so a summary computed from data that was not yet
+committed can never be stored under the new token.
+
+Notifications have a token of their own (``notification_version``,
+``invalidate_notifications``). The dashboard templates key their cached
+fragments on both tokens.
+
+Concurrent misses for one user are computed once. The first request takes a
+short lock with ``cache.add``, and the others wait for its result instead of
+running the same queries (SUMMARY_LOCK_WAIT at most, then they compute it
+themselves).
+
+The cache is ``settings.SUMMARY_CACHE``. It must be shared by every
+process that changes balances, web workers and management commands alike
+(Redis, or a server speaking its protocol): a version token changed in one
+process's local memory is never seen by the others, which would keep
+serving the old summary. Without a shared cache the settings use a dummy
+cache, so every summary is computed from the database.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+SUMMARY_LOCK_TIMEOUT = 10  # seconds a computing request may hold the lock
+SUMMARY_LOCK_WAIT = 2  # seconds other requests wait for its result
+SUMMARY_POLL_INTERVAL = 0.05
+
+
+def _cache():
+    return caches[settings.SUMMARY_CACHE]
+
+
+def _version_key(scope, user_id):
+    return f"{scope}-version:{user_id}"
+
+
+def _version(scope, user_id):
+    # A token that was evicted is replaced by a new random one, never by a
+    # value that an older entry may still be stored under
+    cache = _cache()
+    key = _version_key(scope, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _invalidate(scope, user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _cache().set_many(
+            {_version_key(scope, user_id): uuid.uuid4().hex for user_id in user_ids}, timeout=None,
+        ))
+
+
+def summary_version(user_id):
+    """The current version token of ``user_id``'s summaries."""
+    return _version("summary", user_id)
+
+
+def notification_version(user_id):
+    """The current version token of ``user_id``'s notifications."""
+    return _version("notifications", user_id)
+
+
+def invalidate_summaries(user_ids):
+    """
+    Invalidate the cached summaries of ``user_ids`` once the current
+    database transaction commits (immediately outside a transaction).
+    """
+    _invalidate("summary", user_ids)
+
+
+def invalidate_notifications(user_ids):
+    """Like ``invalidate_summaries``, for the users' notifications."""
+    _invalidate("notifications", user_ids)
+
+
+def cached_summary(user_id, compute):
+    """
+    ``user_id``'s summary from the cache, computed with ``compute()`` on a miss.
+
+    Args:
+        user_id: The account holder's user id
+        compute: Callable returning the (picklable) summary
+
+    Returns:
+        The summary
+    """
+    cache = _cache()
+    key = f"dashboard-summary:{user_id}:{summary_version(user_id)}"
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=SUMMARY_LOCK_TIMEOUT):
+        # Another request is computing this summary; wait for it
+        deadline = time.monotonic() + SUMMARY_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(SUMMARY_POLL_INTERVAL)
+            summary = cache.get(key)
+            if summary is not None:
+                return summary
+        return compute()
+
+    try:
+        summary = compute()
+        cache.set(key, summary, timeout=settings.SUMMARY_CACHE_TTL)
+    finally:
+        cache.delete(lock_key)
+    return summary
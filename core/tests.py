@@ -1,3 +1,977 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import InMemoryStorage
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from account.models import Account
+from account.tests import make_customer
+from .approvals import approve_deposits
+from .balance import InsufficientFunds, credit, get_balance, rebuild_balance, transfer_funds
+from .ledger import ledger_balance
+from .idempotency import new_idempotency_key
+from .feed import InvalidCursor, feed_page, resolve_transaction
+from .models import (
+    AccountStatement, BalanceSnapshot, CreditCard, Deposit, IdempotencyKey, LedgerEntry, MonthlyAccountStats,
+    Notification, PaymentRequest, ReconciliationMismatch, SettlementBatch, TransactionIndex, TransactionSearch,
+    Transfer, Withdrawal,
+)
+from .search import search_transactions
+from .settlement import settle_batch, settle_external_transfers
+from .snapshots import balance_at, balances_at
+from .statements import month_bounds, statement_range
+from .stats import account_totals
+from .transitions import InvalidTransition, transition, transition_many
+
+
+def balance_of(user):
+    return Account.objects.get(user=user).account_balance
+
+
+def make_transfer(sender, receiver, amount, status="processing", **fields):
+    return Transfer.objects.create(
+        user=sender,
+        account=sender.account,
+        receiver=receiver,
+        receiver_account=receiver.account if receiver else None,
+        amount=Decimal(amount),
+        status=status,
+        **fields,
+    )
+
+
+def make_deposit(user, amount, status="pending", **fields):
+    return Deposit.objects.create(user=user, account=user.account, amount=Decimal(amount), status=status, **fields)
+
+
+class BalanceServiceTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob", Decimal("50.00"))
+
+    def test_transfer_moves_the_amount(self):
+        transfer = make_transfer(self.alice, self.bob, "30.00")
+        transfer_funds(Account.objects.get(user=self.alice), Account.objects.get(user=self.bob), transfer.amount, transfer)
+        self.assertEqual(balance_of(self.alice), Decimal("70.00"))
+        self.assertEqual(balance_of(self.bob), Decimal("80.00"))
+
+    def test_overdraft_is_rejected_and_nothing_changes(self):
+        transfer = make_transfer(self.alice, self.bob, "100.01")
+        with self.assertRaises(InsufficientFunds):
+            transfer_funds(Account.objects.get(user=self.alice), Account.objects.get(user=self.bob), transfer.amount, transfer)
+        self.assertEqual(balance_of(self.alice), Decimal("100.00"))
+        self.assertEqual(balance_of(self.bob), Decimal("50.00"))
+        self.assertFalse(LedgerEntry.objects.filter(transaction_id=transfer.transaction_id).exists())
+
+    def test_transfer_to_the_same_account_is_rejected(self):
+        account = Account.objects.get(user=self.alice)
+        transfer = make_transfer(self.alice, self.alice, "10.00")
+        with self.assertRaises(ValueError):
+            transfer_funds(account, account, transfer.amount, transfer)
+        self.assertEqual(balance_of(self.alice), Decimal("100.00"))
+        self.assertFalse(LedgerEntry.objects.filter(transaction_id=transfer.transaction_id).exists())
+
+    def test_transfer_form_rejects_the_senders_own_account(self):
+        self.client.force_login(self.alice)
+        account_number = self.alice.account.account_number
+        response = self.client.post(
+            reverse("core:amount-transfare-Process", args=[account_number]),
+            {"amount-send": "10.00", "description": "To myself"},
+        )
+        self.assertRedirects(response, reverse("core:search-account"), fetch_redirect_response=False)
+        self.assertFalse(Transfer.objects.exists())
+        self.assertEqual(balance_of(self.alice), Decimal("100.00"))
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        for user, amount in ((self.alice, "100.00"), (self.bob, "40.00")):
+            transition(make_deposit(user, amount), "completed")
+        transition(make_transfer(self.alice, self.bob, "30.00"), "completed")
+        transition(make_transfer(self.bob, self.alice, "5.00"), "completed")
+
+    def test_every_movement_nets_to_zero(self):
+        for transaction_id in LedgerEntry.objects.values_list("transaction_id", flat=True).distinct():
+            entries = LedgerEntry.objects.filter(transaction_id=transaction_id)
+            self.assertEqual(entries.count(), 2)
+            self.assertEqual(
+                entries.filter(entry_type="debit").aggregate(total=Sum("amount"))["total"],
+                entries.filter(entry_type="credit").aggregate(total=Sum("amount"))["total"],
+            )
+
+    def test_rebuilt_balance_equals_the_stored_balance(self):
+        for user, expected in ((self.alice, Decimal("75.00")), (self.bob, Decimal("65.00"))):
+            account = Account.objects.get(user=user)
+            self.assertEqual(account.account_balance, expected)
+            self.assertEqual(ledger_balance(account), expected)
+            self.assertEqual(rebuild_balance(account), expected)
+
+    def test_opening_entries_predate_the_accounts_history(self):
+        carol = make_customer("carol", Decimal("20.00"))
+        first = make_transfer(self.alice, carol, "1.00", status="failed", date=timezone.now() - timedelta(days=400))
+        migration = importlib.import_module("core.migrations.0020_ledgerentry")
+
+        LedgerEntry.objects.filter(transaction_id__startswith="OPEN").delete()
+        migration.open_ledger(apps, None)
+
+        opening = LedgerEntry.objects.get(transaction_id=f"OPEN{carol.account.account_number}", account__isnull=False)
+        self.assertEqual(opening.amount, Decimal("20.00"))
+        self.assertLessEqual(opening.date, first.date)
+        self.assertEqual(ledger_balance(carol.account, until=first.date), Decimal("20.00"))
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+        self.client.force_login(self.alice)
+        self.transfer = make_transfer(self.alice, self.bob, "25.00")
+        self.url = reverse("core:transaction-process", args=[self.bob.account.account_number, self.transfer.transaction_id])
+        self.key = new_idempotency_key()
+
+    def submit(self, pin):
+        return self.client.post(self.url, {"pin-number": pin, "idempotency_key": self.key})
+
+    def test_replayed_key_does_not_move_money_twice(self):
+        pin = self.alice.account.pin_number
+        first = self.submit(pin)
+        second = self.submit(pin)
+        self.assertEqual(second["Location"], first["Location"])
+        self.assertEqual(balance_of(self.alice), Decimal("75.00"))
+        self.assertEqual(balance_of(self.bob), Decimal("25.00"))
+
+    def test_wrong_pin_can_be_retried_with_the_same_key(self):
+        self.submit("wrong")
+        self.assertFalse(IdempotencyKey.objects.filter(key=self.key).exists())
+
+        response = self.submit(self.alice.account.pin_number)
+        self.assertRedirects(
+            response,
+            reverse("core:transfar-completed", args=[self.bob.account.account_number, self.transfer.transaction_id]),
+            fetch_redirect_response=False,
+        )
+        self.transfer.refresh_from_db()
+        self.assertEqual(self.transfer.status, "completed")
+        self.assertEqual(balance_of(self.alice), Decimal("75.00"))
+
+
+class ShardedBalanceTests(TestCase):
+    def setUp(self):
+        caches[settings.SUMMARY_CACHE].clear()
+        self.owner = make_customer("acme", Decimal("100.00"))
+        Account.objects.filter(user=self.owner).update(business_account=True, balance_shard_count=4)
+        self.account = Account.objects.get(user=self.owner)
+        credit(self.account, Decimal("25.00"), shard_key="TRF1")
+        self.client.force_login(self.owner)
+
+    def test_balance_includes_the_shards(self):
+        self.assertEqual(self.account.account_balance, Decimal("100.00"))
+        self.assertEqual(get_balance(self.account), Decimal("125.00"))
+
+    def test_pages_show_the_balance_with_the_shards(self):
+        for url in (reverse("account:dashboard"), reverse("core:bulk-transfer")):
+            response = self.client.get(url)
+            self.assertEqual(response.context["balance"], Decimal("125.00"), url)
+            self.assertContains(response, "125.00")
+
+
+class SettlementTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("500.00"))
+        self.transfers = []
+        for amount, bank in (("100.00", "GTBank"), ("50.00", "GTBank"), ("25.00", "Zenith")):
+            transfer = make_transfer(self.alice, None, amount, transfer_type="external", receiver_bank=bank)
+            transition(transfer, "pending")
+            self.transfers.append(transfer)
+
+    def test_batch_completes_the_transfers_with_per_bank_totals(self):
+        batch = settle_batch()
+        self.assertEqual(batch.transfer_count, 3)
+        self.assertEqual(batch.total_amount, Decimal("175.00"))
+        self.assertEqual(batch.bank_totals, {
+            "GTBank": {"count": 2, "total": "150.00"},
+            "Zenith": {"count": 1, "total": "25.00"},
+        })
+        self.assertEqual(set(batch.transfers.values_list("status", flat=True)), {"completed"})
+        # The sender was debited when the transfers were submitted
+        self.assertEqual(balance_of(self.alice), Decimal("325.00"))
+
+    def test_missing_and_blank_banks_add_up_as_unknown(self):
+        for amount, bank in (("10.00", None), ("5.00", ""), ("2.50", "")):
+            transition(make_transfer(self.alice, None, amount, transfer_type="external", receiver_bank=bank), "pending")
+        batch = settle_batch()
+        self.assertEqual(batch.bank_totals["Unknown"], {"count": 3, "total": "17.50"})
+        self.assertEqual(batch.total_amount, Decimal("192.50"))
+
+    def test_second_run_skips_settled_transfers(self):
+        settle_external_transfers(batch_size=2)
+        self.assertIsNone(settle_batch())
+        self.assertEqual(SettlementBatch.objects.count(), 2)
+        self.assertEqual(Transfer.objects.filter(settlement_batch__isnull=False).count(), 3)
+        self.assertEqual(balance_of(self.alice), Decimal("325.00"))
+
+    def test_rows_claimed_by_another_run_are_not_transitioned_again(self):
+        claimed = Transfer.objects.filter(pk=self.transfers[0].pk)
+        self.assertEqual(len(transition_many(claimed, "pending", "completed")), 1)
+        self.assertEqual(transition_many(claimed, "pending", "completed"), [])
+
+        batch = settle_batch()
+        self.assertEqual(batch.transfer_count, 2)
+        self.assertNotIn(self.transfers[0], batch.transfers.all())
+
+
+@mock.patch("core.statements.default_storage", InMemoryStorage())
+class StatementTests(TestCase):
+    def setUp(self):
+        self.month = timezone.localdate().replace(day=1)
+        self.start, self.end = month_bounds(self.month)
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        self.account = Account.objects.get(user=self.alice)
+        # Carried over from before the month, known only from the snapshot
+        BalanceSnapshot.objects.create(account=self.account, balance=Decimal("500.00"), taken_at=self.start - timedelta(days=1))
+        transition(make_deposit(self.alice, "100.00"), "completed")
+        transition(make_transfer(self.alice, self.bob, "30.00"), "completed")
+
+    def run_statements(self):
+        first, last = sorted([self.account.pk, self.bob.account.pk])
+        return statement_range(f"{self.month:%Y-%m}", first, last)
+
+    def test_balances_come_from_the_snapshots(self):
+        self.run_statements()
+        statement = AccountStatement.objects.get(account=self.account)
+        self.assertEqual(statement.opening_balance, Decimal("500.00"))
+        self.assertEqual(statement.closing_balance, Decimal("570.00"))
+        self.assertEqual(statement.transaction_count, 2)
+
+    def test_interrupted_run_resumes_with_the_missing_statements(self):
+        pdf_calls = []
+
+        def crash_on_second_pdf(*args, **kwargs):
+            pdf_calls.append(args)
+            if len(pdf_calls) == 2:
+                raise RuntimeError("worker killed")
+            return b"%PDF-1.4"
+
+        # The second account's HTML is stored before the run dies
+        with mock.patch("core.statements.text_pdf", side_effect=crash_on_second_pdf):
+            with self.assertRaises(RuntimeError):
+                self.run_statements()
+        self.assertEqual(AccountStatement.objects.count(), 1)
+        done = AccountStatement.objects.get()
+
+        self.assertEqual(self.run_statements(), (1, 1))
+        self.assertEqual(AccountStatement.objects.count(), 2)
+        self.assertEqual(AccountStatement.objects.get(account=done.account).pk, done.pk)
+        for statement in AccountStatement.objects.all():
+            # The leftover file is replaced, not saved under a new name
+            self.assertEqual(statement.html_file.name, f"statements/{self.month:%Y-%m}/{statement.account.account_number}.html")
+
+        self.assertEqual(self.run_statements(), (0, 2))
+
+    def test_bulk_lookup_agrees_with_balance_at(self):
+        when = timezone.now()
+        accounts = [self.account, Account.objects.get(user=self.bob)]
+        self.assertEqual(
+            balances_at([account.pk for account in accounts], when),
+            {account.pk: balance_at(account, when) for account in accounts},
+        )
+
+
+class PayrollTests(TestCase):
+    def setUp(self):
+        self.employer = make_customer("acme", Decimal("1000.00"))
+        Account.objects.filter(user=self.employer).update(business_account=True)
+        self.bob = make_customer("bob")
+        self.carol = make_customer("carol")
+        self.client.force_login(self.employer)
+
+    def submit(self, rows):
+        lines = ["account_number,amount,description"] + [
+            f"{user.account.account_number},{amount},Salary" for user, amount in rows
+        ]
+        upload = SimpleUploadedFile("payroll.csv", "\n".join(lines).encode(), content_type="text/csv")
+        return self.client.post(reverse("core:bulk-transfer"), {
+            "pin-number": self.employer.account.pin_number,
+            "payroll_file": upload,
+        })
+
+    def test_every_recipient_is_credited_with_one_ledger_pair_each(self):
+        response = self.submit([(self.bob, "100.00"), (self.carol, "250.00"), (self.bob, "50.00")])
+        self.assertRedirects(response, reverse("core:transaction-list"), fetch_redirect_response=False)
+
+        self.assertEqual(balance_of(self.employer), Decimal("600.00"))
+        self.assertEqual(balance_of(self.bob), Decimal("150.00"))
+        self.assertEqual(balance_of(self.carol), Decimal("250.00"))
+
+        transfers = Transfer.objects.filter(user=self.employer)
+        self.assertEqual(transfers.count(), 3)
+        for transfer in transfers:
+            entries = LedgerEntry.objects.filter(transaction_id=transfer.transaction_id)
+            self.assertEqual(
+                sorted((entry.entry_type, entry.account_id) for entry in entries),
+                [("credit", transfer.receiver_account_id), ("debit", transfer.account_id)],
+            )
+            self.assertTrue(all(entry.amount == transfer.amount for entry in entries))
+
+    def test_payroll_has_the_effects_of_single_transfers(self):
+        with mock.patch("core.transitions.queue_html_email") as queue_html_email:
+            self.submit([(self.bob, "100.00"), (self.carol, "250.00"), (self.bob, "50.00")])
+
+        transfers = Transfer.objects.filter(user=self.employer)
+        self.assertEqual(set(transfers.values_list("status", flat=True)), {"completed"})
+        self.assertEqual(
+            set(TransactionIndex.objects.filter(user=self.employer).values_list("status", flat=True)), {"completed"},
+        )
+        self.assertEqual(len(search_transactions(self.bob, "salary")), 2)
+
+        self.assertEqual(Notification.objects.filter(user=self.employer, notification_type="Debit Alert").count(), 3)
+        self.assertEqual(Notification.objects.filter(user=self.bob, notification_type="Credit Alert").count(), 2)
+        totals = account_totals(self.employer.account)
+        self.assertEqual((totals["sent_total"], totals["sent_count"]), (Decimal("400.00"), 3))
+        self.assertEqual(account_totals(self.bob.account)["received_total"], Decimal("150.00"))
+        recipients = [call.args[1] for call in queue_html_email.call_args_list]
+        self.assertEqual(recipients.count([self.bob.email]), 2)
+        self.assertEqual(recipients.count([self.employer.email]), 3)
+
+    def test_payroll_the_account_cannot_cover_writes_nothing(self):
+        response = self.submit([(self.bob, "600.00"), (self.carol, "400.01")])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["errors"])
+        self.assertEqual(balance_of(self.employer), Decimal("1000.00"))
+        self.assertFalse(Transfer.objects.exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+
+
+class TransitionTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+
+    def test_move_outside_the_table_raises_and_changes_nothing(self):
+        transfer = make_transfer(self.alice, self.bob, "10.00", status="completed")
+        with self.assertRaises(InvalidTransition):
+            transition(transfer, "processing")
+        self.assertEqual(transfer.status, "completed")
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "completed")
+        self.assertEqual(balance_of(self.alice), Decimal("100.00"))
+
+    def test_stale_object_returns_false_and_changes_nothing(self):
+        transfer = make_transfer(self.alice, self.bob, "10.00")
+        stale = Transfer.objects.get(pk=transfer.pk)
+        self.assertTrue(transition(transfer, "completed"))
+
+        self.assertFalse(transition(stale, "failed"))
+        self.assertEqual(stale.status, "processing")
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "completed")
+        self.assertEqual(balance_of(self.alice), Decimal("90.00"))
+        self.assertEqual(balance_of(self.bob), Decimal("10.00"))
+
+    def test_failed_handler_rolls_the_status_back(self):
+        transfer = make_transfer(self.alice, self.bob, "150.00")
+        with self.assertRaises(InsufficientFunds):
+            transition(transfer, "completed")
+        self.assertEqual(transfer.status, "processing")
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "processing")
+
+    def test_database_error_while_submitting_a_deposit_marks_it_failed(self):
+        deposit = make_deposit(self.alice, "20.00")
+        self.client.force_login(self.alice)
+
+        def fail_on_submit(obj, to_status, **kwargs):
+            if to_status == "processing":
+                # A database error inside the view's transaction
+                Deposit.objects.create(transaction_id=obj.transaction_id, user=self.alice, account=self.alice.account)
+            return transition(obj, to_status, **kwargs)
+
+        with mock.patch("core.deposit.transition", side_effect=fail_on_submit):
+            response = self.client.post(reverse("core:process-deposit", args=[deposit.transaction_id]))
+
+        self.assertRedirects(
+            response, reverse("core:deposit-failure", args=[deposit.transaction_id]), fetch_redirect_response=False,
+        )
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.status, "failed")
+
+
+class DepositApprovalTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        self.deposits = [
+            make_deposit(self.alice, "10.00", status="processing"),
+            make_deposit(self.alice, "15.00", status="processing"),
+            make_deposit(self.bob, "20.00", status="pending"),
+        ]
+
+    def test_approves_and_credits_every_deposit(self):
+        result = approve_deposits(Deposit.objects.all(), batch_size=2)
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(result["total"], Decimal("45.00"))
+        self.assertEqual(balance_of(self.alice), Decimal("25.00"))
+        self.assertEqual(balance_of(self.bob), Decimal("20.00"))
+        self.assertEqual(LedgerEntry.objects.filter(book="deposits").count(), 3)
+
+    def test_second_run_skips_approved_deposits(self):
+        approve_deposits(Deposit.objects.all())
+        result = approve_deposits(Deposit.objects.all())
+        self.assertEqual(result["count"], 0)
+        self.assertEqual(balance_of(self.alice), Decimal("25.00"))
+        self.assertEqual(LedgerEntry.objects.count(), 6)
+
+    def test_deposit_without_an_account_is_failed_not_credited(self):
+        orphan = make_deposit(self.alice, "99.00", status="processing")
+        Deposit.objects.filter(pk=orphan.pk).update(account=None)
+
+        result = approve_deposits(Deposit.objects.all())
+        self.assertEqual(result["count"], 3)
+        self.assertEqual(result["failed"], 1)
+        orphan.refresh_from_db()
+        self.assertEqual(orphan.status, "failed")
+        self.assertEqual(balance_of(self.alice), Decimal("25.00"))
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        now = timezone.now()
+        self.transfer = make_transfer(self.alice, self.bob, "1.00", date=now - timedelta(hours=4))
+        self.deposit = make_deposit(self.alice, "2.00", date=now - timedelta(hours=3))
+        self.withdrawal = Withdrawal.objects.create(
+            user=self.alice, account=self.alice.account, amount=Decimal("3.00"), date=now - timedelta(hours=2),
+        )
+        self.request = PaymentRequest.objects.create(
+            user=self.bob, sender=self.bob, sender_account=self.bob.account,
+            receiver=self.alice, receiver_account=self.alice.account,
+            amount=Decimal("4.00"), status="request_sent", date=now - timedelta(hours=1),
+        )
+        # Someone else's transaction
+        make_deposit(self.bob, "5.00")
+
+    def test_feed_merges_every_kind_newest_first(self):
+        page = feed_page(self.alice)
+        self.assertEqual(list(page), [self.request, self.withdrawal, self.deposit, self.transfer])
+        self.assertEqual(page.total, 4)
+        self.assertFalse(page.has_other_pages())
+
+    def test_page_is_loaded_with_one_query_per_kind(self):
+        # The page of index rows, the count, then one query per kind
+        with self.assertNumQueries(6):
+            page = feed_page(self.alice)
+            [obj.transaction_type for obj in page]
+
+    def test_counterparty_sees_the_transfer(self):
+        self.assertEqual(list(feed_page(self.bob, kinds=["transfer"])), [self.transfer])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        same_time = timezone.now() - timedelta(days=1)
+        # Several transactions share a timestamp; the id breaks the tie
+        self.transfers = [make_transfer(self.alice, self.bob, "1.00", date=same_time) for _ in range(5)]
+        self.transfers += [make_transfer(self.alice, self.bob, "1.00", date=same_time - timedelta(minutes=n)) for n in (1, 2)]
+        self.expected = sorted(self.transfers, key=lambda transfer: (transfer.date, transfer.transaction_id), reverse=True)
+
+    def test_pages_round_trip_without_gaps_or_duplicates(self):
+        pages = [feed_page(self.alice, page_size=3)]
+        while pages[-1].has_next:
+            pages.append(feed_page(self.alice, cursor=pages[-1].next_cursor, page_size=3))
+        self.assertEqual([obj for page in pages for obj in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous)
+
+        # ... and back again
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(feed_page(self.alice, cursor=back[-1].previous_cursor, page_size=3))
+        self.assertEqual([list(page) for page in back[::-1]], [list(page) for page in pages])
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ("not-a-cursor", "bmV4dHx4fHk"):
+            with self.assertRaises(InvalidCursor):
+                feed_page(self.alice, cursor=cursor)
+
+    def test_approximate_total_stops_counting_at_the_limit(self):
+        page = feed_page(self.alice, total="approximate")
+        self.assertEqual(page.total, 7)
+        self.assertFalse(page.total_is_approximate)
+
+        with mock.patch("core.feed.APPROXIMATE_TOTAL_LIMIT", 5):
+            page = feed_page(self.alice, total="approximate")
+        self.assertEqual(page.total, 5)
+        self.assertTrue(page.total_is_approximate)
+
+    def test_total_can_be_skipped(self):
+        self.assertIsNone(feed_page(self.alice, total=None).total)
+
+
+class FeedFilterTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        day = timezone.make_aware(datetime(2026, 3, 10))
+        self.first = make_transfer(self.alice, self.bob, "1.00", status="completed", date=day)
+        self.last_instant = make_transfer(
+            self.alice, self.bob, "2.00", status="failed", date=day + timedelta(days=1, microseconds=-1),
+        )
+        self.next_day = make_transfer(self.alice, self.bob, "3.00", status="completed", date=day + timedelta(days=1))
+        self.client.force_login(self.alice)
+
+    def test_date_range_includes_both_whole_days(self):
+        page = feed_page(self.alice, date_from=self.first.date.date(), date_to=self.first.date.date())
+        self.assertEqual(list(page), [self.last_instant, self.first])
+
+    def test_status_filter(self):
+        self.assertEqual(list(feed_page(self.alice, status="completed")), [self.next_day, self.first])
+
+    def test_list_view_applies_the_filters(self):
+        response = self.client.get(reverse("core:transaction-list"), {
+            "status": "completed", "date_from": "2026-03-11", "type": "transfer",
+        })
+        self.assertEqual(list(response.context["transactions"]), [self.next_day])
+
+    def test_invalid_date_is_ignored_with_a_warning(self):
+        response = self.client.get(reverse("core:transaction-list"), {"date_from": "10/03/2026"})
+        self.assertEqual(len(response.context["transactions"]), 3)
+        self.assertContains(response, "Dates must be in the format YYYY-MM-DD")
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        self.rent = make_transfer(self.alice, self.bob, "250.00", description="March rent")
+        self.other = make_transfer(self.alice, self.bob, "12.00", description="Lunch")
+        self.client.force_login(self.alice)
+
+    def test_finds_by_description_amount_and_counterparty(self):
+        self.assertEqual(list(feed_page(self.alice, search="rent")), [self.rent])
+        self.assertEqual(list(feed_page(self.alice, search="250")), [self.rent])
+        self.assertEqual(list(feed_page(self.bob, search="alice lunch")), [self.other])
+        self.assertEqual([row.object_id for row in search_transactions(self.alice, "marc")], [self.rent.pk])
+
+    def test_query_without_words_does_not_filter(self):
+        for query in ("!!!", '"', "*"):
+            self.assertEqual(len(feed_page(self.alice, search=query)), 2, query)
+            self.assertEqual(search_transactions(self.alice, query), [])
+
+        response = self.client.get(reverse("core:transaction-list"), {"search": '"'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse("core:transaction-api"), {"search": "!!!"})
+        self.assertEqual(response.status_code, 200)
+
+    def index_with_migration(self):
+        TransactionSearch.objects.all().delete()
+        migration = importlib.import_module("core.migrations.0027_transactionsearch")
+        state = MigrationLoader(connection).project_state(("core", "0027_transactionsearch"))
+        migration.index_existing_transactions(state.apps, None)
+
+    def test_migration_indexes_existing_transactions(self):
+        self.index_with_migration()
+        self.assertEqual(list(feed_page(self.alice, search="rent")), [self.rent])
+
+    def test_migration_writes_the_documents_saving_writes(self):
+        card = CreditCard.objects.create(user=self.alice, name="Alice", number="4111 1111 1111 1234", month=1, year=30, cvv="123")
+        make_deposit(self.alice, "20.00", credit_card=card)
+        make_deposit(self.alice, "30.00")
+        Withdrawal.objects.create(user=self.alice, account=self.alice.account, amount=Decimal("5.00"))
+        Transfer.objects.create(
+            user=self.alice, account=self.alice.account, receiver_name="Dave Doe", amount=Decimal("7.50"),
+            transfer_type="external", status="processing",
+        )
+        PaymentRequest.objects.create(
+            user=self.bob, sender=self.bob, sender_account=self.bob.account,
+            receiver=self.alice, receiver_account=self.alice.account, amount=Decimal("3.00"), description="Tickets",
+        )
+
+        def rows():
+            return sorted(TransactionSearch.objects.values_list("user", "kind", "object_id", "transaction_id", "date", "document"))
+
+        saved = rows()
+        self.index_with_migration()
+        self.assertEqual(rows(), saved)
+        self.assertEqual(len(saved), 10)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+        now = timezone.now()
+        self.sent = make_transfer(self.alice, self.bob, "10.00", status="completed", description="Rent", date=now - timedelta(hours=5))
+        self.received = make_transfer(self.bob, self.alice, "4.00", status="completed", date=now - timedelta(hours=4))
+        self.deposit = make_deposit(self.alice, "20.00", status="completed", date=now - timedelta(hours=3))
+        self.withdrawal = Withdrawal.objects.create(
+            user=self.alice, account=self.alice.account, amount=Decimal("5.00"), status="completed",
+            date=now - timedelta(hours=2),
+        )
+        # Bob asks Alice for money, so Alice pays it
+        self.request = PaymentRequest.objects.create(
+            user=self.bob, sender=self.bob, sender_account=self.bob.account,
+            receiver=self.alice, receiver_account=self.alice.account,
+            amount=Decimal("3.00"), status="request_settled", description="Tickets", date=now - timedelta(hours=1),
+        )
+        self.expected = [
+            # (transaction, type, direction, counterparty, description, amount)
+            (self.request, "request", "debit", "Bob", "Tickets", "3.00"),
+            (self.withdrawal, "withdraw", "debit", "", "Withdrawal", "5.00"),
+            (self.deposit, "deposit", "credit", "", "Deposit", "20.00"),
+            (self.received, "transfer", "credit", "Bob", "", "4.00"),
+            (self.sent, "transfer", "debit", "Bob", "Rent", "10.00"),
+        ]
+        self.client.force_login(self.alice)
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse("core:transaction-export"), {"format": export_format, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_has_a_row_per_transaction_kind(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("csv"))))
+        self.assertEqual(
+            [(row["transaction_id"], row["type"], row["direction"], row["counterparty"], row["description"], row["amount"])
+             for row in rows],
+            [(obj.transaction_id, *fields) for obj, *fields in self.expected],
+        )
+
+    def test_jsonl_has_a_row_per_transaction_kind(self):
+        rows = [json.loads(line) for line in self.export("jsonl").splitlines()]
+        self.assertEqual(
+            [(row["transaction_id"], row["type"], row["direction"], row["counterparty"], row["description"], row["amount"])
+             for row in rows],
+            [(obj.transaction_id, *fields) for obj, *fields in self.expected],
+        )
+        self.assertEqual(rows[0]["date"], self.request.date.isoformat())
+
+    def test_ofx_signs_debits_and_ends_with_the_balance(self):
+        content = self.export("ofx")
+        transactions = re.findall(r"<TRNTYPE>(\w+)</TRNTYPE>.*?<TRNAMT>([-\d.]+)</TRNAMT><FITID>(\w+)</FITID>", content)
+        self.assertEqual(transactions, [
+            (direction.upper(), f"-{amount}" if direction == "debit" else amount, obj.transaction_id)
+            for obj, _, direction, _, _, amount in self.expected
+        ])
+        self.assertIn("<NAME>Bob</NAME>", content)
+        self.assertIn("<BALAMT>100.00</BALAMT>", content)
+
+    def test_export_takes_the_list_filters(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("csv", type="transfer", search="rent"))))
+        self.assertEqual([row["transaction_id"] for row in rows], [self.sent.transaction_id])
+
+
+class TransactionIndexTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+        self.later = timezone.now() + timedelta(minutes=5)
+
+    def index_row(self, obj):
+        return TransactionIndex.objects.get(transaction_id=obj.transaction_id)
+
+    def test_new_transaction_is_indexed(self):
+        transfer = make_transfer(self.alice, self.bob, "10.00")
+        row = self.index_row(transfer)
+        self.assertEqual(
+            (row.kind, row.object_id, row.user_id, row.counterparty_id, row.amount, row.status),
+            ("transfer", transfer.pk, self.alice.pk, self.bob.pk, Decimal("10.00"), "processing"),
+        )
+
+    def test_transition_updates_the_index_row(self):
+        transfer = make_transfer(self.alice, self.bob, "10.00")
+        with mock.patch("core.transaction_index.timezone.now", return_value=self.later):
+            transition(transfer, "completed")
+        row = self.index_row(transfer)
+        self.assertEqual(row.status, "completed")
+        self.assertEqual(row.updated_at, self.later)
+
+    def test_failed_transition_leaves_the_index_row(self):
+        transfer = make_transfer(self.alice, self.bob, "150.00")
+        before = self.index_row(transfer)
+        with self.assertRaises(InsufficientFunds):
+            transition(transfer, "completed")
+        row = self.index_row(transfer)
+        self.assertEqual(row.status, "processing")
+        self.assertEqual(row.updated_at, before.updated_at)
+
+    def test_transition_many_updates_every_index_row(self):
+        deposits = [make_deposit(self.alice, "5.00", status="processing") for _ in range(3)]
+        untouched = make_deposit(self.bob, "5.00")
+        with mock.patch("core.transaction_index.timezone.now", return_value=self.later):
+            transition_many(Deposit.objects.filter(user=self.alice), "processing", "completed")
+        for deposit in deposits:
+            row = self.index_row(deposit)
+            self.assertEqual((row.status, row.updated_at), ("completed", self.later))
+        self.assertEqual(self.index_row(untouched).status, "pending")
+
+
+class MonthlyStatsTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        transition(make_deposit(self.alice, "100.00"), "completed")
+        transition(make_transfer(self.alice, self.bob, "30.00"), "completed")
+        transition(make_transfer(self.alice, self.bob, "500.00", status="processing"), "failed")
+
+    def test_transitions_count_completed_movements(self):
+        totals = account_totals(self.alice.account)
+        self.assertEqual((totals["deposited_total"], totals["deposited_count"]), (Decimal("100.00"), 1))
+        self.assertEqual((totals["sent_total"], totals["sent_count"]), (Decimal("30.00"), 1))
+        self.assertEqual(account_totals(self.bob.account)["received_total"], Decimal("30.00"))
+
+    def test_migration_fills_the_totals_of_existing_transactions(self):
+        expected = {account: account_totals(account) for account in (self.alice.account, self.bob.account)}
+        MonthlyAccountStats.objects.all().delete()
+
+        migration = importlib.import_module("core.migrations.0030_monthlyaccountstats")
+        state = MigrationLoader(connection).project_state(("core", "0030_monthlyaccountstats"))
+        migration.backfill_existing_transactions(state.apps, None)
+        for account, totals in expected.items():
+            self.assertEqual(account_totals(account), totals)
+
+
+class TransactionApiTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+        self.transfer = make_transfer(self.alice, self.bob, "10.00", description="Rent")
+        self.client.force_login(self.alice)
+        self.url = reverse("core:transaction-api")
+
+    def get(self, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(self.url, params, **headers)
+
+    def test_page_of_transactions(self):
+        response = self.get(fields="transaction_id,direction,counterparty,amount")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["transactions"], [{
+            "transaction_id": self.transfer.transaction_id, "direction": "debit", "counterparty": "Bob",
+            "amount": "10.00",
+        }])
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.get()["ETag"]
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_new_transaction_changes_the_etag(self):
+        etag = self.get()["ETag"]
+        make_transfer(self.bob, self.alice, "4.00")
+
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["transactions"]), 2)
+
+    def test_status_change_changes_the_etag(self):
+        etag = self.get()["ETag"]
+        transition(self.transfer, "completed")
+
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["transactions"][0]["status"], "completed")
+
+    def test_etag_depends_on_the_query(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(etag, limit=5).status_code, 200)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.get(fields="transaction_id,balance")
+        self.assertEqual(response.status_code, 400)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice")
+        self.bob = make_customer("bob")
+        transition(make_deposit(self.alice, "100.00"), "completed")
+        transition(make_transfer(self.alice, self.bob, "30.00"), "completed")
+
+    def reconcile(self):
+        call_command("reconcile_balances", "--workers", "1", stdout=io.StringIO())
+        return {
+            mismatch.account.user: (mismatch.recorded_balance, mismatch.expected_balance)
+            for mismatch in ReconciliationMismatch.objects.select_related("account__user")
+        }
+
+    def test_balances_agree_with_the_ledger(self):
+        self.assertEqual(self.reconcile(), {})
+
+    def test_history_from_before_the_ledger_is_counted_once(self):
+        # As on a database migrated to the ledger: the opening entries carry the history
+        LedgerEntry.objects.all().delete()
+        importlib.import_module("core.migrations.0020_ledgerentry").open_ledger(apps, None)
+        transition(make_transfer(self.bob, self.alice, "5.00"), "completed")
+        self.assertEqual(self.reconcile(), {})
+
+    def test_balance_shards_are_included(self):
+        Account.objects.filter(user=self.bob).update(business_account=True, balance_shard_count=4)
+        transition(make_transfer(self.alice, self.bob, "20.00"), "completed")
+        self.assertEqual(self.reconcile(), {})
+
+    def test_balance_changed_outside_the_ledger_is_recorded(self):
+        Account.objects.filter(user=self.bob).update(account_balance=Decimal("45.00"))
+        self.assertEqual(self.reconcile(), {self.bob: (Decimal("45.00"), Decimal("30.00"))})
+
+
+class TransactionDetailTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+        self.carol = make_customer("carol")
+        card = CreditCard.objects.create(user=self.alice, name="Alice", number="4111 1111 1111 1234", month=1, year=30, cvv="123")
+        self.transactions = [
+            make_transfer(self.alice, self.bob, "10.00", description="Rent"),
+            make_deposit(self.alice, "20.00", credit_card=card),
+            Withdrawal.objects.create(user=self.alice, account=self.alice.account, amount=Decimal("5.00")),
+            PaymentRequest.objects.create(
+                user=self.bob, sender=self.bob, sender_account=self.bob.account,
+                receiver=self.alice, receiver_account=self.alice.account, amount=Decimal("3.00"),
+            ),
+        ]
+
+    def test_lookup_is_one_query_per_kind(self):
+        for obj in self.transactions:
+            with self.assertNumQueries(1):
+                found = resolve_transaction(self.alice, obj.transaction_id)
+            self.assertEqual((type(found), found.pk), (type(obj), obj.pk))
+
+    def test_counterparty_can_see_a_shared_transaction(self):
+        transfer, _, _, payment_request = self.transactions
+        self.assertEqual(resolve_transaction(self.bob, transfer.transaction_id), transfer)
+        self.assertEqual(resolve_transaction(self.bob, payment_request.transaction_id), payment_request)
+
+    def test_other_users_transactions_are_not_found(self):
+        for obj in self.transactions:
+            self.assertIsNone(resolve_transaction(self.carol, obj.transaction_id))
+
+        self.client.force_login(self.carol)
+        transfer = self.transactions[0]
+        response = self.client.get(reverse("core:transaction-detail", args=[transfer.transaction_id]), follow=True)
+        self.assertRedirects(response, reverse("core:transaction-list"))
+        self.assertContains(response, "Transaction not found")
+        self.assertNotContains(response, transfer.transaction_id)
+
+    def test_unknown_or_malformed_ids_are_not_found_without_a_query(self):
+        for transaction_id in ("XYZ123456789", "TR", "", "trf" + self.transactions[0].transaction_id[3:]):
+            with self.assertNumQueries(0):
+                self.assertIsNone(resolve_transaction(self.alice, transaction_id), transaction_id)
+        self.assertIsNone(resolve_transaction(self.alice, "TRF000000000000"))
+
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse("core:transaction-detail", args=["NOPE"]))
+        self.assertRedirects(response, reverse("core:transaction-list"), fetch_redirect_response=False)
+
+    def test_owner_sees_the_detail_page(self):
+        self.client.force_login(self.alice)
+        for obj in self.transactions:
+            response = self.client.get(reverse("core:transaction-detail", args=[obj.transaction_id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["transaction"], obj)
+            self.assertContains(response, obj.transaction_id)
+
+
+class ExplainHotQueriesTests(TestCase):
+    def explain(self, *args):
+        out = io.StringIO()
+        call_command("explain_hot_queries", *args, stdout=out)
+        return out.getvalue()
+
+    def test_explains_every_hot_query(self):
+        alice = make_customer("alice")
+        make_transfer(alice, make_customer("bob"), "10.00")
+        output = self.explain("--user", "alice")
+        self.assertIn("for user 'alice'", output)
+        for label in ("dashboard: sent/received totals", "transaction list: all types", "notifications: latest",
+                      "settlement: pending external transfers"):
+            self.assertIn(label, output)
+
+    def test_missing_users_and_unsupported_analyze_are_errors(self):
+        with self.assertRaisesMessage(CommandError, "There are no users"):
+            self.explain()
+        make_customer("alice")
+        with self.assertRaisesMessage(CommandError, "No user named 'bob'"):
+            self.explain("--user", "bob")
+        if connection.vendor != "postgresql":
+            with self.assertRaisesMessage(CommandError, "only supported on PostgreSQL"):
+                self.explain("--analyze")
+
+    def test_hot_query_indexes_exist(self):
+        expected = {
+            Transfer: {"transfer_user_date_idx", "transfer_receiver_date_idx", "transfer_user_status_idx",
+                       "transfer_receiver_status_idx", "transfer_unsettled_idx"},
+            Deposit: {"deposit_user_date_idx", "deposit_user_status_idx", "deposit_status_idx"},
+            Withdrawal: {"withdrawal_user_date_idx", "withdrawal_user_status_idx"},
+            PaymentRequest: {"request_sender_date_idx", "request_receiver_date_idx"},
+            Notification: {"notification_user_read_idx", "notification_user_date_idx"},
+        }
+        with connection.cursor() as cursor:
+            for model, names in expected.items():
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                self.assertLessEqual(names, set(constraints), model.__name__)
+
+
+class TransactionAdminTests(TestCase):
+    def setUp(self):
+        self.alice = make_customer("alice", Decimal("100.00"))
+        self.bob = make_customer("bob")
+        self.request = RequestFactory().get("/")
+
+    def test_amount_is_not_editable_in_the_list(self):
+        for model in (Transfer, Deposit, Withdrawal, PaymentRequest):
+            self.assertNotIn("amount", site._registry[model].list_editable, model.__name__)
+
+    def test_amount_is_read_only_once_the_transaction_moves_on(self):
+        admin = site._registry[Transfer]
+        transfer = make_transfer(self.alice, self.bob, "10.00")
+        self.assertNotIn("amount", admin.get_readonly_fields(self.request, transfer))
+        self.assertNotIn("amount", admin.get_readonly_fields(self.request))
+
+        transition(transfer, "completed")
+        self.assertIn("amount", admin.get_readonly_fields(self.request, transfer))
+
+        deposit_admin = site._registry[Deposit]
+        self.assertNotIn("amount", deposit_admin.get_readonly_fields(self.request, make_deposit(self.alice, "5.00")))
+        self.assertIn(
+            "amount", deposit_admin.get_readonly_fields(self.request, make_deposit(self.alice, "5.00", status="processing")),
+        )
+
+    def test_change_form_cannot_change_the_amount_of_a_completed_transfer(self):
+        transfer = make_transfer(self.alice, self.bob, "10.00")
+        transition(transfer, "completed")
+        admin_user = make_customer("admin")
+        admin_user.is_staff = admin_user.is_superuser = True
+        admin_user.save()
+        self.client.force_login(admin_user)
+
+        url = reverse("admin:core_transfer_change", args=[transfer.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("amount", response.context["adminform"].form.fields)
@@ -1,117 +1,109 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Transfer, Deposit, Withdrawal, PaymentRequest
+from django.utils.dateparse import parse_date
+from .models import TRANSACTION_STATUS
+from .feed import FEED_MODELS, InvalidCursor, feed_page, resolve_transaction
 from django.contrib import messages
-from itertools import chain
 
-@login_required
-def transaction_list(request):
-    """Display filtered and paginated transaction list."""
-    user = request.user
-    
-    # Initialize querysets
-    transfers = Transfer.objects.filter(Q(user=user) | Q(receiver=user))
-    deposits = Deposit.objects.filter(user=user)
-    withdrawals = Withdrawal.objects.filter(user=user)
-    requests = PaymentRequest.objects.filter(Q(sender=user) | Q(receiver=user))
-
-    # Search functionality
-    search_query = request.GET.get('search')
-    if search_query:
-        transfers = transfers.filter(
-            Q(transaction_id__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(amount__icontains=search_query)
-        )
-        deposits = deposits.filter(
-            Q(transaction_id__icontains=search_query) |
-            Q(amount__icontains=search_query)
-        )
-        withdrawals = withdrawals.filter(
-            Q(transaction_id__icontains=search_query) |
-            Q(amount__icontains=search_query)
-        )
-        requests = requests.filter(
-            Q(transaction_id__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(amount__icontains=search_query)
-        )
+def _parse_day(value):
+    """A YYYY-MM-DD query parameter as a date, or None if it is empty or invalid."""
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def feed_filters(request):
+    """
+    Read the transaction list filters from the query string.
+
+    Shared by the transaction list and the history export so both apply
+    exactly the same filters.
 
+    Returns:
+        tuple: (kinds, filters for ``feed_rows``, whether a date was invalid)
+    """
     # Filter by transaction type
     transaction_type = request.GET.get('type')
-    transactions = []
-    
-    if transaction_type == 'transfer':
-        transactions = list(transfers)
-    elif transaction_type == 'deposit':
-        transactions = list(deposits)
-    elif transaction_type == 'withdraw' or transaction_type == 'withdrawal':
-        transactions = list(withdrawals)
-    elif transaction_type == 'request':
-        transactions = list(requests)
+    if transaction_type == 'withdrawal':
+        kinds = ['withdraw']
+    elif transaction_type in FEED_MODELS:
+        kinds = [transaction_type]
     else:
         # 'all' or None -> combine everything
-        transactions = list(chain(transfers, deposits, withdrawals, requests))
-    
-    # Sort by date
-    transactions.sort(key=lambda x: x.date, reverse=True)
-    
-    # Filter by status (Post-processing since status field is common)
+        kinds = None
+
     status = request.GET.get('status')
-    if status and status != 'all':
-        transactions = [t for t in transactions if t.status == status]
-    
-    # Filter by date range (Post-processing)
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
-    
-    if date_from:
-        transactions = [t for t in transactions if str(t.date.date()) >= date_from]
-    if date_to:
-        transactions = [t for t in transactions if str(t.date.date()) <= date_to]
-    
-    # Pagination
-    paginator = Paginator(transactions, 20)  # Show 20 transactions per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+
+    # Only known statuses and real dates reach the query
+    filters = {
+        'search': request.GET.get('search'),
+        'status': status if status in dict(TRANSACTION_STATUS) else None,
+        'date_from': _parse_day(date_from),
+        'date_to': _parse_day(date_to),
+    }
+    invalid_date = bool((date_from and not filters['date_from']) or (date_to and not filters['date_to']))
+    return kinds, filters, invalid_date
+
+
+@login_required
+def transaction_list(request):
+    """Display filtered and paginated transaction list."""
+    user = request.user
+
+    kinds, filters, invalid_date = feed_filters(request)
+    if invalid_date:
+        messages.warning(request, "Dates must be in the format YYYY-MM-DD. The invalid date was ignored.")
+
+    # "approximate" caps the count instead of counting every matching row
+    total_mode = 'approximate' if request.GET.get('total') == 'approximate' else 'exact'
+
+    # Merged, filtered and ordered in the database; only one page is loaded
+    try:
+        page_obj = feed_page(
+            user,
+            cursor=request.GET.get('cursor'),
+            page_size=20,  # Show 20 transactions per page
+            total=total_mode,
+            kinds=kinds,
+            **filters,
+        )
+    except InvalidCursor:
+        messages.warning(request, "That page link is no longer valid. Showing your latest transactions.")
+        query = request.GET.copy()
+        query.pop('cursor', None)
+        return redirect(f"{request.path}?{query.urlencode()}" if query else request.path)
+
+    # Filters carried over by the Previous/Next links
+    query = request.GET.copy()
+    query.pop('cursor', None)
+
     context = {
         'page_obj': page_obj,
         'transactions': page_obj,
-        'current_type': transaction_type,
-        'current_status': status,
-        'date_from': date_from,
-        'date_to': date_to,
-        'search_query': search_query,
+        'filter_query': query.urlencode(),
+        'current_type': request.GET.get('type'),
+        'current_status': request.GET.get('status'),
+        'date_from': request.GET.get('date_from'),
+        'date_to': request.GET.get('date_to'),
+        'search_query': request.GET.get('search'),
     }
-    
+
     return render(request, 'transaction/transaction-list.html', context)
 
 
 @login_required
 def transaction_detail(request, transaction_id):
     """Display detailed transaction information."""
-    # Try all models
-    transaction = None
-    try:
-        transaction = Transfer.objects.get(transaction_id=transaction_id)
-    except Transfer.DoesNotExist:
-        try:
-            transaction = Deposit.objects.get(transaction_id=transaction_id)
-        except Deposit.DoesNotExist:
-            try:
-                transaction = Withdrawal.objects.get(transaction_id=transaction_id)
-            except Withdrawal.DoesNotExist:
-                try:
-                    transaction = PaymentRequest.objects.get(transaction_id=transaction_id)
-                except PaymentRequest.DoesNotExist:
-                    messages.warning(request, "Transaction not found")
-                    return redirect("core:transaction-list")
-    
+    transaction = resolve_transaction(request.user, transaction_id)
+    if transaction is None:
+        messages.warning(request, "Transaction not found")
+        return redirect("core:transaction-list")
+
     context = {
         "transaction": transaction,
     }
-    
-    return render(request, 'transaction/transaction_detail.html', context)
\ No newline at end of file
+
+    return render(request, 'transaction/transaction_detail.html', context)
@@ -0,0 +1,90 @@
+"""
+Maintenance of the TransactionIndex table.
+
+Every transaction gets its index row when it is saved (core.signals) or
+bulk-created (``index_transactions``). Status changes are applied through
+core.transitions, which updates the index in the same database transaction
+with ``index_status``.
+"""
+from django.utils import timezone
+
+from .models import Deposit, PaymentRequest, TransactionIndex, Transfer, Withdrawal
+
+INDEXED_MODELS = {
+    Transfer: "transfer",
+    Deposit: "deposit",
+    Withdrawal: "withdraw",
+    PaymentRequest: "request",
+}
+
+# Columns rewritten when an existing transaction is saved again
+INDEX_FIELDS = ["kind", "object_id", "user", "counterparty", "amount", "status", "date", "updated_at"]
+
+
+def _parties(kind, obj):
+    """(user, counterparty) ids of a transaction."""
+    if kind == "transfer":
+        return obj.user_id, obj.receiver_id
+    if kind == "request":
+        return obj.sender_id, obj.receiver_id
+    return obj.user_id, None
+
+
+def index_row(obj):
+    """The (unsaved) TransactionIndex row describing ``obj``."""
+    kind = INDEXED_MODELS[type(obj)]
+    user_id, counterparty_id = _parties(kind, obj)
+    return TransactionIndex(
+        transaction_id=obj.transaction_id,
+        kind=kind,
+        object_id=obj.pk,
+        user_id=user_id,
+        counterparty_id=counterparty_id,
+        amount=obj.amount,
+        status=obj.status,
+        date=obj.date,
+    )
+
+
+def index_transactions(objs):
+    """Insert or refresh the index rows of ``objs`` with one bulk upsert."""
+    rows = [index_row(obj) for obj in objs if obj.pk]
+    TransactionIndex.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["transaction_id"],
+        update_fields=INDEX_FIELDS,
+    )
+
+
+def index_status(objs, status):
+    """Record a status change of ``objs`` (all of one model) with one UPDATE."""
+    TransactionIndex.objects.filter(
+        transaction_id__in=[obj.transaction_id for obj in objs],
+    ).update(status=status, updated_at=timezone.now())
+
+
+def unindex_transaction(obj):
+    TransactionIndex.objects.filter(transaction_id=obj.transaction_id).delete()
+
+
+def rebuild_index(chunk_size=1000):
+    """
+    Re-write the index rows of every transaction, e.g. after rows were
+    bulk-created or updated without going through core.transitions.
+
+    Returns:
+        int: Number of transactions indexed
+    """
+    total = 0
+    for model in INDEXED_MODELS:
+        last_pk = 0
+        while True:
+            chunk = list(model.objects.filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+            if not chunk:
+                break
+            index_transactions(chunk)
+            total += len(chunk)
+            last_pk = chunk[-1].pk
+    return total
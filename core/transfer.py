@@ -3,12 +3,16 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from account.models import Account
 from django.db.models import Q
-from .models import Transfer, Notification, Beneficiary
-from .utils import is_account_frozen, get_freeze_reason_display, send_html_email
+from .models import Transfer, Beneficiary
+from .balance import get_balance, InsufficientFunds
+from .idempotency import allow_retry, idempotent, new_idempotency_key
+from .transitions import transition
+from .versioning import update_account, ConcurrentUpdateError
+from .utils import is_account_frozen, get_freeze_reason_display
 from decimal import Decimal
+from datetime import timedelta
 from django.conf import settings
-
-from userauths.models import User
+from django.utils import timezone
 
 
 @login_required
@@ -85,7 +89,8 @@ def AmountTranfare(request, account_number):
         "is_beneficiary": is_beneficiary,
         "new_account_number": target_account_number, # Pass explicit account number for template
         "beneficiary_name": beneficiary_name,
-        "beneficiary_bank": beneficiary_bank
+        "beneficiary_bank": beneficiary_bank,
+        "balance": get_balance(request.user.account),
     }    
 
     return render(request, 'transfare/amount-transfare.html', context)
@@ -123,6 +128,10 @@ def AmountTranfareProcess(request, account_number):
             messages.error(request, f"Your account is frozen: {get_freeze_reason_display(sender_freeze)}. Please contact support.")
             return redirect("account:account")
         
+        if reciver_account and reciver_account.pk == sender_account.pk:
+            messages.warning(request, "You cannot transfer money to your own account.")
+            return redirect("core:search-account")
+
         # Check if receiver account is frozen (for internal transfers)
         if reciver_account:
             receiver_frozen, receiver_freeze = is_account_frozen(reciver_account)
@@ -130,7 +139,7 @@ def AmountTranfareProcess(request, account_number):
                 messages.error(request, "The recipient's account is currently frozen. Transfer cannot be completed.")
                 return redirect("core:search-account")
 
-        if sender_account.account_balance >= Decimal(amount):
+        if get_balance(sender_account) >= Decimal(amount):
             new_transfer = Transfer.objects.create(
                 user = request.user,
                 amount = amount,
@@ -190,7 +199,8 @@ def TransactionConfirmation(request, account_number, transaction_id):
     context = {
         'account':account,
         'transaction':transaction,
-        'account_number': account_number
+        'account_number': account_number,
+        'idempotency_key': new_idempotency_key(),
     }       
     
     return render(request, 'transfare/transaction-confirmation.html', context)
@@ -198,136 +208,96 @@ def TransactionConfirmation(request, account_number, transaction_id):
 
 
 
+def _reset_pin_attempts(account):
+    account.failed_pin_attempts = 0
+    account.pin_lockout_until = None
+
+
+def _record_failed_pin_attempt(account):
+    account.failed_pin_attempts += 1
+    if account.failed_pin_attempts >= 5:
+        account.pin_lockout_until = timezone.now() + timedelta(minutes=30)
+
+
+def _transfer_result_redirect(account_number, transaction):
+    if transaction.status == "pending":
+        return redirect("core:transfare-pending", account_number, transaction.transaction_id)
+    return redirect("core:transfar-completed", account_number, transaction.transaction_id)
+
+
 @login_required
+@idempotent
 def TransfarProcess(request,account_number, transaction_id):
     try:
-        account = Account.objects.get(account_number=account_number)
-        reciver_account = account
-    except Account.DoesNotExist:
-        account = None
-        reciver_account = None
-
-    try:
-        transaction = Transfer.objects.get(transaction_id=transaction_id)
+        transaction = Transfer.objects.get(transaction_id=transaction_id, user=request.user)
     except Transfer.DoesNotExist:
         messages.warning(request, 'Transfer does not exist')
         return redirect('account:account')
 
-    sender = request.user
+    if transaction.status != "processing":
+        messages.warning(request, "This transfer has already been processed.")
+        return _transfer_result_redirect(account_number, transaction)
+
     sender_account = request.user.account
 
     # Check for PIN lockout
-    from datetime import timedelta
-    from django.utils import timezone
-
     if sender_account.pin_lockout_until:
         if timezone.now() < sender_account.pin_lockout_until:
             # Still locked
             messages.warning(request, "Account locked due to too many failed PIN attempts. Try again in 30 minutes.")
+            allow_retry(request)
             return redirect("account:dashboard")
         else:
             # Lockout period has expired - automatically reset
-            sender_account.failed_pin_attempts = 0
-            sender_account.pin_lockout_until = None
-            sender_account.save()
+            try:
+                update_account(sender_account, _reset_pin_attempts)
+            except ConcurrentUpdateError:
+                messages.warning(request, "An Error occured, Try again later.")
+                allow_retry(request)
+                return redirect("account:dashboard")
 
-    
-    completed = False
     if request.method=="POST":
         pin_num = request.POST.get('pin-number')
         # print(pin_num)
 
         if pin_num == sender_account.pin_number:
             # Reset failed attempts on success
-            sender_account.failed_pin_attempts = 0
-            sender_account.pin_lockout_until = None
-            sender_account.save()
-
-            if transaction.transfer_type == "external":
-                transaction.status = "pending"
-                
-                # Email Admins for external transfer approval
-                try:
-                    subject = f'New External Transfer Request: ${transaction.amount}'
-                    message = f'User {sender.username} (Account: {sender_account.account_number}) has requested an external transfer of ${transaction.amount}.\nTransaction ID: {transaction.transaction_id}\n\nPlease review and approve.'
-                    context = {
-                        'subject_header': 'External Transfer Request',
-                        'message': message
-                    }
-                    admins = User.objects.filter(is_superuser=True)
-                    recipient_list = [admin.email for admin in admins]
-                    send_html_email(subject, recipient_list, context)
-                except:
-                    pass
-            else:
-                transaction.status = "completed"
-                
-            transaction.save()
-
-            sender_account.account_balance -= transaction.amount
-            sender_account.save()
-            
-            # Only credit receiver if they exist (internal)
-            if reciver_account:
-                reciver_account.account_balance += transaction.amount
-                reciver_account.save()
-                
-                Notification.objects.create(
-                    amount=transaction.amount,
-                    user=account.user,
-                    notification_type="Credit Alert",
-                    transaction_id=transaction.transaction_id
-                )
-            
-            Notification.objects.create(
-                user=sender,
-                notification_type="Debit Alert",
-                amount=transaction.amount,
-                transaction_id=transaction.transaction_id
-            )
-            
-            # Send Transaction Email to Sender
             try:
-                subject = f'Debit Alert: -${transaction.amount}'
-                message = f'You sent ${transaction.amount} to {transaction.receiver.kyc.full_name}.\nTransaction ID: {transaction.transaction_id}'
-                context = {
-                    'subject_header': 'Debit Alert',
-                    'message': message
-                }
-                recipient_list = [sender.email]
-                send_html_email(subject, recipient_list, context)
-            except:
-                pass 
-                
-            # Send Credit Email to Receiver (if internal)
-            if reciver_account:
-                try:
-                    subject = f'Credit Alert: +${transaction.amount}'
-                    message = f'You received ${transaction.amount} from {sender.kyc.full_name}.\nTransaction ID: {transaction.transaction_id}'
-                    context = {
-                        'subject_header': 'Credit Alert',
-                        'message': message
-                    }
-                    recipient_list = [reciver_account.user.email]
-                    send_html_email(subject, recipient_list, context)
-                except:
-                    pass
+                update_account(sender_account, _reset_pin_attempts)
+            except ConcurrentUpdateError:
+                messages.warning(request, "An Error occured, Try again later.")
+                allow_retry(request)
+                return redirect("core:transfare-confirmation", account_number, transaction.transaction_id)
+
+            # External transfers wait in 'pending' for settlement
+            new_status = "pending" if transaction.transfer_type == "external" else "completed"
+            try:
+                # Finalize exactly once: only a transfer still 'processing' moves money
+                if not transition(transaction, new_status):
+                    messages.warning(request, "This transfer has already been processed.")
+                    transaction.refresh_from_db(fields=["status"])
+                    return _transfer_result_redirect(account_number, transaction)
+            except InsufficientFunds:
+                messages.warning(request, 'Insufficient fund')
+                allow_retry(request)
+                return redirect("core:amount-transfare", account_number)
 
             messages.success(request, "Transfer Successfull.")
-            if transaction.transfer_type == "external":
-                return redirect("core:transfare-pending", account_number, transaction.transaction_id)
-            else:
-                return redirect("core:transfar-completed", account_number, transaction.transaction_id)
+            return _transfer_result_redirect(account_number, transaction)
         else:
             # Increment failed attempts
-            sender_account.failed_pin_attempts += 1
+            try:
+                update_account(sender_account, _record_failed_pin_attempt)
+            except ConcurrentUpdateError:
+                messages.warning(request, "An Error occured, Try again later.")
+                allow_retry(request)
+                return redirect("core:transfare-confirmation", account_number ,transaction.transaction_id)
+
             if sender_account.failed_pin_attempts >= 5:
-                sender_account.pin_lockout_until = timezone.now() + timedelta(minutes=30)
                 messages.error(request, "Too many failed attempts. Account locked for 30 minutes.")
             else:
                 messages.warning(request, f"Incorrect Pin Number. {5 - sender_account.failed_pin_attempts} attempts remaining.")
-            
-            sender_account.save()
+            allow_retry(request)
             return redirect("core:transfare-confirmation", account_number ,transaction.transaction_id)
         
     else:
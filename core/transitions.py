@@ -0,0 +1,393 @@
+"""
+Status state machine for Transfer, Deposit, Withdrawal and PaymentRequest.
+
+Every status change goes through ``transition`` (one object) or
+``transition_many`` (a queryset). The allowed moves are declared in
+TRANSITIONS; each is applied as a conditional
+
+    UPDATE ... SET status=<to> WHERE id=... AND status=<from>
+
+so a stale or concurrent caller changes nothing instead of re-reading the
+row first. The transition's handler then moves the money (balance and
+ledger writes, in the same database transaction) and records the
+notifications and emails it wants sent. Notifications are inserted with one
+bulk INSERT at the end of the transaction and emails are queued until after
+it commits, so a rolled-back transition sends nothing. Completed movements
+are added to the monthly account totals (core.stats) in the same way, and
+the parties' cached dashboard summaries (core.summary) are invalidated on
+commit.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from userauths.models import User
+from .balance import transfer_funds, transfer_to_many
+from .models import Deposit, Notification, PaymentRequest, Transfer, Withdrawal
+from .stats import StatsDelta
+from .summary import invalidate_notifications, invalidate_summaries
+from .transaction_index import index_status
+from .utils import get_full_name, queue_html_email
+
+
+class InvalidTransition(Exception):
+    """Raised when a status change is not in the transition table."""
+
+    def __init__(self, model, from_status, to_status):
+        self.model = model
+        self.from_status = from_status
+        self.to_status = to_status
+        super().__init__(f"{model.__name__} cannot go from '{from_status}' to '{to_status}'")
+
+
+class Effects:
+    """Notifications, emails and monthly totals collected while transitions are applied."""
+
+    def __init__(self):
+        self.notifications = []
+        self.emails = []
+        self.stats = StatsDelta()
+        self._admin_emails = None
+
+    def notify(self, user, notification_type, amount=0, transaction_id=None):
+        self.notifications.append(Notification(
+            user=user,
+            notification_type=notification_type,
+            amount=amount,
+            transaction_id=transaction_id,
+        ))
+
+    def email(self, subject, recipient_list, subject_header, message):
+        recipient_list = [address for address in recipient_list if address]
+        if recipient_list:
+            self.emails.append((subject, recipient_list, {'subject_header': subject_header, 'message': message}))
+
+    def email_admins(self, subject, subject_header, message):
+        if self._admin_emails is None:
+            self._admin_emails = list(User.objects.filter(is_superuser=True).values_list("email", flat=True))
+        self.email(subject, self._admin_emails, subject_header, message)
+
+    def dispatch(self):
+        """Insert the notifications, update the monthly totals and queue the emails; call inside the transaction."""
+        Notification.objects.bulk_create(self.notifications, batch_size=1000)
+        invalidate_notifications(notification.user_id for notification in self.notifications)
+        self.stats.apply()
+        for subject, recipient_list, context in self.emails:
+            queue_html_email(subject, recipient_list, context)
+
+
+# -------------------------------- Transfer --------------------------------
+
+def _debit_transfer_sender(transfer, effects):
+    effects.notify(transfer.user, "Debit Alert", transfer.amount, transfer.transaction_id)
+    receiver_name = get_full_name(transfer.receiver) if transfer.receiver else transfer.receiver_name
+    effects.email(
+        f'Debit Alert: -${transfer.amount}', [transfer.user.email], 'Debit Alert',
+        f'You sent ${transfer.amount} to {receiver_name}.\nTransaction ID: {transfer.transaction_id}',
+    )
+
+
+def _count_completed_transfer(transfer, effects, sign=1):
+    effects.stats.add(transfer.account_id, transfer.date, "sent", transfer.amount, sign)
+    if transfer.receiver_account_id:
+        effects.stats.add(transfer.receiver_account_id, transfer.date, "received", transfer.amount, sign)
+
+
+def _transfer_completed(transfer, effects):
+    _debit_transfer_sender(transfer, effects)
+    _count_completed_transfer(transfer, effects)
+
+    if transfer.receiver_account:
+        effects.notify(transfer.receiver, "Credit Alert", transfer.amount, transfer.transaction_id)
+        effects.email(
+            f'Credit Alert: +${transfer.amount}', [transfer.receiver.email], 'Credit Alert',
+            f'You received ${transfer.amount} from {get_full_name(transfer.user)}.\nTransaction ID: {transfer.transaction_id}',
+        )
+
+
+def _complete_transfer(transfer, from_status, effects):
+    # Debit sender and (for internal transfers) credit receiver
+    transfer_funds(transfer.account, transfer.receiver_account, transfer.amount, transfer)
+    _transfer_completed(transfer, effects)
+
+
+def _complete_transfers(transfers, from_status, effects):
+    # Internal transfers are paid with one debit per sender and grouped credits
+    by_sender = defaultdict(list)
+    for transfer in transfers:
+        if transfer.receiver_account is None:
+            transfer_funds(transfer.account, None, transfer.amount, transfer)
+        else:
+            by_sender[transfer.account_id].append(transfer)
+    for sent in by_sender.values():
+        transfer_to_many(sent[0].account, [(transfer.receiver_account, transfer.amount, transfer) for transfer in sent])
+
+    for transfer in transfers:
+        _transfer_completed(transfer, effects)
+
+
+def _submit_external_transfer(transfer, from_status, effects):
+    # The sender is debited now; the transfer waits in 'pending' for settlement
+    transfer_funds(transfer.account, None, transfer.amount, transfer)
+    _debit_transfer_sender(transfer, effects)
+
+    effects.email_admins(
+        f'New External Transfer Request: ${transfer.amount}', 'External Transfer Request',
+        f'User {transfer.user.username} (Account: {transfer.account.account_number}) has requested an external transfer of ${transfer.amount}.\nTransaction ID: {transfer.transaction_id}\n\nPlease review and approve.',
+    )
+
+
+def _settle_external_transfer(transfer, from_status, effects):
+    # The money left the sender on submission; settlement only completes it
+    _count_completed_transfer(transfer, effects)
+
+
+def _refund_transfer(transfer, from_status, effects):
+    # Only money that actually left the sender is returned: internal
+    # transfers are debited when they complete, external transfers when
+    # they go to 'pending' for settlement.
+    if transfer.transfer_type == "internal" and transfer.receiver_account:
+        if from_status != "completed":
+            return
+
+        # Reverse the transfer: take it back from the receiver (even if
+        # already spent) and return it to the sender.
+        transfer_funds(
+            transfer.receiver_account, transfer.account, transfer.amount, transfer,
+            transaction_type="refund", allow_overdraft=True,
+        )
+        effects.notify(transfer.receiver, "Debit Alert", transfer.amount, transfer.transaction_id)
+    else:
+        # Refund the sender from the external settlement book
+        transfer_funds(
+            None, transfer.account, transfer.amount, transfer,
+            book="external", transaction_type="refund",
+        )
+
+    if from_status == "completed":
+        _count_completed_transfer(transfer, effects, sign=-1)
+
+    effects.notify(transfer.user, "Credit Alert", transfer.amount, transfer.transaction_id)
+    effects.email(
+        f'Credit Alert: Refund +${transfer.amount}', [transfer.user.email], 'Credit Alert - Refund',
+        f'Your transfer of ${transfer.amount} (ID: {transfer.transaction_id}) failed and has been refunded to your account.',
+    )
+
+
+# -------------------------------- Deposit ---------------------------------
+
+def _submit_deposit(deposit, from_status, effects):
+    effects.notify(deposit.user, "Deposit Request")
+    effects.email_admins(
+        f'New Deposit Request: ${deposit.amount}', 'New Deposit Request',
+        f'User {deposit.user.username} (Account: {deposit.account.account_number}) has requested a deposit of ${deposit.amount}.\nTransaction ID: {deposit.transaction_id}\n\nPlease review and approve.',
+    )
+    effects.email(
+        f'Deposit Request Received: ${deposit.amount}', [deposit.user.email], 'Deposit Processing',
+        f'Hello {deposit.user.username},\n\nWe have received your deposit request of ${deposit.amount}.\nTransaction ID: {deposit.transaction_id}\n\nYour request is currently being processed and will be screened shortly. Once approved, the funds will be credited to your account immediately.\n\nThank you for banking with us.',
+    )
+
+
+def _credit_deposits(deposits, from_status, effects):
+    # One grouped balance UPDATE and one ledger INSERT for the whole batch
+    transfer_to_many(None, [(deposit.account, deposit.amount, deposit) for deposit in deposits], book="deposits")
+    for deposit in deposits:
+        effects.stats.add(deposit.account_id, deposit.date, "deposited", deposit.amount)
+        effects.notify(deposit.user, "Credit Alert", deposit.amount, deposit.transaction_id)
+        effects.email(
+            f'Deposit Completed: +${deposit.amount}', [deposit.user.email], 'Deposit Completed',
+            f'Your deposit of ${deposit.amount} has been successfully processed and credited to your account.\nTransaction ID: {deposit.transaction_id}',
+        )
+
+
+def _credit_deposit(deposit, from_status, effects):
+    _credit_deposits([deposit], from_status, effects)
+
+
+# ------------------------------- Withdrawal -------------------------------
+
+def _debit_withdrawal(withdrawal, from_status, effects):
+    transfer_funds(withdrawal.account, None, withdrawal.amount, withdrawal, book="withdrawals")
+    effects.stats.add(withdrawal.account_id, withdrawal.date, "withdrawn", withdrawal.amount)
+    effects.notify(withdrawal.user, "Debit Alert", withdrawal.amount, withdrawal.transaction_id)
+
+
+# ----------------------------- Payment request ----------------------------
+
+def _send_payment_request(payment_request, from_status, effects):
+    effects.notify(payment_request.receiver, "Recieved Payment Request", payment_request.amount, payment_request.transaction_id)
+    effects.notify(payment_request.sender, "Sent Payment Request", payment_request.amount, payment_request.transaction_id)
+
+
+def _settle_payment_request(payment_request, from_status, effects):
+    # The receiver of the request pays the user who sent it
+    transfer_funds(
+        payment_request.receiver_account, payment_request.sender_account,
+        payment_request.amount, payment_request,
+    )
+    effects.stats.add(payment_request.receiver_account_id, payment_request.date, "requests_paid", payment_request.amount)
+    effects.stats.add(payment_request.sender_account_id, payment_request.date, "requests_received", payment_request.amount)
+    effects.email(
+        f'Debit Alert: -${payment_request.amount}', [payment_request.receiver.email], 'Debit Alert',
+        f'You settled a payment request of ${payment_request.amount} to {get_full_name(payment_request.sender)}.\nTransaction ID: {payment_request.transaction_id}',
+    )
+    effects.email(
+        f'Credit Alert: +${payment_request.amount}', [payment_request.sender.email], 'Credit Alert',
+        f'Your payment request of ${payment_request.amount} has been settled by {get_full_name(payment_request.receiver)}.\nTransaction ID: {payment_request.transaction_id}',
+    )
+
+
+# {model: {(from_status, to_status): handler or None}}
+TRANSITIONS = {
+    Transfer: {
+        ("processing", "completed"): _complete_transfer,
+        ("processing", "pending"): _submit_external_transfer,
+        ("processing", "failed"): None,
+        ("pending", "completed"): _settle_external_transfer,
+        ("pending", "failed"): _refund_transfer,
+        ("completed", "failed"): _refund_transfer,
+    },
+    Deposit: {
+        ("pending", "processing"): _submit_deposit,
+        ("pending", "completed"): _credit_deposit,
+        ("pending", "failed"): None,
+        ("processing", "completed"): _credit_deposit,
+        ("processing", "failed"): None,
+    },
+    Withdrawal: {
+        ("pending", "processing"): None,
+        ("pending", "completed"): _debit_withdrawal,
+        ("pending", "failed"): None,
+        ("processing", "completed"): _debit_withdrawal,
+        ("processing", "failed"): None,
+    },
+    PaymentRequest: {
+        ("processing", "request_sent"): _send_payment_request,
+        ("request_sent", "request_settled"): _settle_payment_request,
+    },
+}
+
+
+# Handlers that process a whole batch at once, used by transition_many
+# instead of calling the TRANSITIONS handler once per object.
+BULK_TRANSITIONS = {
+    Transfer: {
+        ("processing", "completed"): _complete_transfers,
+    },
+    Deposit: {
+        ("pending", "completed"): _credit_deposits,
+        ("processing", "completed"): _credit_deposits,
+    },
+}
+
+
+def _parties(obj):
+    """User ids of everyone whose dashboard shows ``obj``."""
+    if isinstance(obj, PaymentRequest):
+        return [obj.sender_id, obj.receiver_id]
+    return [obj.user_id, getattr(obj, "receiver_id", None)]
+
+
+def can_transition(model, from_status, to_status):
+    """Whether ``model`` objects may go from ``from_status`` to ``to_status``."""
+    return (from_status, to_status) in TRANSITIONS.get(model, {})
+
+
+def _handler(model, from_status, to_status):
+    if not can_transition(model, from_status, to_status):
+        raise InvalidTransition(model, from_status, to_status)
+    return TRANSITIONS[model][(from_status, to_status)]
+
+
+def transition(obj, to_status, where=None, **fields):
+    """
+    Move ``obj`` from its current status to ``to_status``.
+
+    Args:
+        obj: Transfer, Deposit, Withdrawal or PaymentRequest instance
+        to_status: The new status
+        where: Optional extra filter conditions the row must also match
+            (e.g. ``{"receiver": user}``)
+        **fields: Other fields to set in the same UPDATE
+
+    Returns:
+        bool: False if the row was no longer in ``obj.status`` (or did not
+            match ``where``); nothing is changed in that case
+
+    Raises:
+        InvalidTransition: The move is not in the transition table
+        InsufficientFunds: The handler could not move the money; the status
+            change is rolled back
+    """
+    model = type(obj)
+    from_status = obj.status
+    handler = _handler(model, from_status, to_status)
+
+    effects = Effects()
+    try:
+        with transaction.atomic():
+            updated = (
+                model.objects.filter(pk=obj.pk, status=from_status, **(where or {}))
+                .update(status=to_status, **fields)
+            )
+            if not updated:
+                return False
+            index_status([obj], to_status)
+            invalidate_summaries(_parties(obj))
+
+            obj.status = to_status
+            for name, value in fields.items():
+                setattr(obj, name, value)
+            if handler is not None:
+                handler(obj, from_status, effects)
+            effects.dispatch()
+    except Exception:
+        obj.status = from_status
+        raise
+    return True
+
+
+def transition_many(queryset, from_status, to_status, **fields):
+    """
+    Move every object in ``queryset`` that is in ``from_status`` to ``to_status``.
+
+    The rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and
+    updated with a single UPDATE. The transition's BULK_TRANSITIONS handler
+    then processes them together, or else its TRANSITIONS handler runs for
+    each object; all notifications are written with one INSERT.
+
+    Returns:
+        list: The objects that were transitioned
+
+    Raises:
+        InvalidTransition: The move is not in the transition table
+    """
+    model = queryset.model
+    handler = _handler(model, from_status, to_status)
+
+    effects = Effects()
+    with transaction.atomic():
+        objects = list(
+            queryset.filter(status=from_status)
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("pk")
+        )
+        if not objects:
+            return []
+
+        model.objects.filter(pk__in=[obj.pk for obj in objects]).update(status=to_status, **fields)
+        index_status(objects, to_status)
+        invalidate_summaries(user_id for obj in objects for user_id in _parties(obj))
+        for obj in objects:
+            obj.status = to_status
+            for name, value in fields.items():
+                setattr(obj, name, value)
+
+        bulk_handler = BULK_TRANSITIONS.get(model, {}).get((from_status, to_status))
+        if bulk_handler is not None:
+            bulk_handler(objects, from_status, effects)
+        elif handler is not None:
+            for obj in objects:
+                handler(obj, from_status, effects)
+        effects.dispatch()
+    return objects
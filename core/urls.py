@@ -1,7 +1,10 @@
 from django.urls import path
 from .views import index, about_us, terms_of_service, privacy_policy, contact_us
 from .transfer import search_using_account, AmountTranfare, AmountTranfareProcess,TransactionConfirmation,TransfarProcess, TransfarCompleted, transfer_selection, search_external_account, TransfarPending
+from .payroll import bulk_transfer
 from .transaction import transaction_list, transaction_detail
+from .export import export_transactions
+from .api import transaction_api
 from .payment_request import SearchUserRequest, AmountRequest, AmountRequestProcess, RequestConfirmation, RequestCompleted, RequestFinialProcess, settlement_confirmation, settlement_processing, SettlementCompleted, delete_payment_request
 from .credit_card import credit_card_detail, all_cards, add_card, delete_card
 from .deposit import (
@@ -56,6 +59,7 @@ urlpatterns = [
     path('transfare-process/<account_number>/<transaction_id>/',TransfarProcess , name='transaction-process'),
     path('transfare-completed/<account_number>/<transaction_id>/',TransfarCompleted , name='transfar-completed'),
     path('transfare-pending/<account_number>/<transaction_id>/',TransfarPending , name='transfare-pending'),
+    path('bulk-transfer/', bulk_transfer, name='bulk-transfer'),
 
 
 
@@ -64,7 +68,9 @@ urlpatterns = [
 
 
     path('transaction/',transaction_list, name='transaction-list' ),
+    path('transaction/export/', export_transactions, name='transaction-export'),
     path('transaction/<transaction_id>/',transaction_detail, name='transaction-detail' ),
+    path('api/transactions/', transaction_api, name='transaction-api'),
 
     #payment_request
 
@@ -5,8 +5,13 @@ from core.models import AccountFreeze
 
 import os
 import resend
+from concurrent.futures import ThreadPoolExecutor
+from django.db import transaction
 from django.template.loader import render_to_string
 
+# Emails queued with queue_html_email are sent from here, off the request thread
+_email_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="email")
+
 def is_account_frozen(account):
     """
     Check if an account has an active freeze.
@@ -53,6 +58,20 @@ def get_freeze_reason_display(freeze_record):
 
 
 
+def get_full_name(user):
+    """
+    Get the name to show for a user in messages and emails.
+
+    Args:
+        user: User instance
+
+    Returns:
+        str: The KYC full name, or the username if KYC has not been submitted
+    """
+    kyc = getattr(user, "kyc", None)
+    return kyc.full_name if kyc else user.username
+
+
 def send_html_email(subject, recipient_list, context, template_path='emails/notification_email.html'):
     """
     Send an HTML email using Resend API.
@@ -91,3 +110,15 @@ def send_html_email(subject, recipient_list, context, template_path='emails/noti
     except Exception as e:
         print(f"Resend API Error: {e}") # Debugging
         return False
+
+
+def queue_html_email(subject, recipient_list, context, template_path='emails/notification_email.html'):
+    """
+    Send an HTML email in the background once the current transaction commits.
+
+    Nothing is sent if the transaction rolls back. Takes the same arguments
+    as ``send_html_email``.
+    """
+    transaction.on_commit(
+        lambda: _email_executor.submit(send_html_email, subject, recipient_list, context, template_path)
+    )
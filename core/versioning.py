@@ -0,0 +1,87 @@
+"""
+Optimistic concurrency for Account writes.
+
+Accounts carry a ``version`` column. Instead of a full-row ``save()``,
+which silently overwrites whatever another request wrote in between,
+``update_account`` applies a change to the in-memory account and writes
+only the fields that change:
+
+    UPDATE account SET <changed fields>, version = version + 1
+    WHERE id = <pk> AND version = <version read>
+
+If no row matches, someone else updated the account first: it is re-read,
+the change is re-applied to the fresh values and the write retried after a
+short, bounded backoff. No row lock is held while the caller checks a PIN
+or sends email.
+
+Balance movements (core.balance) are conditional F() updates of
+``account_balance`` alone, so they neither need nor bump the version.
+"""
+import random
+import time
+
+from django.db.models import F
+
+from account.models import Account
+
+
+class ConcurrentUpdateError(Exception):
+    """Raised when an account kept changing underneath every retry."""
+
+    def __init__(self, account, attempts):
+        self.account = account
+        self.attempts = attempts
+        super().__init__(f"Account {account.account_number} was updated concurrently {attempts} times in a row")
+
+
+def _field_values(account):
+    return {
+        field.attname: getattr(account, field.attname)
+        for field in Account._meta.concrete_fields
+        if not field.primary_key and field.attname != "version"
+    }
+
+
+def update_account(account, apply, max_attempts=5, backoff=0.02):
+    """
+    Apply ``apply(account)`` and persist the fields it changed, retrying on conflict.
+
+    ``apply`` may run more than once, each time against freshly read values,
+    so it should set fields from the account it is given (e.g. increment
+    ``failed_pin_attempts``) rather than from values captured earlier.
+
+    Args:
+        account: The Account instance; updated in place with the saved values
+        apply: Callable that mutates the account it is passed
+        max_attempts: Number of write attempts before giving up
+        backoff: Base delay in seconds; doubled (with jitter) after each conflict
+
+    Returns:
+        list: Names of the fields written (empty if nothing changed)
+
+    Raises:
+        ConcurrentUpdateError: Every attempt lost the race
+    """
+    for attempt in range(max_attempts):
+        before = _field_values(account)
+        apply(account)
+        changed = {
+            name: value
+            for name, value in _field_values(account).items()
+            if value != before[name]
+        }
+        if not changed:
+            return []
+
+        updated = Account.objects.filter(pk=account.pk, version=account.version).update(
+            version=F("version") + 1, **changed
+        )
+        if updated:
+            account.version += 1
+            return list(changed)
+
+        if attempt + 1 < max_attempts:
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        account.refresh_from_db()
+
+    raise ConcurrentUpdateError(account, max_attempts)
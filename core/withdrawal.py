@@ -2,11 +2,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
-from django.utils import timezone
 from decimal import Decimal
 from account.models import Account
 from .models import Withdrawal, Notification
 from .utils import is_account_frozen, get_freeze_reason_display
+from .balance import get_balance, InsufficientFunds
+from .transitions import transition
 from django.core.exceptions import ValidationError
 
 
@@ -45,7 +46,7 @@ def initiate_withdrawal(request):
                 if amount <= 0:
                     raise ValidationError("Amount must be greater than zero")
                 
-                if amount > account.account_balance:
+                if amount > get_balance(account):
                     messages.error(request, "Insufficient funds")
                     return redirect("core:initiate-withdrawal")
                 
@@ -74,7 +75,8 @@ def initiate_withdrawal(request):
                 return redirect("core:initiate-withdrawal")
         
         return render(request, "core/withdrawal/initiate_withdrawal.html", {
-            "account": account
+            "account": account,
+            "balance": get_balance(account),
         })
         
     except Account.DoesNotExist:
@@ -126,42 +128,18 @@ def process_withdrawal(request, transaction_id):
             messages.error(request, "Incorrect PIN number")
             return redirect("core:confirm-withdrawal", transaction_id=transaction_id)
         
-        # Check balance again
-        if withdrawal.amount > account.account_balance:
-            withdrawal.status = "failed"
-            withdrawal.save()
-            messages.error(request, "Insufficient funds")
-            return redirect("core:withdrawal-failure", transaction_id=transaction_id)
-        
         try:
-            # Update withdrawal status to processing
-            withdrawal.status = "processing"
-            withdrawal.save()
-            
-            # Deduct from account balance
-            account.account_balance -= withdrawal.amount
-            account.save()
-            
-            # Mark as completed
-            withdrawal.status = "completed"
-            withdrawal.update = timezone.now()
-            withdrawal.save()
-            
-            # Create success notification
-            Notification.objects.create(
-                user=request.user,
-                notification_type="Debit Alert",
-                amount=withdrawal.amount
-            )
-            
-            messages.success(request, f"Withdrawal of ${withdrawal.amount} processed successfully")
-            return redirect("core:withdrawal-success", transaction_id=transaction_id)
-            
-        except Exception as e:
-            withdrawal.status = "failed"
-            withdrawal.save()
-            messages.error(request, f"Error processing withdrawal: {str(e)}")
+            # Deduct from account balance (conditional on sufficient funds)
+            if not transition(withdrawal, "completed"):
+                messages.warning(request, "This withdrawal has already been processed.")
+                return redirect("core:transaction-detail", transaction_id=transaction_id)
+        except InsufficientFunds:
+            transition(withdrawal, "failed")
+            messages.error(request, "Insufficient funds")
             return redirect("core:withdrawal-failure", transaction_id=transaction_id)
+
+        messages.success(request, f"Withdrawal of ${withdrawal.amount} processed successfully")
+        return redirect("core:withdrawal-success", transaction_id=transaction_id)
     
     return redirect("core:confirm-withdrawal", transaction_id=transaction_id)
 
@@ -133,6 +133,52 @@ LOGOUT_REDIRECT_URL = "userauths:sign-in"
 # RESEND_API_KEY is loaded from .env in core/utils.py
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Paylio <onboarding@resend.dev>')
 
+# How long (in seconds) a transfer/deposit/settlement idempotency key replays
+# its original response (see core/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+# Caches. Set REDIS_URL (redis://...) to share the cache between processes;
+# any server speaking the Redis protocol works. Without it each process
+# keeps a local-memory cache.
+#
+# Dashboard summaries and fragments are invalidated by changing a version
+# token in the cache, and management commands (approve_deposits,
+# settle_external_transfers, ...) and every web worker must see the same
+# token. They are therefore only cached when the cache is shared: without
+# REDIS_URL, SUMMARY_CACHE is a dummy cache and fragments are not cached.
+SHARED_CACHE = bool(os.environ.get('REDIS_URL'))
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'paylio',
+        },
+        'summaries': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        },
+    }
+
+# Cache alias and lifetime (in seconds) of the per-account dashboard
+# summaries (see core/summary.py). The alias must name a cache shared by
+# every process.
+SUMMARY_CACHE = os.environ.get('SUMMARY_CACHE', 'default' if SHARED_CACHE else 'summaries')
+SUMMARY_CACHE_TTL = int(os.environ.get('SUMMARY_CACHE_TTL', 60 * 60))
+
+# Lifetime (in seconds) of the dashboard templates' cached fragments. They
+# are keyed by the account's summary and notification versions, so they
+# change as soon as the data does; notification fragments expire sooner
+# because they show relative times ("5 minutes ago"). 0 disables caching,
+# the default without a shared cache.
+DASHBOARD_FRAGMENT_TTL = int(os.environ.get('DASHBOARD_FRAGMENT_TTL', 60 * 60 if SHARED_CACHE else 0))
+NOTIFICATION_FRAGMENT_TTL = int(os.environ.get('NOTIFICATION_FRAGMENT_TTL', 60 if SHARED_CACHE else 0))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/